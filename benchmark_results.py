@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the benchmarks of the stages of the evaluation
+on synthetic data of configurable size and spectral content
+
+The timings are written to the 'benchmarks' folder, so that the
+ones of different versions can be compared
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+from os import path as os_path
+
+from matplotlib.backends.backend_pdf import PdfPages
+
+from utilities.benchmark_utilities import run_benchmarks, get_benchmark_table, get_benchmark_comparison_table, get_scaling_curves, write_benchmark, read_benchmark
+from utilities.other_utilities import get_benchmark_parser_settings
+from utilities.plot_utilities import set_text_rendering, plot_benchmark_scaling_curves
+
+#----------------------------------------------------------------
+# parsing of command line arguments for user specified settings
+# or default ones, the evaluation ones (e.g. -cm, -pdf) included
+# sample usage: Kratos format, series of 10000 and 100000 samples for 1 and 8 taps
+# python3 benchmark_results.py -bff Kratos -bns '10000,100000' -bnt '1,8' -bl 'v1'
+
+args = get_benchmark_parser_settings().parse_args()
+print("## Considered command-line arguments: ", args)
+
+set_text_rendering(args.text_rendering)
+
+#----------------------------------------------------------------
+# hardcoded parameters
+
+# subfolder where the benchmark results and scaling curves are written
+benchmarks_folder = 'benchmarks'
+
+#----------------------------------------------------------------
+# run benchmarks
+
+if __name__ == '__main__':
+    benchmark = run_benchmarks(args)
+
+    write_benchmark(benchmark, os_path.join(
+        benchmarks_folder, 'BenchmarkResults_' + args.benchmark_label + '.json'))
+    print('## Benchmark times in s and scaling exponents (time ~ size**exponent)\n' +
+          get_benchmark_table(benchmark))
+
+    previous_benchmark = None
+    if args.benchmark_compare:
+        previous_benchmark = read_benchmark(os_path.join(
+            benchmarks_folder, 'BenchmarkResults_' + args.benchmark_compare + '.json'))
+        print('## Benchmark times compared to ' + args.benchmark_compare + '\n' +
+              get_benchmark_comparison_table(benchmark, previous_benchmark))
+
+    with PdfPages(os_path.join(benchmarks_folder, 'BenchmarkScaling_' + args.benchmark_label + '.pdf')) as report_pdf:
+        plot_benchmark_scaling_curves(get_scaling_curves(benchmark), report_pdf,
+                                      None if previous_benchmark is None else get_scaling_curves(previous_benchmark))
+
+    print('## Benchmark ' + args.benchmark_label + ' finished')
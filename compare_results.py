@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the comparison of result cases and cp modes,
+e.g. Kratos against FeFlo variants or Trad against New cp
+
+Only the already computed statistics are loaded (summaries or
+results data of the compute stage), so the cases and cp modes
+need to be evaluated before with evaluate_results.py
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+import json
+from os import path as os_path
+
+from matplotlib.backends.backend_pdf import PdfPages
+
+from utilities.comparison_utilities import comparison_plot_quantities, get_variant_name, load_variant_columns, align_variant_columns, get_comparison_differences, get_error_norms, get_error_norms_table, write_comparison
+from utilities.other_utilities import get_comparison_parser_settings
+from utilities.plot_utilities import set_text_rendering, plot_pressure_taps_comparison
+
+#----------------------------------------------------------------
+# parsing of command line arguments for user specified settings
+# or default ones, the selection of cases (-cs) and cp modes (-cpms) apply
+# sample usage: both cp modes of the Kratos and FeFloSlip case, Kratos New as reference
+# python3 compare_results.py -rt 'false' -cs 'Kratos,FeFloSlip' -cpms 'trad,new' -cr 'Kratos_New' -cl 'KratosFeFlo'
+
+args = get_comparison_parser_settings().parse_args()
+print("## Considered command-line arguments: ", args)
+
+set_text_rendering(args.text_rendering)
+
+if args.run_test:
+    results_overview = 'ResultsOverviewTest.json'
+    comparison_ending = '_Test'
+    result_summary_ending = '_Test.dat'
+    results_data_ending = '_Test.npz'
+else:
+    results_overview = 'ResultsOverview.json'
+    comparison_ending = ''
+    result_summary_ending = '.dat'
+    results_data_ending = '.npz'
+
+if args.cp_modes:
+    cp_modes = args.cp_modes.split(',')
+else:
+    cp_modes = [args.cp_mode]
+
+#----------------------------------------------------------------
+# hardcoded parameters
+
+# subfolders where the input data, the summaries and results data are
+# and where the comparison report and tables should be generated
+input_data_folder = 'input_data'
+reports_folder = 'reports'
+summaries_folder = 'summaries'
+results_data_folder = 'results_data'
+
+#----------------------------------------------------------------
+# result cases to compare
+if args.cases:
+    result_cases = args.cases.split(',')
+else:
+    with open(os_path.join(input_data_folder, results_overview)) as f:
+        result_cases = [result['case'] for result in json.load(f)['results']]
+
+folders = {'summaries': summaries_folder,
+           'results_data': results_data_folder}
+endings = {'summary': result_summary_ending,
+           'results_data': results_data_ending}
+
+#----------------------------------------------------------------
+# compare results
+
+if __name__ == '__main__':
+    variants = {}
+    for result_case in result_cases:
+        for cp_mode in cp_modes:
+            columns, loaded_file = load_variant_columns(
+                result_case, cp_mode, folders, endings)
+            if columns is not None:
+                variants[get_variant_name(result_case, cp_mode)] = columns
+                print('## Statistics of ' + get_variant_name(result_case, cp_mode) +
+                      ' loaded from ' + loaded_file)
+
+    if len(variants) < 2:
+        raise Exception('At least two evaluated variants needed for the comparison, found: ' +
+                        ', '.join(variants.keys()))
+
+    reference_name = args.comparison_reference or list(variants.keys())[0]
+    if reference_name not in variants:
+        raise Exception('Reference variant ' + reference_name + ' not among the compared ones: ' +
+                        ', '.join(variants.keys()))
+    # the reference first, its taps order the others
+    variants = dict([(reference_name, variants.pop(reference_name))] + list(variants.items()))
+
+    aligned_variants, quantities = align_variant_columns(variants)
+    if args.comparison_quantities:
+        for quantity in args.comparison_quantities.split(','):
+            if quantity not in quantities:
+                raise Exception('Quantity ' + quantity + ' not in the statistics of all variants, choose from: ' +
+                                ', '.join(quantities))
+        quantities = args.comparison_quantities.split(',')
+        plot_quantities = quantities
+    else:
+        # NOTE: the tables with all quantities, the plots with the main ones only
+        plot_quantities = [quantity for quantity in comparison_plot_quantities
+                           if quantity in quantities]
+
+    comparison_file_base = 'LowriseComparison_' + \
+        args.comparison_label + comparison_ending
+
+    differences = get_comparison_differences(
+        aligned_variants, quantities, reference_name)
+    norms = get_error_norms(aligned_variants, quantities, reference_name)
+    write_comparison(differences, norms, os_path.join(
+        summaries_folder, comparison_file_base))
+    print('## Error norms of the differences to ' + reference_name + '\n' +
+          get_error_norms_table(norms))
+
+    with PdfPages(os_path.join(reports_folder, comparison_file_base + '.pdf')) as report_pdf:
+        plot_pressure_taps_comparison(
+            aligned_variants, plot_quantities, report_pdf, reference_name)
+
+    print('## Comparison ' + args.comparison_label + ' of ' + str(len(aligned_variants)) + ' variants and ' +
+          str(len(aligned_variants[reference_name]['label'])) + ' taps finished')
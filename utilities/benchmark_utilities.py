@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the benchmarks of the stages of the evaluation on
+synthetic data, the timings against the series length and the number
+of taps, their scaling and the comparison between versions
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import json
+import tempfile
+import time
+from os import path as os_path
+
+import numpy as np
+from matplotlib.backends.backend_pdf import PdfPages
+
+from utilities.evaluation_utilities import get_fit_settings
+from utilities.export_utilities import export_summary_to_text
+from utilities.file_utilities import get_tabular_data, get_position_from_header
+from utilities.other_utilities import get_ramp_up_index, get_cp_series, get_reference_values
+from utilities.plot_utilities import plot_limits, plot_pressure_tap_cp_results
+from utilities.statistic_utilities import get_general_statistics, get_block_maxima, get_velocity_spectra, get_velocity_and_pressure_autocorrelation
+from utilities.synthetic_utilities import generate_synthetic_case
+
+
+benchmark_stages = ['get_tabular_data', 'get_cp_series', 'get_general_statistics', 'get_block_maxima',
+                    'get_velocity_spectra', 'autocorrelation', 'plotting', 'export']
+
+
+def get_best_time(function, repeats):
+    # smallest wall time of repeats calls, the result of the last call
+
+    best_time = np.inf
+    for _ in range(max(repeats, 1)):
+        start_time = time.perf_counter()
+        function_result = function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, function_result
+
+
+def benchmark_result_case(result, input_data_folder, args, scratch_folder):
+    '''
+    Times the stages of the evaluation of one result case,
+    each the best of args.benchmark_repeats runs, for all taps together.
+    Returns the dictionary of the time of each stage.
+    '''
+
+    repeats = args.benchmark_repeats
+    timings = {}
+
+    ref_file = os_path.join(input_data_folder, os_path.normpath(
+        result['reference_points'][0]['file_name']))
+    tap_files = [os_path.join(input_data_folder, os_path.normpath(pressure_tap['file_name']))
+                 for pressure_tap in result['pressure_taps']]
+
+    timings['get_tabular_data'], series = get_best_time(
+        lambda: [get_tabular_data(file) for file in [ref_file] + tap_files], repeats)
+    reference_series = series[0]
+    tap_series = series[1:]
+    reference_values = get_reference_values(reference_series)
+
+    timings['get_cp_series'], cp_series = get_best_time(
+        lambda: [get_cp_series(series['pressure'], reference_series, result['density'],
+                               args.cp_mode, reference_values)
+                 for series in tap_series], repeats)
+
+    # NOTE: the same time steps for all taps of a synthetic case
+    post_ramp_up_index = get_ramp_up_index(
+        reference_series['time'], result['ramp_up_time'])
+
+    timings['get_general_statistics'], general_statistics = get_best_time(
+        lambda: [get_general_statistics(cp[post_ramp_up_index:], args.calculate_mode, args.pdf_case)
+                 for cp in cp_series], repeats)
+
+    timings['get_block_maxima'], extreme_value_statistics = get_best_time(
+        lambda: [get_block_maxima(cp[post_ramp_up_index:], post_ramp_up_index, args.nr_of_blocks,
+                                  args.calculate_mode, args.pdf_case, get_fit_settings(args))
+                 for cp in cp_series], repeats)
+
+    timings['get_velocity_spectra'], _ = get_best_time(
+        lambda: get_velocity_spectra(reference_series['time'][post_ramp_up_index:],
+                                     reference_series['velocity_x'][post_ramp_up_index:],
+                                     nr_of_segments=args.spectra_segments,
+                                     nr_of_bins=args.spectra_bins or None), repeats)
+
+    timings['autocorrelation'], _ = get_best_time(
+        lambda: get_velocity_and_pressure_autocorrelation(reference_series['time'][post_ramp_up_index:],
+                                                          reference_series['velocity_x'][post_ramp_up_index:],
+                                                          reference_series['pressure'][post_ramp_up_index:],
+                                                          max_lag=plot_limits['autocorr']['x'][1]), repeats)
+
+    pressure_taps = []
+    for tap_idx, tap_file in enumerate(tap_files):
+        pressure_tap = {}
+        pressure_tap['label'] = str(tap_idx + 1)
+        pressure_tap['position'] = get_position_from_header(
+            tap_file, result['case'])
+        pressure_tap['post_ramp_up_index'] = post_ramp_up_index
+        pressure_tap['series'] = dict(tap_series[tap_idx])
+        pressure_tap['series']['cp'] = cp_series[tap_idx]
+        pressure_tap['statistics'] = {}
+        pressure_tap['statistics']['cp'] = {}
+        pressure_tap['statistics']['cp']['general'] = general_statistics[tap_idx]
+        pressure_tap['statistics']['cp']['extreme_value'] = extreme_value_statistics[tap_idx]
+        pressure_taps.append(pressure_tap)
+
+    def plot_pressure_taps():
+        with PdfPages(os_path.join(scratch_folder, 'BenchmarkReport.pdf')) as report_pdf:
+            for pressure_tap in pressure_taps:
+                plot_pressure_tap_cp_results(pressure_tap, args.calculate_mode, report_pdf,
+                                             args.decimation_buckets)
+
+    timings['plotting'], _ = get_best_time(plot_pressure_taps, repeats)
+
+    timings['export'], _ = get_best_time(
+        lambda: export_summary_to_text(pressure_taps, args.calculate_mode), repeats)
+
+    return timings
+
+
+def run_benchmarks(args):
+    '''
+    Benchmarks the stages for all combinations of series length and number
+    of taps in args.benchmark_samples and args.benchmark_taps, each on
+    a synthetic case written to a temporary folder.
+    Returns the benchmark dictionary with the settings and the timings.
+    '''
+
+    # NOTE: checks the fit settings before any synthetic case is generated
+    fit_settings = get_fit_settings(args)
+
+    benchmark = {}
+    benchmark['label'] = args.benchmark_label
+    benchmark['settings'] = {key: getattr(args, key) for key in ['benchmark_file_format', 'benchmark_time_step',
+                                                                 'benchmark_length_scale', 'benchmark_turbulence_intensity',
+                                                                 'benchmark_repeats', 'benchmark_seed',
+                                                                 'calculate_mode', 'cp_mode', 'pdf_case', 'nr_of_blocks',
+                                                                 'fit_distribution', 'fit_method', 'design_non_exceedance',
+                                                                 'spectra_segments', 'spectra_bins',
+                                                                 'text_rendering', 'decimation_buckets']}
+    if fit_settings is not None:
+        benchmark['settings']['fit_method'] = fit_settings['method']
+    benchmark['timings'] = []
+
+    for nr_of_samples in [int(item) for item in args.benchmark_samples.split(',')]:
+        for nr_of_taps in [int(item) for item in args.benchmark_taps.split(',')]:
+            with tempfile.TemporaryDirectory() as scratch_folder:
+                result = generate_synthetic_case(scratch_folder, args.benchmark_file_format + 'Synthetic',
+                                                 nr_of_taps, nr_of_samples,
+                                                 time_step=args.benchmark_time_step,
+                                                 turbulence_intensity=args.benchmark_turbulence_intensity,
+                                                 length_scale=args.benchmark_length_scale,
+                                                 seed=args.benchmark_seed)
+                timings = benchmark_result_case(
+                    result, scratch_folder, args, scratch_folder)
+
+            for stage in benchmark_stages:
+                benchmark['timings'].append({'nr_of_samples': nr_of_samples,
+                                             'nr_of_taps': nr_of_taps,
+                                             'stage': stage,
+                                             'time': timings[stage]})
+            print('## Benchmark for ' + str(nr_of_samples) + ' samples and ' + str(nr_of_taps) + ' taps: ' +
+                  '%.3f s' % sum(timings.values()))
+
+    return benchmark
+
+
+def get_benchmark_times(benchmark, stage, nr_of_samples=None, nr_of_taps=None):
+    # the sample counts, tap counts and times of stage, for the given series length or number of taps only
+
+    timings = [timing for timing in benchmark['timings'] if timing['stage'] == stage and
+               nr_of_samples in [None, timing['nr_of_samples']] and
+               nr_of_taps in [None, timing['nr_of_taps']]]
+
+    return (np.array([timing['nr_of_samples'] for timing in timings]),
+            np.array([timing['nr_of_taps'] for timing in timings]),
+            np.array([timing['time'] for timing in timings]))
+
+
+def get_scaling_exponent(sizes, times):
+    # slope of the log-log fit, time ~ size**exponent, None for less than two sizes
+
+    if len(np.unique(sizes)) < 2:
+        return None
+
+    return np.polyfit(np.log(sizes), np.log(np.maximum(times, 1e-9)), 1)[0]
+
+
+def get_benchmark_table(benchmark):
+    '''
+    Table of the times of the stages (rows) for each series length and number
+    of taps (columns, samples/taps) and the scaling exponents: against the series
+    length for the largest number of taps and against the number of taps for
+    the longest series
+    '''
+
+    configurations = sorted({(timing['nr_of_samples'], timing['nr_of_taps'])
+                             for timing in benchmark['timings']})
+    max_nr_of_samples = max(configuration[0]
+                            for configuration in configurations)
+    max_nr_of_taps = max(configuration[1] for configuration in configurations)
+
+    lines = ['%-24s ' % 'stage' +
+             ' '.join('%14s' % (str(nr_of_samples) + '/' + str(nr_of_taps))
+                      for nr_of_samples, nr_of_taps in configurations) +
+             ' %12s %12s' % ('exp. samples', 'exp. taps')]
+
+    for stage in benchmark_stages:
+        line = '%-24s ' % stage + ' '.join('%14.4f' % get_benchmark_times(benchmark, stage, nr_of_samples, nr_of_taps)[2][0]
+                                           for nr_of_samples, nr_of_taps in configurations)
+
+        for sizes_idx, kwargs in [(0, {'nr_of_taps': max_nr_of_taps}),
+                                  (1, {'nr_of_samples': max_nr_of_samples})]:
+            times = get_benchmark_times(benchmark, stage, **kwargs)
+            exponent = get_scaling_exponent(times[sizes_idx], times[2])
+            line += ' %12s' % ('-' if exponent is None else '%.2f' % exponent)
+
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def get_scaling_curves(benchmark):
+    '''
+    Times of each stage against the series length for the largest
+    number of taps and against the number of taps for the longest series,
+    as plotted by plot_benchmark_scaling_curves
+    '''
+
+    max_nr_of_samples = max(timing['nr_of_samples']
+                            for timing in benchmark['timings'])
+    max_nr_of_taps = max(timing['nr_of_taps']
+                         for timing in benchmark['timings'])
+
+    scaling_curves = {}
+    scaling_curves['label'] = benchmark['label']
+    scaling_curves['max_nr_of_samples'] = max_nr_of_samples
+    scaling_curves['max_nr_of_taps'] = max_nr_of_taps
+    scaling_curves['samples'] = {}
+    scaling_curves['taps'] = {}
+    for stage in benchmark_stages:
+        nr_of_samples, _, times = get_benchmark_times(
+            benchmark, stage, nr_of_taps=max_nr_of_taps)
+        scaling_curves['samples'][stage] = (nr_of_samples, times)
+        _, nr_of_taps, times = get_benchmark_times(
+            benchmark, stage, nr_of_samples=max_nr_of_samples)
+        scaling_curves['taps'][stage] = (nr_of_taps, times)
+
+    return scaling_curves
+
+
+def get_benchmark_comparison_table(benchmark, previous_benchmark):
+    '''
+    Ratio of the times to the ones of previous_benchmark per stage,
+    the geometric mean over the configurations present in both
+    (below 1 is faster)
+    '''
+
+    previous_times = {(timing['nr_of_samples'], timing['nr_of_taps'], timing['stage']): timing['time']
+                      for timing in previous_benchmark['timings']}
+
+    lines = ['%-24s %8s %14s' % ('stage', 'configs', 'ratio to ' + previous_benchmark['label'])]
+    for stage in benchmark_stages:
+        ratios = []
+        for timing in benchmark['timings']:
+            key = (timing['nr_of_samples'], timing['nr_of_taps'], timing['stage'])
+            if timing['stage'] == stage and key in previous_times:
+                ratios.append(timing['time'] / max(previous_times[key], 1e-9))
+        lines.append('%-24s %8d %14s' % (stage, len(ratios),
+                                         '-' if len(ratios) == 0 else '%.3f' % np.exp(np.mean(np.log(np.maximum(ratios, 1e-9))))))
+
+    return '\n'.join(lines)
+
+
+def write_benchmark(benchmark, benchmark_file):
+    with open(benchmark_file, 'w') as f:
+        json.dump(benchmark, f, indent=2)
+
+
+def read_benchmark(benchmark_file):
+    with open(benchmark_file, 'r') as f:
+        return json.load(f)
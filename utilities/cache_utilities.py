@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains caching functions, parsed series are stored as binary
+.npy sidecar files which are loaded memory-mapped on repeated evaluations,
+computed statistics in a result cache keyed by the file signatures
+with LRU eviction
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import hashlib
+import json
+import os
+import pickle
+from os import path as os_path
+
+import numpy as np
+
+
+def get_file_content_hash(file, chunk_size=2**24):
+    file_hash = hashlib.sha1()
+
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+# content hashes of the files hashed so far in this process,
+# by absolute path, size and modification time
+file_content_hashes = {}
+
+
+def get_file_content_hash_once(file):
+    # the content hash, computed only once per process for an unchanged file
+
+    file_stat = os.stat(file)
+    file_key = (os_path.abspath(file), file_stat.st_size, file_stat.st_mtime_ns)
+
+    if file_key not in file_content_hashes:
+        file_content_hashes[file_key] = get_file_content_hash(file)
+
+    return file_content_hashes[file_key]
+
+
+def get_file_signature(file, cache_validation='mtime'):
+    '''
+    Signature used for invalidating the cache:
+    'mtime' -> file size and modification time (cheap)
+    'hash' -> file size and content hash (robust, reads the file once per process)
+    '''
+
+    file_stat = os.stat(file)
+
+    signature = {}
+    signature['size'] = file_stat.st_size
+
+    if cache_validation == 'mtime':
+        signature['mtime'] = file_stat.st_mtime_ns
+    elif cache_validation == 'hash':
+        signature['hash'] = get_file_content_hash_once(file)
+    else:
+        raise Exception('Cache validation: ' + cache_validation +
+                        ' not implemented, choose either mtime or hash')
+
+    return signature
+
+
+def get_cache_prefix(file, cache_folder=None, dtype='float64'):
+    # NOTE: without a cache folder the sidecar files are put next to the input
+    # with a cache folder a hash of the absolute path avoids name clashes
+    # the dtype only if not the default, so that the existing entries stay valid
+    dtype_ending = '' if dtype == 'float64' else '_' + dtype
+
+    if cache_folder is None:
+        return file + '.cache' + dtype_ending
+
+    path_hash = hashlib.sha1(os_path.abspath(
+        file).encode('utf-8')).hexdigest()[:12]
+    return os_path.join(cache_folder, os_path.basename(file) + '_' + path_hash + dtype_ending)
+
+
+def load_cached_point_data(file, result_case, cache_folder=None, cache_validation='mtime', dtype='float64'):
+    '''
+    Returns the point data (position and series) from the cache,
+    the series are memory-mapped, None if there is no valid cache entry
+    '''
+
+    cache_prefix = get_cache_prefix(file, cache_folder, dtype)
+
+    try:
+        with open(cache_prefix + '.meta.json', 'r') as f:
+            meta = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if meta['result_case'] != result_case or meta['signature'] != get_file_signature(file, cache_validation):
+        print('## Cache outdated for ' + file)
+        return None
+
+    point_data = {}
+    point_data['position'] = meta['position']
+    point_data['series'] = {}
+
+    for key in meta['series']:
+        # NOTE: empty arrays cannot be memory-mapped
+        if meta['series'][key] > 0:
+            point_data['series'][key] = np.load(
+                cache_prefix + '.' + key + '.npy', mmap_mode='r')
+        else:
+            point_data['series'][key] = np.load(
+                cache_prefix + '.' + key + '.npy')
+
+    return point_data
+
+
+def save_cached_point_data(file, result_case, point_data, cache_folder=None, cache_validation='mtime', dtype='float64'):
+
+    if cache_folder is not None and not os_path.isdir(cache_folder):
+        os.makedirs(cache_folder)
+
+    cache_prefix = get_cache_prefix(file, cache_folder, dtype)
+
+    for key, value in point_data['series'].items():
+        # write to a temporary file first so that an aborted run
+        # does not leave a truncated array behind
+        with open(cache_prefix + '.' + key + '.npy.tmp', 'wb') as f:
+            np.save(f, np.asarray(value))
+        os.replace(cache_prefix + '.' + key + '.npy.tmp',
+                   cache_prefix + '.' + key + '.npy')
+
+    meta = {}
+    meta['result_case'] = result_case
+    meta['signature'] = get_file_signature(file, cache_validation)
+    meta['position'] = [float(coordinate)
+                        for coordinate in point_data['position']]
+    meta['series'] = {key: len(value)
+                      for key, value in point_data['series'].items()}
+
+    # meta file written last, marks the cache entry as complete
+    with open(cache_prefix + '.meta.json.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(cache_prefix + '.meta.json.tmp', cache_prefix + '.meta.json')
+
+
+def get_result_cache_key(key_items):
+    '''
+    Content address of a cache entry: hash over the (json serializable)
+    items, e.g. content hashes of the input files and all parameters
+    the statistics depend on
+    '''
+
+    return hashlib.sha1(json.dumps(key_items, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def load_cached_result(cache_key, cache_folder):
+    '''
+    Returns the cached result for the key, None if there is none.
+    The modification time of a used entry is updated, it is the
+    last use for the LRU eviction.
+    '''
+
+    cache_file = os_path.join(cache_folder, 'ResultCache_' + cache_key + '.pkl')
+
+    try:
+        with open(cache_file, 'rb') as f:
+            result = pickle.load(f)
+        os.utime(cache_file)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+    return result
+
+
+# running estimate of the result cache size in bytes by cache folder:
+# the size found by the last listing plus the entries written since in this process
+result_cache_sizes = {}
+
+
+def save_cached_result(cache_key, result, cache_folder, max_cache_size=1024.0):
+    '''
+    Stores the result for the key, the least recently used entries are
+    evicted once the estimated cache size exceeds max_cache_size MB
+    '''
+
+    if not os_path.isdir(cache_folder):
+        os.makedirs(cache_folder, exist_ok=True)
+
+    cache_file = os_path.join(cache_folder, 'ResultCache_' + cache_key + '.pkl')
+
+    # NOTE: unique temporary file as several processes can write at once
+    with open(cache_file + '.' + str(os.getpid()) + '.tmp', 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        entry_size = f.tell()
+    os.replace(cache_file + '.' + str(os.getpid()) + '.tmp', cache_file)
+
+    # NOTE: the folder is only listed on the first save and once the estimate exceeds
+    # the limit, the entries of other processes are only counted by the next listing,
+    # evicted down to 90 % of the limit to leave room for the next entries
+    if cache_folder in result_cache_sizes and \
+            result_cache_sizes[cache_folder] + entry_size <= max_cache_size * 1024**2:
+        result_cache_sizes[cache_folder] += entry_size
+    else:
+        result_cache_sizes[cache_folder] = evict_cached_results(
+            cache_folder, 0.9 * max_cache_size)
+
+
+def evict_cached_results(cache_folder, max_cache_size=1024.0):
+    '''
+    Evicts the least recently used entries until the total size is
+    at most max_cache_size MB, returns the remaining size in bytes
+    '''
+
+    entries = []
+    for file_name in os.listdir(cache_folder):
+        if file_name.startswith('ResultCache_') and file_name.endswith('.pkl'):
+            try:
+                file_stat = os.stat(os_path.join(cache_folder, file_name))
+            except OSError:
+                # removed by another process
+                continue
+            entries.append(
+                (file_stat.st_mtime_ns, file_stat.st_size, file_name))
+
+    cache_size = sum(entry[1] for entry in entries)
+
+    for _, file_size, file_name in sorted(entries):
+        if cache_size <= max_cache_size * 1024**2:
+            break
+        try:
+            os.remove(os_path.join(cache_folder, file_name))
+        except OSError:
+            pass
+        cache_size -= file_size
+
+    return cache_size
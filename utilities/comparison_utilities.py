@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the comparison of result cases and cp modes from the
+already computed statistics: the summaries or the results data of the
+compute stage are loaded, no series are read or evaluated
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import csv
+import re
+from os import path as os_path
+
+import numpy as np
+try:
+    # optional, only needed for the parquet summaries
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from utilities.export_utilities import get_summary_columns
+from utilities.file_utilities import read_results_data
+from utilities.other_utilities import get_cp_mode_ending
+
+
+# the columns which are no statistics
+comparison_skip_columns = ['label', 'position_x', 'position_y', 'position_z']
+
+# the ones plotted by default, as on the overview pages of the reports
+comparison_plot_quantities = ['mean', 'std', 'kurtosis', 'skewness', 'min', 'max',
+                              'cev_mean', 'aev_mean', 'cev_design', 'aev_design']
+
+norm_columns = ['variant', 'quantity', 'nr_of_taps',
+                'max_abs', 'tap_of_max_abs', 'rms', 'relative_l2']
+
+
+def get_variant_name(result_case, cp_mode):
+    # e.g. Kratos_New, as in the file names of the summaries
+    return result_case + get_cp_mode_ending(cp_mode)
+
+
+def read_summary_text(summary_file):
+    '''
+    The summary columns from a legacy text summary,
+    with the values rounded to 3 digits as written
+    '''
+
+    with open(summary_file) as f:
+        lines = f.readlines()
+
+    value_names = lines[0].split()[3:]
+
+    labels = []
+    positions = []
+    values = []
+    for line in lines[1:]:
+        # e.g. 1 [-13.75, 0.0, 1.1] -0.714 0.274 ...
+        match = re.match(r'\s*(\S+)\s+\[(.*)\](.*)', line)
+        if match is None:
+            continue
+        labels.append(match.group(1))
+        positions.append([float(item) for item in match.group(2).split(',')])
+        values.append([float(item) for item in match.group(3).split()])
+
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+    values = np.array(values, dtype=np.float64).reshape(-1, len(value_names))
+
+    columns = {}
+    columns['label'] = np.array(labels)
+    for axis_idx, axis in enumerate(['x', 'y', 'z']):
+        columns['position_' + axis] = positions[:, axis_idx]
+    for value_idx, value_name in enumerate(value_names):
+        columns[value_name] = values[:, value_idx]
+
+    return columns
+
+
+def read_summary_csv(summary_file):
+    # the summary columns from a .csv summary, the label as str
+
+    with open(summary_file, newline='') as f:
+        rows = list(csv.reader(f))
+
+    columns = {}
+    for column_idx, column_name in enumerate(rows[0]):
+        column = [row[column_idx] for row in rows[1:]]
+        columns[column_name] = np.array(column) if column_name == 'label' else \
+            np.array(column, dtype=np.float64)
+
+    return columns
+
+
+def read_results_data_summary(results_data_file, cp_mode):
+    # the summary columns from the statistics in the results data, without reading the series and pdfs
+
+    with np.load(results_data_file) as results_data:
+        meta = read_results_data(results_data, 'meta')
+        if cp_mode not in meta['cp_modes']:
+            return None
+        pressure_taps = [read_results_data(results_data, 'pressure_taps/' + cp_mode + '/' + str(tap_idx + 1),
+                                           skip_keys=['series', 'pdf', 'idx', 'val'])
+                         for tap_idx in range(meta['nr_of_pressure_taps'])]
+
+    return get_summary_columns(pressure_taps, meta['calculate_mode'])
+
+
+def load_variant_columns(result_case, cp_mode, folders, endings):
+    '''
+    The summary columns of a result case and cp mode from the first available of:
+    the .npz, .parquet or .csv summary (full precision), the results data of the
+    compute stage (full precision) or the legacy text summary (rounded to 3 digits).
+    Returns the columns and the file these are loaded from, None for both if not evaluated.
+    '''
+
+    summary_file = os_path.join(folders['summaries'], 'LowriseSummary_' +
+                                get_variant_name(result_case, cp_mode) + endings['summary'])
+    file_base = os_path.splitext(summary_file)[0]
+
+    if os_path.isfile(file_base + '.npz'):
+        with np.load(file_base + '.npz') as summary:
+            return {name[len('summary/'):]: summary[name] for name in summary.files
+                    if name.startswith('summary/')}, file_base + '.npz'
+
+    if pyarrow is not None and os_path.isfile(file_base + '.parquet'):
+        table = pyarrow.parquet.read_table(file_base + '.parquet')
+        return {column_name: table[column_name].to_numpy()
+                for column_name in table.column_names}, file_base + '.parquet'
+
+    if os_path.isfile(file_base + '.csv'):
+        return read_summary_csv(file_base + '.csv'), file_base + '.csv'
+
+    results_data_file = os_path.join(
+        folders['results_data'], 'LowriseResults_' + result_case + endings['results_data'])
+    if os_path.isfile(results_data_file):
+        columns = read_results_data_summary(results_data_file, cp_mode)
+        if columns is not None:
+            return columns, results_data_file
+
+    if os_path.isfile(summary_file):
+        print('## Only the legacy summary with values rounded to 3 digits available for ' +
+              get_variant_name(result_case, cp_mode))
+        return read_summary_text(summary_file), summary_file
+
+    print('## No summary or results data for result case ' + result_case + ' and cp_mode ' + cp_mode +
+          ' in ' + folders['summaries'] + ' or ' + folders['results_data'] + ', not compared')
+    return None, None
+
+
+def align_variant_columns(variants):
+    '''
+    The columns of the variants (dictionary of variant name and columns) restricted
+    to the taps present in all, in the order of the first variant, and to the
+    statistics present in all
+    '''
+
+    variant_names = list(variants.keys())
+    reference_labels = [str(label) for label in variants[variant_names[0]]['label']]
+
+    common_labels = set(reference_labels)
+    for columns in variants.values():
+        common_labels &= set(str(label) for label in columns['label'])
+    labels = [label for label in reference_labels if label in common_labels]
+
+    for variant_name, columns in variants.items():
+        if len(columns['label']) != len(labels):
+            print('## Variant ' + variant_name + ': ' + str(len(columns['label']) - len(labels)) +
+                  ' taps not in all variants, not compared')
+
+    quantities = [column_name for column_name in variants[variant_names[0]]
+                  if column_name not in comparison_skip_columns and
+                  all(column_name in columns for columns in variants.values())]
+
+    aligned_variants = {}
+    for variant_name, columns in variants.items():
+        tap_idx = {str(label): idx for idx, label in enumerate(columns['label'])}
+        order = np.array([tap_idx[label] for label in labels], dtype=np.int64)
+        aligned_variants[variant_name] = {'label': np.array(labels)}
+        for column_name in ['position_x', 'position_y', 'position_z'] + quantities:
+            aligned_variants[variant_name][column_name] = np.asarray(
+                columns[column_name], dtype=np.float64)[order]
+
+    return aligned_variants, quantities
+
+
+def get_comparison_differences(aligned_variants, quantities, reference_name):
+    # per tap differences of each variant to the reference variant, long format
+
+    reference = aligned_variants[reference_name]
+    nr_of_taps = len(reference['label'])
+
+    variant_names = []
+    quantity_names = []
+    labels = []
+    reference_values = []
+    values = []
+    for variant_name, columns in aligned_variants.items():
+        if variant_name == reference_name:
+            continue
+        for quantity in quantities:
+            variant_names.append(np.full(nr_of_taps, variant_name))
+            quantity_names.append(np.full(nr_of_taps, quantity))
+            labels.append(reference['label'])
+            reference_values.append(reference[quantity])
+            values.append(columns[quantity])
+
+    differences = {}
+    differences['variant'] = np.concatenate(variant_names) if variant_names else np.array([], dtype=str)
+    differences['quantity'] = np.concatenate(quantity_names) if variant_names else np.array([], dtype=str)
+    differences['label'] = np.concatenate(labels) if variant_names else np.array([], dtype=str)
+    differences['reference'] = np.concatenate(reference_values) if variant_names else np.array([])
+    differences['value'] = np.concatenate(values) if variant_names else np.array([])
+    differences['difference'] = differences['value'] - differences['reference']
+
+    return differences
+
+
+def get_error_norms(aligned_variants, quantities, reference_name):
+    '''
+    Error norms of the differences to the reference variant per variant and quantity,
+    over the taps with finite values: maximum absolute difference (and its tap),
+    root mean square and the L2 norm relative to the one of the reference
+    '''
+
+    reference = aligned_variants[reference_name]
+
+    norms = []
+    for variant_name, columns in aligned_variants.items():
+        if variant_name == reference_name:
+            continue
+        for quantity in quantities:
+            difference = columns[quantity] - reference[quantity]
+            is_finite = np.isfinite(difference)
+
+            norm = {'variant': variant_name,
+                    'quantity': quantity,
+                    'nr_of_taps': int(np.sum(is_finite))}
+            if norm['nr_of_taps'] == 0:
+                norm.update(max_abs=np.nan, tap_of_max_abs='',
+                            rms=np.nan, relative_l2=np.nan)
+            else:
+                abs_difference = np.abs(difference[is_finite])
+                max_idx = np.argmax(abs_difference)
+                reference_l2 = np.linalg.norm(reference[quantity][is_finite])
+                norm['max_abs'] = float(abs_difference[max_idx])
+                norm['tap_of_max_abs'] = str(reference['label'][is_finite][max_idx])
+                norm['rms'] = float(np.sqrt(np.mean(abs_difference**2)))
+                norm['relative_l2'] = float(np.linalg.norm(abs_difference) / reference_l2) \
+                    if reference_l2 > 0.0 else np.nan
+            norms.append(norm)
+
+    return norms
+
+
+def get_error_norms_table(norms):
+    # console table of the error norms
+
+    lines = ['%-28s %-16s %6s %12s %8s %12s %12s' % ('variant', 'quantity', 'taps', 'max abs',
+                                                     'at tap', 'rms', 'rel. L2')]
+    for norm in norms:
+        lines.append('%-28s %-16s %6d %12.4g %8s %12.4g %12.4g' % (norm['variant'], norm['quantity'], norm['nr_of_taps'],
+                                                                   norm['max_abs'], norm['tap_of_max_abs'],
+                                                                   norm['rms'], norm['relative_l2']))
+
+    return '\n'.join(lines)
+
+
+def write_comparison(differences, norms, file_base):
+    # the per tap differences to file_base + '_Differences.csv' and the norms to '_Norms.csv'
+
+    with open(file_base + '_Differences.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(differences.keys()))
+        writer.writerows(zip(*[column.tolist() for column in differences.values()]))
+
+    with open(file_base + '_Norms.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=norm_columns)
+        writer.writeheader()
+        writer.writerows(norms)
@@ -0,0 +1,1071 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the evaluation of the pressure taps of a result case,
+serial or fanned out to a process pool
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import os
+import tempfile
+import time
+import zipfile
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from multiprocessing import shared_memory
+from os import path as os_path
+from types import SimpleNamespace
+
+import numpy as np
+from matplotlib import pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+try:
+    # optional, only needed for merging the pages rendered in parallel
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+from utilities.cache_utilities import get_file_signature, get_result_cache_key, load_cached_result, save_cached_result
+from utilities.file_utilities import pop_parse_statistics, add_parse_statistics, print_parse_statistics, initialize_point_data, load_case_store, get_point_data_from_case_store, get_position_from_header, read_point_file_in_chunks, write_results_data, read_results_data
+from utilities.other_utilities import get_ramp_up_index, get_cp_series, get_cp_mode_ending, get_reference_values, get_series_in_dtype, get_pot_threshold_quantiles
+from utilities.statistic_utilities import get_general_statistics, get_general_statistics_batch, get_general_statistics_from_batch, get_extreme_values_statistics_batch, get_velocity_spectra, check_pdf_kde_binned_accuracy, get_velocity_and_pressure_autocorrelation, initialize_streaming_moments, update_streaming_moments, get_streaming_pdf_settings, update_streaming_pdf, get_streaming_general_statistics, initialize_streaming_block_maxima, update_streaming_block_maxima, get_streaming_block_maxima, extreme_value_fit_methods
+from utilities.plot_utilities import plot_limits, plot_ref_point_pressure_results, plot_ref_point_velocity_spectra, plot_ref_point_velocity_and_pressure_autocorrelation, plot_pressure_tap_cp_results, plot_pressure_taps_general_statistics, plot_pressure_taps_extreme_values, get_pressure_tap_cp_template, plot_pressure_tap_cp_results_with_template
+from utilities.export_utilities import export_summaries, get_summary_columns
+from utilities.comparison_utilities import align_variant_columns, get_error_norms, get_error_norms_table
+from utilities.profile_utilities import is_profiling, profile_labels, get_profile_labels, profile_stage
+
+
+# reference series attached to the shared memory in each worker process
+shared_reference_series = {}
+shared_memory_blocks = []
+
+
+def get_case_store_files(result, input_data_folder):
+    return [os_path.join(input_data_folder, os_path.normpath(pressure_tap['file_name']))
+            for pressure_tap in result['pressure_taps']]
+
+
+def get_fit_settings(args):
+    '''
+    Extreme value distribution fitted to the extremes, none if not set.
+    Without a fit method the default one of the distribution is used.
+    '''
+
+    if args.fit_distribution is None:
+        return None
+
+    if args.fit_distribution not in extreme_value_fit_methods:
+        raise Exception('Extreme value distribution ' + args.fit_distribution + ' not implemented, choose either ' +
+                        ' or '.join(extreme_value_fit_methods.keys()))
+    fit_methods = extreme_value_fit_methods[args.fit_distribution]
+    if args.fit_method is not None and args.fit_method not in fit_methods:
+        raise Exception('Fit method ' + args.fit_method + ' not implemented for ' + args.fit_distribution +
+                        ', choose either ' + ', '.join(fit_methods))
+
+    fit_settings = {}
+    fit_settings['distribution'] = args.fit_distribution
+    fit_settings['method'] = args.fit_method or fit_methods[0]
+    fit_settings['non_exceedance'] = args.design_non_exceedance
+
+    return fit_settings
+
+
+def get_result_cache_folder(args, input_data_folder):
+    # NOTE: without a cache folder the result cache is put into the input folder
+    return os_path.join(args.cache_folder or input_data_folder, 'result_cache')
+
+
+def get_pressure_tap_cache_key(result, tap_idx, cp_mode, args, input_data_folder):
+    '''
+    Address of the statistics of a tap: signatures of the tap and the reference
+    point file (by args.cache_validation, so without reading them unless 'hash')
+    and all settings the cp and the statistics depend on
+    '''
+
+    key_items = {}
+    key_items['kind'] = 'pressure_tap'
+    key_items['pressure_tap'] = result['pressure_taps'][tap_idx]
+    key_items['label'] = str(tap_idx + 1)
+    key_items['tap_file'] = get_file_signature(os_path.join(
+        input_data_folder, os_path.normpath(result['pressure_taps'][tap_idx]['file_name'])), args.cache_validation)
+    key_items['reference_point'] = result['reference_points'][0]['file_name']
+    key_items['reference_file'] = get_file_signature(os_path.join(
+        input_data_folder, os_path.normpath(result['reference_points'][0]['file_name'])), args.cache_validation)
+    key_items['case'] = result['case']
+    key_items['cp_mode'] = cp_mode
+    key_items['density'] = result['density']
+    key_items['ramp_up_time'] = result['ramp_up_time']
+    for key in ['nr_of_blocks', 'calculate_mode', 'pdf_case', 'extreme_value_case',
+                'pot_min_separation', 'streaming']:
+        key_items[key] = getattr(args, key)
+    # NOTE: the sweep only if set, so that the existing entries stay valid
+    threshold_quantiles = get_pot_threshold_quantiles(args.pot_threshold_quantile)
+    key_items['pot_threshold_quantile'] = threshold_quantiles[0]
+    if len(threshold_quantiles) > 1:
+        key_items['pot_threshold_sweep'] = threshold_quantiles
+    key_items['fit_settings'] = get_fit_settings(args)
+    # NOTE: only if not the default, so that the existing entries stay valid
+    if args.dtype != 'float64':
+        key_items['dtype'] = args.dtype
+
+    return get_result_cache_key(key_items)
+
+
+def evaluate_pressure_taps(result, tap_indices, reference_series, args, input_data_folder, cp_modes=None, reference_values=None, load_series=True):
+    '''
+    Loads the taps with the given indices, calculates the cp and evaluates
+    the statistics (only after ramp-up time). Each tap file is loaded once
+    and the cp for all cp_modes is derived from the same arrays.
+    Returns for each tap (in the order of tap_indices) a dictionary with
+    the updated tap dictionary for each cp mode.
+    The general statistics are always evaluated by the batched function, for
+    groups of series with the same length, so that the results do not depend
+    on how the taps are split between processes.
+    With args.use_result_cache the cached statistics are looked up before
+    loading, a tap cached for all cp_modes is only loaded if load_series,
+    otherwise it has no series
+    '''
+
+    if cp_modes is None:
+        cp_modes = [args.cp_mode]
+
+    if args.streaming:
+        return evaluate_pressure_taps_streaming(result, tap_indices, reference_series, args, input_data_folder,
+                                                cp_modes, reference_values)
+
+    # statistics of the unchanged taps from the result cache, by the signatures of the files
+    cache_keys = [{} for tap_idx in tap_indices]
+    cached_statistics = [{} for tap_idx in tap_indices]
+    if args.use_result_cache:
+        for list_idx, tap_idx in enumerate(tap_indices):
+            for cp_mode in cp_modes:
+                cache_keys[list_idx][cp_mode] = get_pressure_tap_cache_key(
+                    result, tap_idx, cp_mode, args, input_data_folder)
+                cached_result = load_cached_result(
+                    cache_keys[list_idx][cp_mode], get_result_cache_folder(args, input_data_folder))
+                if cached_result is not None:
+                    cached_statistics[list_idx][cp_mode] = cached_result
+
+    # only the taps with missing statistics or whose series are needed are loaded
+    loaded_list_indices = [list_idx for list_idx in range(len(tap_indices))
+                           if load_series or len(cached_statistics[list_idx]) < len(cp_modes)]
+
+    pressure_taps = []
+
+    if args.use_case_store and len(loaded_list_indices) > 0:
+        # NOTE: without a cache folder the store is put into the input folder
+        case_store = load_case_store(result['case'],
+                                     get_case_store_files(
+                                         result, input_data_folder),
+                                     args.cache_folder or input_data_folder,
+                                     args.cache_validation, args.dtype)
+
+        # cp of all loaded taps in one matrix, the rows are assigned as views
+        # NOTE: the rows are in the order of loaded_list_indices,
+        # computed row by row into the matrix in args.dtype, so that only one row
+        # is promoted to float64 by the reference series at a time
+        matrix_rows = {list_idx: row for row,
+                       list_idx in enumerate(loaded_list_indices)}
+        cp_matrix = {}
+        with profile_labels(case=result['case'], tap=str(tap_indices[0] + 1) + '-' + str(tap_indices[-1] + 1)):
+            for cp_mode in cp_modes:
+                cp_matrix[cp_mode] = np.empty(
+                    (len(loaded_list_indices), case_store['pressure'].shape[1]), dtype=args.dtype)
+                for list_idx, row in matrix_rows.items():
+                    cp_matrix[cp_mode][row] = get_cp_series(case_store['pressure'][tap_indices[list_idx]],
+                                                            reference_series,
+                                                            result['density'],
+                                                            cp_mode,
+                                                            reference_values)
+
+    for list_idx, tap_idx in enumerate(tap_indices):
+        with profile_labels(case=result['case'], tap=str(tap_idx + 1)):
+            pressure_tap = dict(result['pressure_taps'][tap_idx])
+            pressure_tap['label'] = str(tap_idx + 1)
+
+            if list_idx not in loaded_list_indices:
+                # all statistics cached, no series
+                cached_result = cached_statistics[list_idx][cp_modes[0]]
+                pressure_tap['position'] = cached_result['position']
+                pressure_tap['post_ramp_up_index'] = cached_result['post_ramp_up_index']
+                pressure_taps.append({cp_mode: dict(pressure_tap)
+                                      for cp_mode in cp_modes})
+                continue
+
+            # load tap data results, update existing dictionary
+            if args.use_case_store:
+                pressure_tap.update(
+                    get_point_data_from_case_store(case_store, tap_idx))
+            else:
+                pressure_tap_file = os_path.join(
+                    input_data_folder, os_path.normpath(pressure_tap['file_name']))
+                pressure_tap.update(initialize_point_data(
+                    pressure_tap_file, result['case'],
+                    args.use_cache, args.cache_folder, args.cache_validation, args.dtype))
+            # NOTE: already parsed in args.dtype, nothing is copied
+            pressure_tap['series'] = get_series_in_dtype(
+                pressure_tap['series'], args.dtype)
+
+            pressure_tap['post_ramp_up_index'] = get_ramp_up_index(
+                pressure_tap['series']['time'], result['ramp_up_time'])
+
+            # one tap dictionary per cp mode, sharing the loaded series
+            pressure_tap_by_mode = {}
+            for cp_mode in cp_modes:
+                pressure_tap_by_mode[cp_mode] = dict(pressure_tap)
+                pressure_tap_by_mode[cp_mode]['series'] = dict(
+                    pressure_tap['series'])
+
+                if args.use_case_store:
+                    pressure_tap_by_mode[cp_mode]['series']['cp'] = cp_matrix[cp_mode][matrix_rows[list_idx]]
+                else:
+                    # NOTE: computed from the pressure in args.dtype and the float64 reference series,
+                    # i.e. promoted to float64 for this one row, stored in args.dtype
+                    pressure_tap_by_mode[cp_mode]['series']['cp'] = np.asarray(get_cp_series(pressure_tap['series']['pressure'],
+                                                                                             reference_series,
+                                                                                             result['density'],
+                                                                                             cp_mode,
+                                                                                             reference_values), dtype=args.dtype)
+
+            pressure_taps.append(pressure_tap_by_mode)
+
+    # evaluating statistical quantities (only after ramp-up time)
+    # vectorized for all taps with the same series length after ramp-up
+    # the first one for the evaluation, a sweep over all if several
+    threshold_quantiles = get_pot_threshold_quantiles(args.pot_threshold_quantile)
+
+    tap_groups = {}
+    for list_idx in loaded_list_indices:
+        pressure_tap = pressure_taps[list_idx][cp_modes[0]]
+        tap_groups.setdefault((len(pressure_tap['series']['cp']), pressure_tap['post_ramp_up_index']), []).append(
+            list_idx)
+
+    for cp_mode in cp_modes:
+        general_statistics = [None] * len(pressure_taps)
+        extreme_value_statistics = [None] * len(pressure_taps)
+
+        for list_idx in range(len(pressure_taps)):
+            if cp_mode in cached_statistics[list_idx]:
+                general_statistics[list_idx] = cached_statistics[list_idx][cp_mode]['general']
+                extreme_value_statistics[list_idx] = cached_statistics[list_idx][cp_mode]['extreme_value']
+
+        for (series_length, post_ramp_up_index), group in tap_groups.items():
+            group = [list_idx for list_idx in group
+                     if general_statistics[list_idx] is None]
+            if len(group) == 0:
+                continue
+
+            # the group holds list positions, their rows of the cp matrix are a view if contiguous
+            if args.use_case_store:
+                group_rows = [matrix_rows[list_idx] for list_idx in group]
+            if args.use_case_store and group_rows[-1] - group_rows[0] + 1 == len(group_rows):
+                cp_post_ramp_up = cp_matrix[cp_mode][group_rows[0]:group_rows[-1] + 1, post_ramp_up_index:]
+            elif args.use_case_store:
+                cp_post_ramp_up = cp_matrix[cp_mode][group_rows, post_ramp_up_index:]
+            else:
+                cp_post_ramp_up = np.vstack([pressure_taps[list_idx][cp_mode]['series']['cp'][post_ramp_up_index:]
+                                             for list_idx in group])
+
+            # the batch stages are recorded for all taps of the group together
+            with profile_labels(case=result['case'], tap=','.join(pressure_taps[list_idx][cp_mode]['label'] for list_idx in group)):
+                batch_statistics = get_general_statistics_batch(
+                    cp_post_ramp_up, args.calculate_mode, pdf_case=args.pdf_case)
+                # NOTE: assuming a constant time step for the POT min separation
+                time_series = pressure_taps[group[0]][cp_mode]['series']['time']
+                batch_extreme_values = get_extreme_values_statistics_batch(cp_post_ramp_up,
+                                                                           post_ramp_up_index,
+                                                                           args.nr_of_blocks,
+                                                                           args.calculate_mode,
+                                                                           case=args.extreme_value_case,
+                                                                           pdf_case=args.pdf_case,
+                                                                           threshold_quantile=threshold_quantiles[0],
+                                                                           min_separation=int(round(args.pot_min_separation / (time_series[1] - time_series[0]))),
+                                                                           fit_settings=get_fit_settings(args),
+                                                                           threshold_sweep=threshold_quantiles if len(threshold_quantiles) > 1 else None)
+
+            for group_idx, list_idx in enumerate(group):
+                general_statistics[list_idx] = get_general_statistics_from_batch(
+                    batch_statistics, group_idx)
+                extreme_value_statistics[list_idx] = batch_extreme_values[group_idx]
+
+                if args.use_result_cache:
+                    # with the position and the ramp-up index, so that the tap is complete without loading
+                    save_cached_result(cache_keys[list_idx][cp_mode],
+                                       {'general': general_statistics[list_idx],
+                                        'extreme_value': extreme_value_statistics[list_idx],
+                                        'position': pressure_taps[list_idx][cp_mode]['position'],
+                                        'post_ramp_up_index': post_ramp_up_index},
+                                       get_result_cache_folder(args, input_data_folder),
+                                       args.result_cache_size)
+
+            del cp_post_ramp_up
+
+        for list_idx, pressure_tap_by_mode in enumerate(pressure_taps):
+            pressure_tap = pressure_tap_by_mode[cp_mode]
+
+            # evaluating statistical quantities (only after ramp-up time)
+            pressure_tap['statistics'] = {}
+            pressure_tap['statistics']['cp'] = {}
+            pressure_tap['statistics']['cp']['general'] = general_statistics[list_idx]
+            pressure_tap['statistics']['cp']['extreme_value'] = extreme_value_statistics[list_idx]
+
+    return pressure_taps
+
+
+def get_streaming_cp_chunks(pressure_tap_file, result, reference_series, args, cp_modes, reference_values):
+    '''
+    Yields the cp of each cp mode for the chunks of the tap file after ramp-up,
+    together with the number of rows skipped as ramp-up
+    NOTE: the rows of the tap and the reference point are assumed to belong
+    to the same time steps, as for the other paths
+    '''
+
+    ramp_up_threshold = result['ramp_up_time'] + result['ramp_up_time'] / 5
+    row_offset = 0
+    post_ramp_up_index = None
+
+    for series_chunk in read_point_file_in_chunks(pressure_tap_file, args.chunk_size):
+        chunk_length = len(series_chunk['time'])
+
+        if post_ramp_up_index is None:
+            # same criterion as get_ramp_up_index, all later rows are after ramp-up
+            after_ramp_up = np.nonzero(
+                series_chunk['time'] >= ramp_up_threshold)[0]
+            if len(after_ramp_up) == 0:
+                row_offset += chunk_length
+                continue
+            post_ramp_up_index = row_offset + after_ramp_up[0]
+
+        start = max(post_ramp_up_index - row_offset, 0)
+        reference_chunk = {'pressure': reference_series['pressure'][row_offset + start:row_offset + chunk_length]}
+
+        cp_chunk = {}
+        for cp_mode in cp_modes:
+            cp_chunk[cp_mode] = get_cp_series(series_chunk['pressure'][start:],
+                                              reference_chunk,
+                                              result['density'],
+                                              cp_mode,
+                                              reference_values)
+        row_offset += chunk_length
+
+        yield post_ramp_up_index, cp_chunk
+
+    if post_ramp_up_index is None:
+        raise Exception('No time steps after ramp-up in ' + pressure_tap_file)
+
+
+def evaluate_pressure_taps_streaming(result, tap_indices, reference_series, args, input_data_folder, cp_modes=None, reference_values=None):
+    '''
+    Constant-memory counterpart of evaluate_pressure_taps: each tap file is read
+    in chunks of args.chunk_size rows, twice. The first pass accumulates the
+    moments, min and max, the second one the binned KDE counts on the
+    now known grid and the block maxima of the now known blocks.
+    Only the statistics are kept, the taps have no series, so the peak memory
+    is bounded by the chunk size and not by the length of the series.
+    The pdf is always the binned FFT KDE, Block-Maxima the only extreme value case.
+    '''
+
+    if cp_modes is None:
+        cp_modes = [args.cp_mode]
+
+    if args.extreme_value_case != 'BM':
+        raise Exception('Extreme value case ' + args.extreme_value_case +
+                        ' not supported for streaming, choose BM')
+
+    if args.pdf_case != 'KDE_FFT':
+        print('## Streaming evaluation, using the binned FFT KDE instead of ' + args.pdf_case)
+
+    if args.dtype != 'float64':
+        print('## Streaming evaluation, no series are stored, the chunks stay float64 instead of ' + args.dtype)
+
+    if reference_values is None:
+        reference_values = get_reference_values(reference_series)
+
+    pressure_taps = []
+
+    for tap_idx in tap_indices:
+        pressure_tap_file = os_path.join(input_data_folder, os_path.normpath(
+            result['pressure_taps'][tap_idx]['file_name']))
+
+        # unchanged taps are not parsed at all if all cp modes are in the result cache
+        if args.use_result_cache:
+            cache_keys = {cp_mode: get_pressure_tap_cache_key(result, tap_idx, cp_mode, args, input_data_folder)
+                          for cp_mode in cp_modes}
+            cached_taps = {cp_mode: load_cached_result(cache_keys[cp_mode],
+                                                       get_result_cache_folder(args, input_data_folder))
+                           for cp_mode in cp_modes}
+            if all(cached_tap is not None for cached_tap in cached_taps.values()):
+                pressure_taps.append(cached_taps)
+                continue
+
+        with profile_labels(case=result['case'], tap=str(tap_idx + 1)):
+            # first pass: moments, min and max
+            moments = {cp_mode: initialize_streaming_moments()
+                       for cp_mode in cp_modes}
+            for post_ramp_up_index, cp_chunk in get_streaming_cp_chunks(pressure_tap_file, result, reference_series,
+                                                                        args, cp_modes, reference_values):
+                for cp_mode in cp_modes:
+                    update_streaming_moments(moments[cp_mode], cp_chunk[cp_mode])
+
+            # second pass: pdf counts and block maxima
+            pdf_settings = {cp_mode: get_streaming_pdf_settings(moments[cp_mode])
+                            for cp_mode in cp_modes}
+            block_maxima = {cp_mode: initialize_streaming_block_maxima(moments[cp_mode]['n'], args.nr_of_blocks)
+                            for cp_mode in cp_modes}
+            for post_ramp_up_index, cp_chunk in get_streaming_cp_chunks(pressure_tap_file, result, reference_series,
+                                                                        args, cp_modes, reference_values):
+                for cp_mode in cp_modes:
+                    update_streaming_pdf(pdf_settings[cp_mode], cp_chunk[cp_mode])
+                    update_streaming_block_maxima(
+                        block_maxima[cp_mode], cp_chunk[cp_mode])
+
+            pressure_tap_by_mode = {}
+            for cp_mode in cp_modes:
+                pressure_tap = dict(result['pressure_taps'][tap_idx])
+                pressure_tap['label'] = str(tap_idx + 1)
+                pressure_tap['position'] = get_position_from_header(
+                    pressure_tap_file, result['case'])
+                pressure_tap['post_ramp_up_index'] = post_ramp_up_index
+
+                pressure_tap['statistics'] = {}
+                pressure_tap['statistics']['cp'] = {}
+                pressure_tap['statistics']['cp']['general'] = get_streaming_general_statistics(moments[cp_mode],
+                                                                                               pdf_settings[cp_mode],
+                                                                                               args.calculate_mode)
+                pressure_tap['statistics']['cp']['extreme_value'] = get_streaming_block_maxima(block_maxima[cp_mode],
+                                                                                               post_ramp_up_index,
+                                                                                               args.calculate_mode,
+                                                                                               'KDE_FFT',
+                                                                                               get_fit_settings(args))
+                pressure_tap_by_mode[cp_mode] = pressure_tap
+
+                if args.use_result_cache:
+                    save_cached_result(cache_keys[cp_mode], pressure_tap,
+                                       get_result_cache_folder(
+                                           args, input_data_folder),
+                                       args.result_cache_size)
+
+            print('## Streamed tap file ' + pressure_tap_file + ' with ' +
+                  str(moments[cp_modes[0]]['n']) + ' samples after ramp-up')
+
+        pressure_taps.append(pressure_tap_by_mode)
+
+    return pressure_taps
+
+
+def get_tap_batches(tap_indices, tap_batch_size):
+    # consecutive batches of at most tap_batch_size taps, all in one if 0
+    if tap_batch_size <= 0:
+        return [list(tap_indices)]
+    return [list(tap_indices[batch_start:batch_start + tap_batch_size])
+            for batch_start in range(0, len(tap_indices), tap_batch_size)]
+
+
+def iterate_pressure_taps(result, tap_indices, reference_series, args, input_data_folder, cp_modes=None, reference_values=None, load_series=True):
+    '''
+    Yields the taps evaluated by evaluate_pressure_taps one after the other,
+    loaded and evaluated in batches of args.tap_batch_size taps.
+    A tap is not referenced any more once yielded, so that only the taps
+    of one batch are held at a time
+    '''
+
+    for tap_batch in get_tap_batches(tap_indices, args.tap_batch_size):
+        pressure_taps = evaluate_pressure_taps(result, tap_batch, reference_series, args, input_data_folder,
+                                               cp_modes, reference_values, load_series)
+        while len(pressure_taps) > 0:
+            yield pressure_taps.pop(0)
+
+
+def get_pressure_tap_statistics(pressure_tap, keep_pdf=False):
+    '''
+    The tap without the heavy arrays, as kept for the overview pages and the
+    summaries once its own page is rendered: without the series and, unless
+    keep_pdf, without the pdfs. A new dictionary, the tap itself is unchanged,
+    as it may still be pickled for a page rendered in the pool
+    '''
+
+    pressure_tap_statistics = {key: value for key, value in pressure_tap.items()
+                               if key != 'series'}
+    if keep_pdf:
+        return pressure_tap_statistics
+
+    def without_pdf(statistics):
+        return {key: value for key, value in statistics.items() if key != 'pdf'}
+
+    statistics = pressure_tap['statistics']['cp']
+    extreme_value = dict(statistics['extreme_value'])
+    for extreme_type in ['classical', 'alternative']:
+        extreme_value[extreme_type] = dict(extreme_value[extreme_type],
+                                           statistics=without_pdf(extreme_value[extreme_type]['statistics']))
+
+    pressure_tap_statistics['statistics'] = dict(pressure_tap['statistics'],
+                                                 cp=dict(statistics,
+                                                         general=without_pdf(
+                                                             statistics['general']),
+                                                         extreme_value=extreme_value))
+
+    return pressure_tap_statistics
+
+
+def check_dtype_deviation(result, pressure_taps, reference_series, args, input_data_folder, cp_modes, reference_values=None):
+    '''
+    Evaluates the taps again with float64 series (parsed, stored and
+    evaluated in float64) and prints the error norms of the summary statistics
+    of the taps in pressure_taps (evaluated with args.dtype) against these,
+    for each cp mode.
+    Returns the error norms by cp mode
+    '''
+
+    float64_args = Namespace(**vars(args))
+    float64_args.dtype = 'float64'
+
+    float64_pressure_taps = {cp_mode: [] for cp_mode in cp_modes}
+    # NOTE: only the statistics are compared, the cached taps are not loaded
+    for pressure_tap_by_mode in iterate_pressure_taps(result, list(range(len(result['pressure_taps']))),
+                                                      reference_series, float64_args, input_data_folder,
+                                                      cp_modes, reference_values, load_series=False):
+        for cp_mode in cp_modes:
+            float64_pressure_taps[cp_mode].append(
+                get_pressure_tap_statistics(pressure_tap_by_mode[cp_mode]))
+
+    norms = {}
+    for cp_mode in cp_modes:
+        aligned_variants, quantities = align_variant_columns({'float64': get_summary_columns(float64_pressure_taps[cp_mode], args.calculate_mode),
+                                                              args.dtype: get_summary_columns(pressure_taps[cp_mode], args.calculate_mode)})
+        norms[cp_mode] = get_error_norms(
+            aligned_variants, quantities, 'float64')
+        print('## Deviation of the summary statistics with ' + args.dtype + ' from float64 series for result case ' +
+              result['case'] + ' and cp_mode ' + cp_mode + '\n' + get_error_norms_table(norms[cp_mode]))
+
+    return norms
+
+
+def share_series(series):
+    '''
+    Copies the series into shared memory blocks, returns the blocks
+    (to be closed and unlinked by the caller) and the descriptors
+    needed to attach to them in the worker processes
+    '''
+
+    blocks = []
+    descriptors = {}
+
+    for key, value in series.items():
+        value = np.asarray(value)
+        # NOTE: shared memory blocks of size 0 are not allowed
+        block = shared_memory.SharedMemory(
+            create=True, size=max(value.nbytes, 1))
+        np.ndarray(value.shape, dtype=value.dtype,
+                   buffer=block.buf)[...] = value
+        blocks.append(block)
+        descriptors[key] = (block.name, value.shape, value.dtype.str)
+
+    return blocks, descriptors
+
+
+def attach_shared_series(descriptors):
+    # initializer of the worker processes, the series are not pickled per task
+
+    # NOTE: forked workers inherit the parse statistics of the main process
+    pop_parse_statistics()
+
+    for key, (name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=name)
+        # keeping a reference, otherwise the buffer is released
+        shared_memory_blocks.append(block)
+        shared_reference_series[key] = np.ndarray(
+            shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def evaluate_pressure_taps_in_worker(result, tap_indices, args, input_data_folder, cp_modes, reference_values):
+    # the parse statistics of the chunk are returned to be reported per case
+    pressure_taps = evaluate_pressure_taps(result, tap_indices, shared_reference_series, args, input_data_folder,
+                                           cp_modes, reference_values)
+    return pressure_taps, pop_parse_statistics()
+
+
+def evaluate_pressure_taps_in_pool(result, reference_series, args, input_data_folder, cp_modes=None, reference_values=None):
+    '''
+    Fans contiguous chunks of taps out to a pool of args.workers processes,
+    the reference series are passed through shared memory.
+    Yields the evaluated taps in tap-label order as the chunks finish,
+    so that the report pages keep the same order as in the serial run.
+    The chunks have at most args.tap_batch_size taps (if not 0) and
+    at most 2 * args.workers chunks are submitted at once, so that the
+    evaluated taps waiting to be yielded are bounded
+    '''
+
+    nr_of_taps = len(result['pressure_taps'])
+    # smaller chunks than workers to balance the load
+    nr_of_chunks = min(nr_of_taps, 4 * args.workers)
+    if args.tap_batch_size > 0:
+        nr_of_chunks = max(nr_of_chunks, int(
+            np.ceil(nr_of_taps / args.tap_batch_size)))
+    tap_chunks = [list(chunk) for chunk in np.array_split(
+        np.arange(nr_of_taps), nr_of_chunks) if len(chunk) > 0]
+    max_chunks_in_flight = 2 * args.workers
+
+    if args.use_case_store:
+        # build or validate the store once, not concurrently in every worker
+        load_case_store(result['case'],
+                        get_case_store_files(result, input_data_folder),
+                        args.cache_folder or input_data_folder,
+                        args.cache_validation, args.dtype)
+
+    # only the light settings of the case are pickled per task,
+    # the reference series are shared instead
+    case_settings = {key: result[key] for key in [
+        'case', 'density', 'ramp_up_time', 'pressure_taps']}
+    # NOTE: the file name only, the reference point holds the loaded series by now
+    case_settings['reference_points'] = [
+        {'file_name': result['reference_points'][0]['file_name']}]
+    blocks, descriptors = share_series(
+        {key: reference_series[key] for key in ['time', 'pressure', 'velocity_x']})
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers,
+                                 initializer=attach_shared_series,
+                                 initargs=(descriptors,)) as executor:
+            futures = []
+            for tap_chunk in tap_chunks:
+                futures.append(executor.submit(evaluate_pressure_taps_in_worker,
+                                               case_settings, tap_chunk, args, input_data_folder,
+                                               cp_modes, reference_values))
+                if len(futures) < max_chunks_in_flight:
+                    continue
+
+                # collecting in submission order, i.e. tap-label order
+                pressure_taps, parse_statistics = futures.pop(0).result()
+                add_parse_statistics(parse_statistics)
+                while len(pressure_taps) > 0:
+                    yield pressure_taps.pop(0)
+
+            for future in futures:
+                pressure_taps, parse_statistics = future.result()
+                add_parse_statistics(parse_statistics)
+                while len(pressure_taps) > 0:
+                    yield pressure_taps.pop(0)
+
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def evaluate_reference_point(result, args, input_data_folder):
+    '''
+    Loads and evaluates the reference point of a case
+    NOTE: for now only one reference point, later more could be added
+    '''
+
+    ref_point = result['reference_points'][0]
+
+    # load reference data results, update existing dictionary
+    ref_point_file = os_path.join(input_data_folder, os_path.normpath(
+        ref_point['file_name']))
+    ref_point.update(
+        initialize_point_data(ref_point_file, result['case'],
+                              args.use_cache, args.cache_folder, args.cache_validation))
+    # NOTE: assuming that reference point data and tap data have the same time step
+    # which should be the case as we are taking both from the same
+    # simulation
+    ref_point['post_ramp_up_index'] = get_ramp_up_index(
+        ref_point['series']['time'], result['ramp_up_time'])
+
+    if args.check_pdf_accuracy:
+        # exact vs. binned FFT KDE on the reference pressure
+        check_pdf_kde_binned_accuracy(ref_point['series']['pressure'])
+
+    if args.use_result_cache:
+        key_items = {}
+        key_items['kind'] = 'reference_point'
+        key_items['reference_point'] = ref_point['file_name']
+        key_items['reference_file'] = get_file_signature(
+            ref_point_file, args.cache_validation)
+        key_items['case'] = result['case']
+        key_items['ramp_up_time'] = result['ramp_up_time']
+        for key in ['calculate_mode', 'pdf_case', 'spectra_segments', 'spectra_bins']:
+            key_items[key] = getattr(args, key)
+        key_items['max_lag'] = plot_limits['autocorr']['x'][1]
+        cache_key = get_result_cache_key(key_items)
+
+        cached_ref_point = load_cached_result(
+            cache_key, get_result_cache_folder(args, input_data_folder))
+        if cached_ref_point is not None:
+            ref_point.update(cached_ref_point)
+            return ref_point
+
+    # evaluating statistical quantities
+    ref_point['statistics'] = {}
+    ref_point['statistics']['pressure'] = {}
+    ref_point['statistics']['pressure']['general'] = get_general_statistics(ref_point['series']['pressure'],
+                                                                            args.calculate_mode,
+                                                                            args.pdf_case)
+
+    ref_point['velocity_spectra'] = get_velocity_spectra(ref_point['series']['time'][ref_point['post_ramp_up_index']:],
+                                                         ref_point['series']['velocity_x'][ref_point['post_ramp_up_index']:],
+                                                         nr_of_segments=args.spectra_segments,
+                                                         nr_of_bins=args.spectra_bins or None)
+
+    # only the lags which are plotted
+    ref_point['autocorrelation'] = get_velocity_and_pressure_autocorrelation(ref_point['series']['time'][ref_point['post_ramp_up_index']:],
+                                                                             ref_point['series']['velocity_x'][ref_point['post_ramp_up_index']:],
+                                                                             ref_point['series']['pressure'][ref_point['post_ramp_up_index']:],
+                                                                             max_lag=plot_limits['autocorr']['x'][1])
+
+    if args.use_result_cache:
+        save_cached_result(cache_key,
+                           {key: ref_point[key] for key in [
+                               'statistics', 'velocity_spectra', 'autocorrelation']},
+                           get_result_cache_folder(args, input_data_folder),
+                           args.result_cache_size)
+
+    return ref_point
+
+
+# the templates of the tap pages per calculate mode, built once per process
+page_templates = {}
+
+
+def get_page_template(calculate_mode):
+    if calculate_mode not in page_templates:
+        page_templates[calculate_mode] = get_pressure_tap_cp_template(
+            calculate_mode)
+    return page_templates[calculate_mode]
+
+
+def close_page_templates():
+    for template in page_templates.values():
+        plt.close(template['fig'])
+    page_templates.clear()
+
+
+def get_page_sink(report_pdf, image_files):
+    # stands in for the report_pdf of the plot functions, the page is also saved as each image file
+    # NOTE: the artists are drawn by savefig, so the stage pdf_write includes drawing the page
+
+    def savefig(figure=None, **kwargs):
+        figure = plt.gcf() if figure is None else figure
+        with profile_stage('pdf_write'):
+            report_pdf.savefig(figure, **kwargs)
+        if len(image_files) > 0:
+            with profile_stage('image_write'):
+                for image_file in image_files:
+                    figure.savefig(image_file, **kwargs)
+
+    return SimpleNamespace(savefig=savefig)
+
+
+def render_page(report_pdf, image_files, plot_function, plot_args, plot_kwargs, labels={}):
+    '''
+    Renders one report page by plot_function into report_pdf and the image_files,
+    the tap pages with template use the template of this process.
+    labels: the profile labels of the page
+    Returns the render time.
+    '''
+
+    start_time = time.perf_counter()
+    # NOTE: if profiling, writing the page is recorded apart from plotting it
+    if len(image_files) > 0 or is_profiling():
+        report_pdf = get_page_sink(report_pdf, image_files)
+    if plot_function is plot_pressure_tap_cp_results_with_template:
+        plot_kwargs = dict(plot_kwargs, template=get_page_template(plot_args[1]))
+    with profile_labels(**labels), profile_stage('plotting'):
+        plot_function(*plot_args, report_pdf=report_pdf, **plot_kwargs)
+
+    return time.perf_counter() - start_time
+
+
+def render_page_to_file(page_file, image_files, plot_function, plot_args, plot_kwargs, labels={}):
+    # renders one page in a worker process into its own single page PDF
+
+    with PdfPages(page_file) as page_pdf:
+        return render_page(page_pdf, image_files, plot_function, plot_args, plot_kwargs, labels)
+
+
+def initialize_report_renderer(result, cp_modes, args, folders, endings, stack):
+    '''
+    Renderer of the reports of one result case, one report per cp mode.
+    With args.render_workers > 1 the pages are rendered in a process pool,
+    each into its own single page PDF, and merged in order by merge_report_pages,
+    otherwise serially into the reports.
+    The pool and the page files are closed by the stack.
+    '''
+
+    renderer = {}
+    renderer['report_files'] = {cp_mode: os_path.join(folders['reports'], 'LowriseReport_' + result['case'] + get_cp_mode_ending(cp_mode) + endings['report'])
+                                for cp_mode in cp_modes}
+    renderer['image_formats'] = [image_format.strip() for image_format in args.image_formats.split(',')
+                                 if image_format.strip()]
+    renderer['render_times'] = []
+
+    is_parallel = args.render_workers > 1
+    if is_parallel and PdfWriter is None:
+        print('## pypdf not available for merging the pages, rendering serially')
+        is_parallel = False
+
+    if is_parallel:
+        # the page files are removed after the pool is shut down
+        renderer['page_folder'] = stack.enter_context(
+            tempfile.TemporaryDirectory(dir=folders['reports']))
+        renderer['executor'] = stack.enter_context(
+            ProcessPoolExecutor(max_workers=args.render_workers))
+        renderer['max_pages_in_flight'] = 2 * args.render_workers
+        renderer['pages_in_flight'] = []
+        renderer['pages'] = {cp_mode: [] for cp_mode in cp_modes}
+    else:
+        renderer['report_pdfs'] = {cp_mode: stack.enter_context(PdfPages(renderer['report_files'][cp_mode]))
+                                   for cp_mode in cp_modes}
+        stack.callback(close_page_templates)
+
+    return renderer
+
+
+def add_report_page(renderer, cp_mode, page_name, plot_function, plot_args, plot_kwargs={}, image_name=None, tap_label=''):
+    '''
+    Renders the page by plot_function(*plot_args, report_pdf=..., **plot_kwargs)
+    for the report of cp_mode, with image_name also as image file for each image format.
+    tap_label: the tap the page is recorded for if profiling
+    In the pool at most max_pages_in_flight pages are submitted at once, so that
+    the data of the pages is not held longer than needed.
+    '''
+
+    image_files = []
+    if image_name is not None and len(renderer['image_formats']) > 0:
+        image_folder = os_path.splitext(
+            renderer['report_files'][cp_mode])[0] + '_images'
+        os.makedirs(image_folder, exist_ok=True)
+        image_files = [os_path.join(image_folder, image_name + '.' + image_format)
+                       for image_format in renderer['image_formats']]
+
+    if 'executor' in renderer:
+        while len(renderer['pages_in_flight']) >= renderer['max_pages_in_flight']:
+            renderer['pages_in_flight'].pop(0).result()
+
+        page_file = os_path.join(renderer['page_folder'],
+                                 cp_mode + '_%05d.pdf' % len(renderer['pages'][cp_mode]))
+        future = renderer['executor'].submit(render_page_to_file, page_file, image_files,
+                                             plot_function, plot_args, plot_kwargs,
+                                             dict(get_profile_labels(), tap=tap_label))
+        renderer['pages_in_flight'].append(future)
+        renderer['pages'][cp_mode].append((page_name, page_file, future))
+    else:
+        renderer['render_times'].append(render_page(renderer['report_pdfs'][cp_mode], image_files,
+                                                    plot_function, plot_args, plot_kwargs,
+                                                    dict(get_profile_labels(), tap=tap_label)))
+        print('## Page ' + page_name +
+              ' rendered in %.3f s' % renderer['render_times'][-1])
+
+
+def merge_report_pages(renderer):
+    # the pages rendered in the pool merged in order into the reports, nothing to do if serial
+
+    if 'executor' not in renderer:
+        return
+
+    for cp_mode, pages in renderer['pages'].items():
+        report_writer = PdfWriter()
+        for page_name, page_file, future in pages:
+            # raises the errors of the workers, if any
+            renderer['render_times'].append(future.result())
+            print('## Page ' + page_name +
+                  ' rendered in %.3f s' % renderer['render_times'][-1])
+            report_writer.append(page_file)
+        with profile_stage('pdf_write'):
+            report_writer.write(renderer['report_files'][cp_mode])
+
+
+def get_results_data_file(result, folders, endings):
+    return os_path.join(folders['results_data'], 'LowriseResults_' + result['case'] + endings['results_data'])
+
+
+def iterate_results_data_pressure_taps(results_data, cp_modes, nr_of_pressure_taps):
+    # the taps as yielded by evaluate_pressure_taps_in_pool, read one after the other
+
+    for tap_idx in range(nr_of_pressure_taps):
+        yield {cp_mode: read_results_data(results_data, 'pressure_taps/' + cp_mode + '/' + str(tap_idx + 1))
+               for cp_mode in cp_modes}
+
+
+def evaluate_result_case(result, cp_modes, args, folders, endings):
+    '''
+    Evaluates one result case for all cp_modes in one go:
+    the reference point and each tap file are loaded once,
+    the reference means are computed once per case,
+    one report and one summary are written per cp mode
+    folders: dictionary with the input_data, reports, summaries and results_data folder
+    endings: dictionary with the report, summary and results_data file ending
+    args.stage selects what is done:
+    'all' -> computing and rendering the reports
+    'compute' -> computing only, the results are written to an .npz container
+    (and the summaries), no plotting
+    'render' -> rendering the reports from the .npz container only
+    '''
+
+    is_computed = args.stage in ['all', 'compute']
+    is_rendered = args.stage in ['all', 'render']
+    calculate_mode = args.calculate_mode
+    has_series = not args.streaming
+
+    with ExitStack() as stack:
+        stack.enter_context(profile_labels(case=result['case']))
+
+        if is_rendered:
+            renderer = initialize_report_renderer(
+                result, cp_modes, args, folders, endings, stack)
+
+        if args.stage == 'render':
+            results_data = stack.enter_context(
+                np.load(get_results_data_file(result, folders, endings)))
+            meta = read_results_data(results_data, 'meta')
+            for cp_mode in cp_modes:
+                if cp_mode not in meta['cp_modes']:
+                    raise Exception('cp_mode ' + cp_mode + ' not in the results data of result case ' +
+                                    result['case'] + ', computed for ' + ', '.join(meta['cp_modes']))
+            # the statistics present are the computed ones
+            calculate_mode = meta['calculate_mode']
+            has_series = meta['has_series']
+
+            ref_point = read_results_data(results_data, 'reference_point')
+            evaluated_pressure_taps = iterate_results_data_pressure_taps(
+                results_data, cp_modes, meta['nr_of_pressure_taps'])
+
+        else:
+            # the parse throughput is reported once per case
+            pop_parse_statistics()
+            with profile_labels(tap='reference'):
+                ref_point = evaluate_reference_point(
+                    result, args, folders['input_data'])
+                reference_values = get_reference_values(ref_point['series'])
+
+            # evaluating the taps, serial or in a process pool
+            if args.workers > 1:
+                evaluated_pressure_taps = evaluate_pressure_taps_in_pool(result,
+                                                                         ref_point['series'],
+                                                                         args, folders['input_data'],
+                                                                         cp_modes, reference_values)
+            else:
+                evaluated_pressure_taps = iterate_pressure_taps(result,
+                                                                list(range(len(result['pressure_taps']))),
+                                                                ref_point['series'],
+                                                                args, folders['input_data'],
+                                                                cp_modes, reference_values)
+
+        if args.stage == 'compute':
+            # written to a temporary file first, renamed when complete
+            results_data_file = get_results_data_file(result, folders, endings)
+            results_data_zip = stack.enter_context(zipfile.ZipFile(results_data_file + '.tmp', 'w',
+                                                                   zipfile.ZIP_STORED, allowZip64=True))
+            with profile_labels(tap='reference'), profile_stage('export'):
+                write_results_data(results_data_zip, 'reference_point',
+                                   {key: value for key, value in ref_point.items() if key != 'file_name'})
+
+        # plotting reference point data
+        if is_rendered:
+            for cp_mode in cp_modes:
+                add_report_page(renderer, cp_mode, 'reference point pressure', plot_ref_point_pressure_results,
+                                (ref_point,), {'nr_of_buckets': args.decimation_buckets}, tap_label='reference')
+                add_report_page(renderer, cp_mode, 'reference point spectra', plot_ref_point_velocity_spectra,
+                                (ref_point,), tap_label='reference')
+                add_report_page(renderer, cp_mode, 'reference point autocorrelation', plot_ref_point_velocity_and_pressure_autocorrelation,
+                                (ref_point,), tap_label='reference')
+
+        # NOTE: only the statistics of the taps are kept, the series and
+        # the pdfs (unless exported) are released after the page of each tap
+        pressure_taps = {cp_mode: [] for cp_mode in cp_modes}
+
+        for pressure_tap_by_mode in evaluated_pressure_taps:
+            for cp_mode in cp_modes:
+                pressure_tap = pressure_tap_by_mode[cp_mode]
+
+                if args.stage == 'compute':
+                    with profile_labels(tap=pressure_tap['label']), profile_stage('export'):
+                        write_results_data(results_data_zip, 'pressure_taps/' + cp_mode + '/' + pressure_tap['label'],
+                                           pressure_tap)
+
+                # plotting tap data, the streamed taps have no series to plot
+                # the tap pages with template from one figure per process with swapped data
+                if is_rendered and has_series:
+                    add_report_page(renderer, cp_mode, 'tap ' + pressure_tap['label'],
+                                    plot_pressure_tap_cp_results_with_template if args.use_page_template else plot_pressure_tap_cp_results,
+                                    (pressure_tap, calculate_mode), {
+                                        'nr_of_buckets': args.decimation_buckets},
+                                    image_name='tap_' + pressure_tap['label'], tap_label=pressure_tap['label'])
+
+                pressure_taps[cp_mode].append(get_pressure_tap_statistics(
+                    pressure_tap, keep_pdf=is_computed and args.summary_extremes))
+
+            print('## Plot for result case ' +
+                  result['case'] + ' and tap label ' + pressure_tap['label'] + ' ready')
+            del pressure_tap_by_mode, pressure_tap
+
+        if is_computed:
+            print_parse_statistics(result['case'], pop_parse_statistics())
+
+        if is_computed and args.dtype != 'float64' and args.dtype_check and not args.streaming:
+            with profile_labels(tap='all'):
+                check_dtype_deviation(result, pressure_taps, ref_point['series'], args,
+                                      folders['input_data'], cp_modes, reference_values)
+
+        if args.stage == 'compute':
+            meta = {}
+            meta['cp_modes'] = cp_modes
+            meta['nr_of_pressure_taps'] = len(pressure_taps[cp_modes[0]])
+            meta['calculate_mode'] = calculate_mode
+            meta['has_series'] = has_series
+            with profile_stage('export'):
+                write_results_data(results_data_zip, 'meta', meta)
+
+        for cp_mode in cp_modes:
+            if is_rendered:
+                # general statistics for all taps
+                add_report_page(renderer, cp_mode, 'general statistics', plot_pressure_taps_general_statistics,
+                                (pressure_taps[cp_mode],), tap_label='all')
+
+                # extreme value statistics for all taps
+                add_report_page(renderer, cp_mode, 'extreme values', plot_pressure_taps_extreme_values,
+                                (pressure_taps[cp_mode], calculate_mode), tap_label='all')
+
+            if is_computed:
+                # export main data summary in the summary formats
+                with profile_labels(tap='all'), profile_stage('export'):
+                    export_summaries(pressure_taps[cp_mode], calculate_mode,
+                                     os_path.join(folders['summaries'], 'LowriseSummary_' +
+                                                  result['case'] + get_cp_mode_ending(cp_mode) + endings['summary']),
+                                     args.summary_formats.split(','), args.summary_extremes)
+
+        if is_rendered:
+            merge_report_pages(renderer)
+
+    if args.stage == 'compute':
+        os.replace(results_data_file + '.tmp', results_data_file)
+        print('## Results data for result case ' +
+              result['case'] + ' written to ' + results_data_file)
+    else:
+        render_times = renderer['render_times']
+        print('## All plots for result case ' + result['case'] + ' finished, ' +
+              str(len(render_times)) + ' pages rendered in %.3f s (%.3f s per page)' % (
+                  sum(render_times), sum(render_times) / max(len(render_times), 1)))
+
+
+def evaluate_result_cases_in_pool(results, cp_modes, args, folders, endings):
+    '''
+    Evaluates the result cases in parallel in a pool of args.workers processes,
+    the taps within one case are then evaluated serially
+    '''
+
+    case_args = Namespace(**vars(args))
+    case_args.workers = 1
+    case_args.render_workers = 1
+
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(results))) as executor:
+        futures = [executor.submit(evaluate_result_case, result, cp_modes, case_args, folders, endings)
+                   for result in results]
+
+        # raises the errors of the workers, if any
+        for future in futures:
+            future.result()
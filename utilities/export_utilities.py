@@ -1,43 +1,227 @@
-def export_summary_to_text(pressure_taps, calculate_mode):
+import csv
+from os import path as os_path
+
+import numpy as np
+try:
+    # optional, only needed for the parquet summaries
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# the quantities of the general statistics in the summary columns
+summary_statistics = ['mean', 'std', 'kurtosis', 'skewness', 'min', 'max']
+# the ones of the fitted extreme value distribution, design_value exported as design
+summary_fit_parameters = ['location', 'scale', 'shape', 'design_value']
+
+
+def get_summary_columns(pressure_taps, calculate_mode):
+    '''
+    The statistics of all taps as columns, one array per quantity at full precision:
+    label, position_x/y/z, the general statistics, the ones of the classical (cev_)
+    and alternative (aev_) extremes and the fit parameters of both, if fitted
+    '''
+
+    columns = {}
+    columns['label'] = np.array([pressure_tap['label']
+                                 for pressure_tap in pressure_taps])
+    positions = np.array([pressure_tap['position']
+                          for pressure_tap in pressure_taps], dtype=np.float64)
+    for axis_idx, axis in enumerate(['x', 'y', 'z']):
+        columns['position_' + axis] = positions[:, axis_idx]
+
+    statistics_keys = summary_statistics + (['mode'] if calculate_mode else [])
+    for prefix, get_statistics in [('', lambda pressure_tap: pressure_tap['statistics']['cp']['general']),
+                                   ('cev_', lambda pressure_tap: pressure_tap['statistics']['cp']['extreme_value']['classical']['statistics']),
+                                   ('aev_', lambda pressure_tap: pressure_tap['statistics']['cp']['extreme_value']['alternative']['statistics'])]:
+        # NOTE: nan for the mode of the general statistics without pdf (follow mode)
+        for key in statistics_keys:
+            columns[prefix + key] = np.array([get_statistics(pressure_tap).get(key, np.nan) for pressure_tap in pressure_taps],
+                                             dtype=np.float64)
+
+    # design values from the fitted extreme value distribution, if available
+    if 'fit' in pressure_taps[0]['statistics']['cp']['extreme_value']['classical']:
+        for prefix, extreme_type in [('cev_', 'classical'), ('aev_', 'alternative')]:
+            for key in summary_fit_parameters:
+                columns[prefix + key.replace('design_value', 'design')] = np.array(
+                    [pressure_tap['statistics']['cp']['extreme_value'][extreme_type]['fit'][key]
+                     for pressure_tap in pressure_taps], dtype=np.float64)
+
+    return columns
+
+
+def get_extreme_columns(pressure_taps):
+    # long format, one row per extreme: label, extreme_type (classical/alternative), idx and val
+
+    labels = []
+    extreme_types = []
+    indices = []
+    values = []
+    for pressure_tap in pressure_taps:
+        for extreme_type in ['classical', 'alternative']:
+            extremes = pressure_tap['statistics']['cp']['extreme_value'][extreme_type]
+            labels.append(np.full(len(extremes['val']), pressure_tap['label']))
+            extreme_types.append(np.full(len(extremes['val']), extreme_type))
+            indices.append(np.asarray(extremes['idx'], dtype=np.int64))
+            values.append(np.asarray(extremes['val'], dtype=np.float64))
+
+    columns = {}
+    columns['label'] = np.concatenate(labels)
+    columns['extreme_type'] = np.concatenate(extreme_types)
+    columns['idx'] = np.concatenate(indices)
+    columns['val'] = np.concatenate(values)
+
+    return columns
+
 
-    result_summary = '# label position-x/y/z mean std kurtosis skewness min max cev_mean aev_mean'
-    if calculate_mode:
-        result_summary += ' cev_mode aev_mode'
-    result_summary += '\n'
+def get_pdf_columns(pressure_taps):
+    # long format, one row per point of each pdf: label, statistic (general/classical/alternative), x and y
 
+    labels = []
+    statistic_names = []
+    x_values = []
+    y_values = []
     for pressure_tap in pressure_taps:
+        extreme_value = pressure_tap['statistics']['cp']['extreme_value']
+        for statistic_name, statistics in [('general', pressure_tap['statistics']['cp']['general']),
+                                           ('classical', extreme_value['classical']['statistics']),
+                                           ('alternative', extreme_value['alternative']['statistics'])]:
+            # NOTE: no pdf in follow mode
+            if statistics.get('pdf') is None:
+                continue
+            labels.append(np.full(len(statistics['pdf']['x']), pressure_tap['label']))
+            statistic_names.append(np.full(len(statistics['pdf']['x']), statistic_name))
+            x_values.append(np.asarray(statistics['pdf']['x'], dtype=np.float64))
+            y_values.append(np.asarray(statistics['pdf']['y'], dtype=np.float64))
+
+    columns = {}
+    columns['label'] = np.concatenate(labels) if labels else np.array([], dtype=str)
+    columns['statistic'] = np.concatenate(statistic_names) if labels else np.array([], dtype=str)
+    columns['x'] = np.concatenate(x_values) if labels else np.array([])
+    columns['y'] = np.concatenate(y_values) if labels else np.array([])
+
+    return columns
+
+
+def get_threshold_sweep_columns(pressure_taps):
+    # long format, one row per tap and POT threshold: label, threshold_quantile, threshold, shape, scale and nr_of_excesses
+
+    sweep_keys = ['threshold_quantile', 'threshold', 'shape', 'scale', 'nr_of_excesses']
+
+    labels = []
+    values = {key: [] for key in sweep_keys}
+    for pressure_tap in pressure_taps:
+        sweep = pressure_tap['statistics']['cp']['extreme_value']['classical']['gpd']['sweep']
+        labels.append(np.full(len(sweep['threshold_quantile']), pressure_tap['label']))
+        for key in sweep_keys:
+            values[key].append(np.asarray(sweep[key], dtype=np.float64))
+
+    columns = {}
+    columns['label'] = np.concatenate(labels)
+    for key in sweep_keys:
+        columns[key] = np.concatenate(values[key])
+    columns['nr_of_excesses'] = columns['nr_of_excesses'].astype(np.int64)
+
+    return columns
 
-        # identifier information
-        result_summary += pressure_tap['label'] + ' '
-        result_summary += '[' + ', '.join(map(str, [round(coordinate, 3)
-                                                    for coordinate in pressure_tap['position']])) + '] '
-
-        # general statistics
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['mean'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['std'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['kurtosis'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['skewness'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['min'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']
-                                    ['cp']['general']['max'], 3)) + ' '
-
-        # extreme value statistics
-        result_summary += str(round(pressure_tap['statistics']['cp']
-                                    ['extreme_value']['classical']['statistics']['mean'], 3)) + ' '
-        result_summary += str(round(pressure_tap['statistics']['cp']
-                                    ['extreme_value']['alternative']['statistics']['mean'], 3)) + ' '
-
-        if calculate_mode:
-            result_summary += str(round(pressure_tap['statistics']['cp']
-                                        ['extreme_value']['classical']['statistics']['mode'], 3)) + ' '
-            result_summary += str(round(pressure_tap['statistics']['cp']
-                                        ['extreme_value']['alternative']['statistics']['mode'], 3)) + ' '
-
-        result_summary += '\n'
-
-    return result_summary
+
+def get_threshold_sweep_text(columns):
+    # the threshold sweep as space separated text, the values rounded to 3 digits
+
+    value_names = ['threshold_quantile', 'threshold', 'shape', 'scale']
+    rounded_values = np.round(np.column_stack([columns[name] for name in value_names]), 3)
+
+    lines = ['# label ' + ' '.join(value_names) + ' nr_of_excesses\n']
+    for label, values, nr_of_excesses in zip(columns['label'], rounded_values, columns['nr_of_excesses']):
+        lines.append(str(label) + ' ' + ' '.join(map(str, values)) + ' ' + str(nr_of_excesses) + ' \n')
+
+    return ''.join(lines)
+
+
+def write_columns(columns, file_base, summary_format):
+    # all columns in one bulk call, at full precision
+
+    if summary_format == 'csv':
+        with open(file_base + '.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(columns.keys()))
+            writer.writerows(zip(*[column.tolist() for column in columns.values()]))
+
+    elif summary_format == 'parquet':
+        if pyarrow is None:
+            raise Exception('pyarrow needed for the parquet summaries, not available')
+        pyarrow.parquet.write_table(pyarrow.table(columns), file_base + '.parquet')
+
+    else:
+        raise Exception('Summary format ' + summary_format +
+                        ' not implemented, choose dat, csv, npz or parquet')
+
+
+def export_summaries(pressure_taps, calculate_mode, summary_file, summary_formats=['dat'], include_extremes=False):
+    '''
+    Writes the summary of the taps in each of the summary_formats:
+    'dat' -> the legacy text summary to summary_file
+    'csv', 'npz', 'parquet' -> the summary columns at full precision,
+    with the same name as summary_file but the format as extension.
+    include_extremes: also the extreme indices and values and the pdfs in long format,
+    in the tables _Extremes and _Pdfs (the entries extremes/ and pdfs/ for npz)
+    The POT threshold sweep, if evaluated, in the table _Thresholds for all formats
+    '''
+
+    file_base = os_path.splitext(summary_file)[0]
+
+    tables = {}
+    tables['summary'] = get_summary_columns(pressure_taps, calculate_mode)
+    if include_extremes:
+        tables['extremes'] = get_extreme_columns(pressure_taps)
+        tables['pdfs'] = get_pdf_columns(pressure_taps)
+    if 'sweep' in pressure_taps[0]['statistics']['cp']['extreme_value']['classical'].get('gpd', {}):
+        tables['thresholds'] = get_threshold_sweep_columns(pressure_taps)
+
+    for summary_format in summary_formats:
+        if summary_format == 'dat':
+            with open(summary_file, 'w') as result_summary:
+                result_summary.write(get_summary_text(tables['summary']))
+            if 'thresholds' in tables:
+                with open(file_base + '_Thresholds.dat', 'w') as threshold_summary:
+                    threshold_summary.write(get_threshold_sweep_text(tables['thresholds']))
+
+        elif summary_format == 'npz':
+            np.savez(file_base + '.npz', **{table_name + '/' + column_name: column
+                                            for table_name, columns in tables.items()
+                                            for column_name, column in columns.items()})
+
+        else:
+            for table_name, columns in tables.items():
+                table_file_base = file_base if table_name == 'summary' else \
+                    file_base + '_' + table_name.capitalize()
+                write_columns(columns, table_file_base, summary_format)
+
+
+def get_summary_text(columns):
+    '''
+    The legacy space separated summary from the summary columns,
+    the values rounded to 3 digits and the position in brackets
+    '''
+
+    value_names = ['mean', 'std', 'kurtosis', 'skewness', 'min', 'max', 'cev_mean', 'aev_mean']
+    if 'cev_mode' in columns:
+        value_names += ['cev_mode', 'aev_mode']
+    if 'cev_design' in columns:
+        value_names += ['cev_design', 'aev_design']
+
+    rounded_positions = np.round(np.column_stack([columns['position_' + axis] for axis in ['x', 'y', 'z']]), 3)
+    rounded_values = np.round(np.column_stack([columns[name] for name in value_names]), 3)
+
+    lines = ['# label position-x/y/z ' + ' '.join(value_names) + '\n']
+    for label, position, values in zip(columns['label'], rounded_positions, rounded_values):
+        lines.append(str(label) + ' [' + ', '.join(map(str, position)) + '] ' +
+                     ' '.join(map(str, values)) + ' \n')
+
+    return ''.join(lines)
+
+
+def export_summary_to_text(pressure_taps, calculate_mode):
+    # the legacy summary, e.g. for the follow mode
+    return get_summary_text(get_summary_columns(pressure_taps, calculate_mode))
@@ -9,16 +9,20 @@ Created on 08.07.2018
 """
 
 
+import json
+import os
 import re
+import time
+from itertools import islice
+from os import path as os_path
+
 import numpy as np
 
+from utilities.cache_utilities import get_file_signature, load_cached_point_data, save_cached_point_data
+from utilities.profile_utilities import profiled, profile_stage
 
-def get_position_from_header(file, result_case):
 
-    with open(file, 'r') as f:
-        # jump to the beginning of the file
-        f.seek(0)
-        first_line = f.readline()
+def get_position_from_header_line(first_line, result_case):
 
     if 'Kratos' in result_case:
         position = [np.around(float(item), 2) for item in (
@@ -34,29 +38,331 @@ def get_position_from_header(file, result_case):
     return position
 
 
-def get_tabular_data(file):
+def get_position_from_header(file, result_case):
 
-    # assumed column structure - time, pressure, velocity_x
-    # NOTE: np.loadtxt() already casts to np.asarray() where possible
+    with open(file, 'r') as f:
+        # jump to the beginning of the file
+        f.seek(0)
+        first_line = f.readline()
 
-    data_series = {}
-    data_series['time'] = np.loadtxt(file, usecols=(0,))
-    data_series['pressure'] = np.loadtxt(file, usecols=(1,))
+    return get_position_from_header_line(first_line, result_case)
 
-    try:
-        data_series['velocity_x'] = np.loadtxt(file, usecols=(2,))
 
-    except:
+# assumed column structure - time, pressure, velocity_x
+point_file_columns = ['time', 'pressure', 'velocity_x']
+
+
+def get_point_file_dtype(nr_of_columns, dtype='float64'):
+    # NOTE: the time axis stays float64, the other columns are parsed in dtype
+    return np.dtype([(column, 'float64' if column == 'time' else dtype)
+                     for column in point_file_columns[:nr_of_columns]])
+
+
+def get_tabular_data_from_array(data, file=''):
+    # splitting the parsed structured array into the named columns
+    # a missing velocity_x column (tap files) results in an empty array
+
+    data_series = {}
+    data_series['time'] = np.ascontiguousarray(data['time'])
+    data_series['pressure'] = np.ascontiguousarray(data['pressure'])
+
+    if 'velocity_x' in data.dtype.names:
+        data_series['velocity_x'] = np.ascontiguousarray(data['velocity_x'])
+    else:
         print("## No velocity_x_series in " + file)
         data_series['velocity_x'] = np.asarray([])
 
     return data_series
 
 
-def initialize_point_data(ref_file, result_case):
+# parse throughput of the point files parsed so far in this process,
+# accumulated per file and reported once per result case
+parse_statistics = {'files': 0, 'rows': 0, 'size': 0.0, 'time': 0.0}
+
+
+def pop_parse_statistics():
+    # the accumulated parse statistics, the counters are reset
+
+    statistics = dict(parse_statistics)
+    for key in parse_statistics:
+        parse_statistics[key] = 0
+
+    return statistics
+
+
+def add_parse_statistics(statistics):
+    # e.g. the parse statistics popped in a worker process
+    for key, value in statistics.items():
+        parse_statistics[key] += value
+
+
+def print_parse_statistics(result_case, statistics):
+
+    if statistics['files'] == 0:
+        return
+
+    print('## Parsed ' + str(statistics['files']) + ' files for result case ' + result_case + ': ' +
+          str(statistics['rows']) + ' rows, ' + '%.2f MB in %.3f s (%.1f MB/s)' % (
+              statistics['size'], statistics['time'], statistics['size'] / max(statistics['time'], 1e-9)))
+
+
+def read_point_file(file, result_case=None, dtype='float64'):
+    '''
+    Reads the header position and all columns of a point file
+    in a single pass with one bulk np.loadtxt call, instead of one
+    scan per column and an additional one for the header.
+    The columns but the time are parsed directly into dtype.
+    The parse throughput is accumulated in parse_statistics.
+    '''
+
+    start_time = time.perf_counter()
+
+    with open(file, 'r') as f:
+        first_line = f.readline()
+        nr_of_columns = min(len(f.readline().split()), len(point_file_columns))
+        # rewind, the header is skipped by the parser as a comment
+        f.seek(0)
+        # NOTE: ndmin=1 to keep the structured array also for a single row
+        data = np.loadtxt(f, dtype=get_point_file_dtype(nr_of_columns, dtype),
+                          usecols=range(nr_of_columns), ndmin=1)
+
+    add_parse_statistics({'files': 1, 'rows': data.shape[0],
+                          'size': os_path.getsize(file) / 1024**2,
+                          'time': time.perf_counter() - start_time})
+
+    if result_case is None:
+        position = None
+    else:
+        position = get_position_from_header_line(first_line, result_case)
+
+    return position, get_tabular_data_from_array(data, file)
+
+
+def get_tabular_data(file):
+
+    # assumed column structure - time, pressure, velocity_x
+    # NOTE: single pass, all columns are parsed at once
+
+    return read_point_file(file)[1]
+
+
+def read_point_file_in_chunks(file, chunk_size=2**16):
+    '''
+    Yields the columns of a point file in chunks of at most chunk_size rows,
+    each parsed by np.loadtxt from a slice of the line iterator,
+    so that the memory is bounded by the chunk size and not the file length
+    '''
+
+    with open(file, 'r') as f:
+        while True:
+            with profile_stage('parse'):
+                lines = list(islice(f, chunk_size))
+                if not lines:
+                    break
+
+                # NOTE: ndmin=2 to keep the column layout also for a single row,
+                # the header is skipped by the parser as a comment
+                data = np.loadtxt(lines, ndmin=2)
+            if data.shape[0] == 0:
+                continue
+
+            data_series = {}
+            data_series['time'] = data[:, 0]
+            data_series['pressure'] = data[:, 1]
+            if data.shape[1] > 2:
+                data_series['velocity_x'] = data[:, 2]
+
+            yield data_series
+
+
+@profiled('parse')
+def initialize_point_data(ref_file, result_case, use_cache=False, cache_folder=None, cache_validation='mtime', dtype='float64'):
+    '''
+    If use_cache is True the parsed series are taken from the binary cache
+    (memory-mapped) if it is still valid, otherwise the file is parsed
+    and the cache (re)written, the series but the time in dtype
+    '''
+
+    if use_cache:
+        point_data = load_cached_point_data(
+            ref_file, result_case, cache_folder, cache_validation, dtype)
+
+        if point_data is not None:
+            print('## Loaded cached series for ' + ref_file)
+            return point_data
 
     point_data = {}
-    point_data['position'] = get_position_from_header(ref_file, result_case)
-    point_data['series'] = get_tabular_data(ref_file)
+    point_data['position'], point_data['series'] = read_point_file(
+        ref_file, result_case, dtype)
+
+    if use_cache:
+        save_cached_point_data(ref_file, result_case,
+                               point_data, cache_folder, cache_validation, dtype)
 
     return point_data
+
+
+def get_case_store_prefix(result_case, store_folder, dtype='float64'):
+    # NOTE: the dtype only if not the default, so that the existing stores stay valid
+    if dtype != 'float64':
+        result_case = result_case + '_' + dtype
+    return os_path.join(store_folder, 'CaseStore_' + result_case)
+
+
+def build_case_store(result_case, tap_files, store_folder, cache_validation='mtime', dtype='float64'):
+    '''
+    Builds the columnar store of a result case: all tap pressure series
+    as one (n_taps x n_steps) array in dtype, the shared time axis and the tap
+    metadata (label, file name, position), each tap file is parsed once
+    '''
+
+    if not tap_files:
+        raise Exception('No tap files for the case store of result case ' + result_case)
+
+    if not os_path.isdir(store_folder):
+        os.makedirs(store_folder)
+
+    store_prefix = get_case_store_prefix(result_case, store_folder, dtype)
+
+    # an outdated meta file must not mark a partially rebuilt store as valid
+    if os_path.isfile(store_prefix + '.meta.json'):
+        os.remove(store_prefix + '.meta.json')
+
+    meta = {}
+    meta['result_case'] = result_case
+    meta['dtype'] = dtype
+    meta['taps'] = []
+
+    pressure_store = None
+
+    for tap_counter, tap_file in enumerate(tap_files):
+        position, series = read_point_file(tap_file, result_case, dtype)
+
+        if pressure_store is None:
+            # NOTE: assuming that all taps have the same time step
+            # which should be the case as all are taken from the same simulation
+            time_series = series['time']
+            pressure_store = np.lib.format.open_memmap(store_prefix + '.pressure.npy.tmp', mode='w+',
+                                                       dtype=dtype,
+                                                       shape=(len(tap_files), len(time_series)))
+
+        if len(series['time']) != len(time_series):
+            raise Exception('Tap file ' + tap_file + ' has ' + str(len(series['time'])) +
+                            ' time steps instead of ' + str(len(time_series)) + ', no shared time axis for the case store')
+
+        if not np.array_equal(series['time'], time_series):
+            raise Exception('Time axis of tap file ' + tap_file +
+                            ' differs from the one of the first tap, no shared time axis for the case store')
+
+        pressure_store[tap_counter, :] = series['pressure']
+
+        tap_meta = {}
+        tap_meta['label'] = str(tap_counter + 1)
+        tap_meta['file_name'] = tap_file
+        tap_meta['position'] = [float(coordinate) for coordinate in position]
+        tap_meta['signature'] = get_file_signature(tap_file, cache_validation)
+        meta['taps'].append(tap_meta)
+
+    pressure_store.flush()
+    del pressure_store
+    os.replace(store_prefix + '.pressure.npy.tmp',
+               store_prefix + '.pressure.npy')
+    np.save(store_prefix + '.time.npy', time_series)
+
+    # meta file written last, marks the store as complete
+    with open(store_prefix + '.meta.json', 'w') as f:
+        json.dump(meta, f)
+
+    print('## Case store for result case ' + result_case + ' built with ' +
+          str(len(tap_files)) + ' taps and ' + str(len(time_series)) + ' time steps')
+
+
+@profiled('parse')
+def load_case_store(result_case, tap_files, store_folder, cache_validation='mtime', dtype='float64'):
+    '''
+    Returns the columnar store of a result case with the memory-mapped
+    pressure array in dtype, rows can be sliced without copying,
+    the store is (re)built if missing or outdated
+    '''
+
+    store_prefix = get_case_store_prefix(result_case, store_folder, dtype)
+
+    try:
+        with open(store_prefix + '.meta.json', 'r') as f:
+            meta = json.load(f)
+        is_valid = [tap['file_name'] for tap in meta['taps']] == list(tap_files) and all(
+            tap['signature'] == get_file_signature(tap['file_name'], cache_validation) for tap in meta['taps'])
+    except (IOError, ValueError):
+        is_valid = False
+
+    if not is_valid:
+        build_case_store(result_case, tap_files,
+                         store_folder, cache_validation, dtype)
+        with open(store_prefix + '.meta.json', 'r') as f:
+            meta = json.load(f)
+
+    case_store = {}
+    case_store['taps'] = meta['taps']
+    case_store['time'] = np.load(store_prefix + '.time.npy', mmap_mode='r')
+    case_store['pressure'] = np.load(
+        store_prefix + '.pressure.npy', mmap_mode='r')
+
+    return case_store
+
+
+def get_point_data_from_case_store(case_store, tap_idx):
+    # views into the memory-mapped store, nothing is copied
+
+    point_data = {}
+    point_data['position'] = case_store['taps'][tap_idx]['position']
+    point_data['series'] = {}
+    point_data['series']['time'] = case_store['time']
+    point_data['series']['pressure'] = case_store['pressure'][tap_idx]
+    point_data['series']['velocity_x'] = np.asarray([])
+
+    return point_data
+
+
+def write_results_data(zip_file, prefix, data):
+    '''
+    Writes the nested dictionary data into the open zip file of an .npz
+    container, one .npy entry per array or scalar named by the path of keys,
+    e.g. pressure_taps/new/1/statistics/cp/general/mean, so that the entries
+    can be added one after the other and read lazily by np.load
+    '''
+
+    for key, value in data.items():
+        name = prefix + '/' + str(key)
+
+        if isinstance(value, dict):
+            write_results_data(zip_file, name, value)
+        elif value is not None:
+            with zip_file.open(name + '.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(
+                    f, np.asarray(value), allow_pickle=False)
+
+
+def read_results_data(results_data, prefix, skip_keys=[]):
+    '''
+    The nested dictionary below prefix from the entries of an np.load-ed .npz container,
+    entries below any of skip_keys (e.g. series, pdf) are not read
+    '''
+
+    data = {}
+
+    for name in results_data.files:
+        if not name.startswith(prefix + '/'):
+            continue
+
+        keys = name[len(prefix) + 1:].split('/')
+        if any(key in skip_keys for key in keys):
+            continue
+        entry = data
+        for key in keys[:-1]:
+            entry = entry.setdefault(key, {})
+
+        value = results_data[name]
+        # scalars back to python scalars, e.g. the label as str
+        entry[keys[-1]] = value.item() if value.ndim == 0 else value
+
+    return data
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the follow mode: the files of a still running simulation
+are polled, only the appended rows are parsed and the statistics
+are updated incrementally, the summaries rewritten on each update
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import os
+import time
+from os import path as os_path
+
+import numpy as np
+
+from utilities.evaluation_utilities import get_fit_settings
+from utilities.export_utilities import export_summary_to_text
+from utilities.file_utilities import get_position_from_header_line
+from utilities.other_utilities import get_cp_mode_ending
+from utilities.statistic_utilities import initialize_streaming_moments, update_streaming_moments, get_streaming_moments_transformed, get_streaming_general_statistics, initialize_streaming_sub_blocks, update_streaming_sub_blocks, get_sections_from_sub_blocks, get_block_maxima_from_sections
+
+
+# the series the statistics are accumulated on, the cp of each mode
+# is a linear function of it with the current reference means
+base_series_of_cp_mode = {'trad': 'pressure',
+                          'new': 'pressure_difference'}
+
+
+def initialize_followed_file(file):
+    followed_file = {}
+    followed_file['file'] = file
+    # bytes parsed so far, always at the end of a complete line
+    followed_file['offset'] = 0
+    # the last parsed line, still ending at the offset if the file was only appended to
+    followed_file['last_line'] = b''
+    followed_file['first_line'] = None
+
+    return followed_file
+
+
+def is_followed_file_rewritten(followed_file):
+    '''
+    True if the part of the file parsed so far has changed, i.e. the file
+    was truncated, removed, replaced or rewritten (e.g. by a restarted simulation),
+    checked by the last parsed line, so only this line is read
+    '''
+
+    if followed_file['offset'] == 0:
+        return False
+
+    if not os_path.isfile(followed_file['file']):
+        return True
+
+    last_line = followed_file['last_line']
+    with open(followed_file['file'], 'rb') as f:
+        # NOTE: beyond the end of a truncated file nothing is read
+        f.seek(followed_file['offset'] - len(last_line))
+        return f.read(len(last_line)) != last_line
+
+
+def read_appended_rows(followed_file, nr_of_columns):
+    '''
+    Parses the complete lines appended since the last call, a partially
+    written last line is left for the next call. Returns the rows as
+    a 2d array, with no rows if nothing was appended.
+    '''
+
+    if not os_path.isfile(followed_file['file']):
+        return np.zeros((0, nr_of_columns))
+
+    with open(followed_file['file'], 'rb') as f:
+        f.seek(followed_file['offset'])
+        appended = f.read()
+
+    end = appended.rfind(b'\n') + 1
+    followed_file['offset'] += end
+    if end > 0:
+        followed_file['last_line'] = appended[appended.rfind(b'\n', 0, end - 1) + 1:end]
+    lines = appended[:end].decode().splitlines()
+
+    if followed_file['first_line'] is None and len(lines) > 0:
+        followed_file['first_line'] = lines[0]
+
+    # the header is a comment
+    lines = [line for line in lines if line.strip()
+             and not line.lstrip().startswith('#')]
+    if len(lines) == 0:
+        return np.zeros((0, nr_of_columns))
+
+    return np.loadtxt(lines, ndmin=2)[:, :nr_of_columns]
+
+
+def initialize_follow_state(result, cp_modes, input_data_folder, resolution=100):
+    '''
+    State of a followed result case: the read position in each file,
+    the sums for the reference means, the reference pressure not yet
+    used by all taps and for each tap the accumulated moments and sub-blocks
+    of the base series of the requested cp modes.
+    NOTE: the block boundaries are rounded to the resolution of the sub-blocks
+    '''
+
+    state = {}
+    state['result'] = result
+    state['cp_modes'] = cp_modes
+    state['input_data_folder'] = input_data_folder
+    state['resolution'] = resolution
+
+    ref_point = result['reference_points'][0]
+    state['reference'] = {}
+    state['reference']['file'] = initialize_followed_file(
+        os_path.join(input_data_folder, os_path.normpath(ref_point['file_name'])))
+    state['reference']['nr_of_rows'] = 0
+    state['reference']['pressure_sum'] = 0.0
+    state['reference']['velocity_x_sum'] = 0.0
+    # reference pressure from row pressure_start_row on
+    state['reference']['pressure'] = np.zeros(0)
+    state['reference']['pressure_start_row'] = 0
+
+    state['pressure_taps'] = []
+    for tap_idx, pressure_tap in enumerate(result['pressure_taps']):
+        tap_state = {}
+        tap_state['label'] = str(tap_idx + 1)
+        tap_state['file'] = initialize_followed_file(
+            os_path.join(input_data_folder, os_path.normpath(pressure_tap['file_name'])))
+        # rows added to the statistics and rows ahead of the reference point
+        tap_state['nr_of_rows'] = 0
+        tap_state['pending_rows'] = np.zeros((0, 2))
+        tap_state['post_ramp_up_index'] = None
+        tap_state['base_series'] = {}
+        for cp_mode in cp_modes:
+            tap_state['base_series'][base_series_of_cp_mode[cp_mode]] = {
+                'moments': initialize_streaming_moments(),
+                'sub_blocks': initialize_streaming_sub_blocks(resolution)}
+        state['pressure_taps'].append(tap_state)
+
+    return state
+
+
+def update_follow_state(state):
+    '''
+    Adds the rows appended since the last update, the cost is
+    proportional to the new rows. Rows of a tap ahead of the reference point
+    are kept until the reference point has the same rows.
+    If a file of the case was truncated or rewritten, the state is reset
+    and all files are parsed again from the beginning.
+    Returns the number of new rows.
+    NOTE: the rows of the taps and the reference point are assumed to belong
+    to the same time steps, as for the other paths
+    '''
+
+    result = state['result']
+
+    if any(is_followed_file_rewritten(followed_file) for followed_file in
+           [state['reference']['file']] + [tap_state['file'] for tap_state in state['pressure_taps']]):
+        print('## Files of result case ' + result['case'] +
+              ' truncated or rewritten, the follow state is reset')
+        state.update(initialize_follow_state(result, state['cp_modes'],
+                                             state['input_data_folder'], state['resolution']))
+
+    reference = state['reference']
+    ramp_up_threshold = result['ramp_up_time'] + result['ramp_up_time'] / 5
+
+    # time, pressure, velocity_x
+    reference_rows = read_appended_rows(reference['file'], 3)
+    nr_of_new_rows = len(reference_rows)
+    reference['nr_of_rows'] += len(reference_rows)
+    reference['pressure_sum'] += np.sum(reference_rows[:, 1])
+    reference['velocity_x_sum'] += np.sum(reference_rows[:, 2])
+    reference['pressure'] = np.concatenate(
+        [reference['pressure'], reference_rows[:, 1]])
+
+    for tap_state in state['pressure_taps']:
+        # time, pressure
+        tap_rows = read_appended_rows(tap_state['file'], 2)
+        nr_of_new_rows += len(tap_rows)
+        tap_state['pending_rows'] = np.vstack(
+            [tap_state['pending_rows'], tap_rows])
+
+        nr_of_rows = min(len(tap_state['pending_rows']),
+                         reference['nr_of_rows'] - tap_state['nr_of_rows'])
+        rows = tap_state['pending_rows'][:nr_of_rows]
+        tap_state['pending_rows'] = tap_state['pending_rows'][nr_of_rows:]
+        first_row = tap_state['nr_of_rows']
+        tap_state['nr_of_rows'] += nr_of_rows
+
+        if tap_state['post_ramp_up_index'] is None:
+            # same criterion as get_ramp_up_index, all later rows are after ramp-up
+            after_ramp_up = np.nonzero(rows[:, 0] >= ramp_up_threshold)[0]
+            if len(after_ramp_up) == 0:
+                continue
+            tap_state['post_ramp_up_index'] = first_row + after_ramp_up[0]
+
+        start = max(tap_state['post_ramp_up_index'] - first_row, 0)
+        reference_start = first_row + start - reference['pressure_start_row']
+        base_series = {}
+        base_series['pressure'] = rows[start:, 1]
+        base_series['pressure_difference'] = rows[start:, 1] - \
+            reference['pressure'][reference_start:reference_start + nr_of_rows - start]
+
+        for key, accumulator in tap_state['base_series'].items():
+            update_streaming_moments(accumulator['moments'], base_series[key])
+            update_streaming_sub_blocks(
+                accumulator['sub_blocks'], base_series[key])
+
+    # the reference pressure used by all taps is not needed anymore
+    nr_of_used_rows = min([tap_state['nr_of_rows'] for tap_state in state['pressure_taps']] +
+                          [reference['nr_of_rows']])
+    reference['pressure'] = reference['pressure'][nr_of_used_rows -
+                                                  reference['pressure_start_row']:]
+    reference['pressure_start_row'] = nr_of_used_rows
+
+    return nr_of_new_rows
+
+
+def get_followed_pressure_taps(state, cp_mode, args):
+    '''
+    Tap dictionaries as by evaluate_pressure_taps (without series) for the
+    current state, the accumulated base series are mapped to the cp by the
+    current reference means, so the statistics are those of a complete
+    evaluation of the rows read so far. Taps with too few samples
+    after ramp-up are left out.
+    '''
+
+    result = state['result']
+    reference = state['reference']
+
+    if reference['nr_of_rows'] == 0:
+        return []
+
+    reference_pressure = reference['pressure_sum'] / reference['nr_of_rows']
+    reference_velocity = reference['velocity_x_sum'] / \
+        reference['nr_of_rows']
+    mutiplication_factor = 1 / (0.5 * result['density'] * reference_velocity**2)
+    # cp_mode trad subtracts the mean reference pressure, new the one of each time step
+    offset = reference_pressure if cp_mode == 'trad' else 0.0
+
+    pressure_taps = []
+    for tap_idx, tap_state in enumerate(state['pressure_taps']):
+        accumulator = tap_state['base_series'][base_series_of_cp_mode[cp_mode]]
+
+        if accumulator['moments']['n'] < 2 * args.nr_of_blocks:
+            print('## Not enough samples after ramp-up for tap label ' +
+                  tap_state['label'] + ' yet')
+            continue
+
+        pressure_tap = dict(result['pressure_taps'][tap_idx])
+        pressure_tap['label'] = tap_state['label']
+        pressure_tap['position'] = get_position_from_header_line(
+            tap_state['file']['first_line'], result['case'])
+        pressure_tap['post_ramp_up_index'] = tap_state['post_ramp_up_index']
+
+        sections = get_sections_from_sub_blocks(accumulator['sub_blocks'], args.nr_of_blocks,
+                                                offset, mutiplication_factor)
+
+        pressure_tap['statistics'] = {}
+        pressure_tap['statistics']['cp'] = {}
+        pressure_tap['statistics']['cp']['general'] = get_streaming_general_statistics(
+            get_streaming_moments_transformed(accumulator['moments'], offset, mutiplication_factor),
+            None, args.calculate_mode)
+        pressure_tap['statistics']['cp']['extreme_value'] = get_block_maxima_from_sections(sections['mean'][np.newaxis, :],
+                                                                                           sections['max_idx'][np.newaxis, :],
+                                                                                           sections['max_val'][np.newaxis, :],
+                                                                                           sections['min_idx'][np.newaxis, :],
+                                                                                           sections['min_val'][np.newaxis, :],
+                                                                                           sections['sizes'],
+                                                                                           tap_state['post_ramp_up_index'],
+                                                                                           args.calculate_mode,
+                                                                                           args.pdf_case,
+                                                                                           get_fit_settings(args))[0]
+        pressure_taps.append(pressure_tap)
+
+    return pressure_taps
+
+
+def write_follow_summaries(state, args, folders, endings):
+    # one summary per cp mode, replaced at once so that readers never see a partial file
+
+    for cp_mode in state['cp_modes']:
+        pressure_taps = get_followed_pressure_taps(state, cp_mode, args)
+        if len(pressure_taps) == 0:
+            continue
+
+        summary_file = os_path.join(folders['summaries'], 'LowriseSummary_' + state['result']['case'] +
+                                    get_cp_mode_ending(cp_mode) + endings['summary'])
+        with open(summary_file + '.tmp', 'w') as result_summary:
+            result_summary.write(export_summary_to_text(
+                pressure_taps, args.calculate_mode))
+        os.replace(summary_file + '.tmp', summary_file)
+
+
+def follow_result_cases(results, cp_modes, args, folders, endings):
+    '''
+    Follows the result cases of a still running simulation: every
+    args.follow_interval seconds the appended rows are added and the
+    summaries rewritten, until interrupted or after args.follow_updates updates.
+    No reports are written in follow mode.
+    '''
+
+    if args.extreme_value_case != 'BM':
+        raise Exception('Extreme value case ' + args.extreme_value_case +
+                        ' not supported for follow mode, choose BM')
+
+    states = [initialize_follow_state(result, cp_modes, folders['input_data'], args.follow_resolution)
+              for result in results]
+    nr_of_updates = 0
+
+    try:
+        while True:
+            start_time = time.perf_counter()
+
+            for state in states:
+                nr_of_new_rows = update_follow_state(state)
+                write_follow_summaries(state, args, folders, endings)
+                print('## Follow update for result case ' + state['result']['case'] + ': ' +
+                      str(nr_of_new_rows) + ' new rows, ' +
+                      str(state['reference']['nr_of_rows']) + ' time steps of the reference point')
+
+            nr_of_updates += 1
+            if args.follow_updates and nr_of_updates >= args.follow_updates:
+                break
+
+            time.sleep(max(args.follow_interval -
+                           (time.perf_counter() - start_time), 0.0))
+
+    except KeyboardInterrupt:
+        print('## Follow mode stopped after ' +
+              str(nr_of_updates) + ' updates')
@@ -12,6 +12,8 @@ import numpy as np
 from scipy.stats import tmean
 from argparse import ArgumentParser, ArgumentTypeError
 
+from utilities.profile_utilities import profiled
+
 
 def get_custom_parser_settings():
 
@@ -35,6 +37,20 @@ def get_custom_parser_settings():
                         help='bool: calculate_mode when calling statistics, will slow down computation if True')
     parser.add_argument('-nb', '--nr_of_blocks', dest='nr_of_blocks', type=int, default=6,
                         help='int: number of blocks for Block-axima')
+    # extreme value evaluation: Block-Maxima or Peak-Over-Threshold
+    parser.add_argument('-evc', '--extreme_value_case', dest='extreme_value_case', type=str, default='BM',
+                        help='str: extreme value evaluation, either BM (Block-Maxima) or POT (Peak-Over-Threshold)')
+    parser.add_argument('-ptq', '--pot_threshold_quantile', dest='pot_threshold_quantile', type=str, default='0.95',
+                        help='str: quantile of the series used as threshold for POT, comma separated for a threshold sweep, e.g. 0.95,0.9,0.97,0.99: the first one is used for the evaluation, the GPD shape and scale for all are written to the summaries')
+    parser.add_argument('-pms', '--pot_min_separation', dest='pot_min_separation', type=float, default=1.0,
+                        help='float: time in seconds below the threshold after which a new peak cluster starts for POT')
+    # fit of an extreme value distribution for the design values
+    parser.add_argument('-fd', '--fit_distribution', dest='fit_distribution', type=str, default=None,
+                        help='str: extreme value distribution fitted to the Block-Maxima, either gumbel or gev, no fit if not set')
+    parser.add_argument('-fm', '--fit_method', dest='fit_method', type=str, default=None,
+                        help='str: fit method, for gumbel either blue (default), moments or mle, for gev either pwm (default) or mle')
+    parser.add_argument('-dne', '--design_non_exceedance', dest='design_non_exceedance', type=float, default=0.78,
+                        help='float: probability of non-exceedance of the design value within a block')
     # the way how to calculate the cp
     # trad = traditional = reference values is not subtracted for each time step,
     # but an arithmetic mean is used for p0 and v_ref
@@ -42,39 +58,205 @@ def get_custom_parser_settings():
     # using p0(t) and v_ref
     parser.add_argument('-cpm', '--cp_mode', dest='cp_mode', type=str, default='new',
                         help='str: selecting the way how to calculate the cp ')
+    # several cp modes and a selection of result cases in one invocation
+    # each tap file is loaded once and all cp modes are derived from it
+    parser.add_argument('-cpms', '--cp_modes', dest='cp_modes', type=str, default=None,
+                        help='str: comma separated cp modes evaluated together, e.g. trad,new, overrides cp_mode if set')
+    parser.add_argument('-cs', '--cases', dest='cases', type=str, default=None,
+                        help='str: comma separated result cases to evaluate, e.g. Kratos,FeFloSlip, all if not set')
+    # caching of the parsed series as binary files
+    # which are loaded memory-mapped on repeated evaluations
+    parser.add_argument('-uc', '--use_cache', dest='use_cache', type=str2bool, default=False,
+                        help='bool: use_cache for the parsed input series, will speed up repeated evaluations if True')
+    parser.add_argument('-cf', '--cache_folder', dest='cache_folder', type=str, default=None,
+                        help='str: folder for the cache files, if not set these are put next to the input files')
+    parser.add_argument('-cv', '--cache_validation', dest='cache_validation', type=str, default='mtime',
+                        help='str: invalidating the cache by file size and mtime or by content hash, either mtime or hash')
+    # cache of the computed statistics, only plotting is repeated
+    parser.add_argument('-urc', '--use_result_cache', dest='use_result_cache', type=str2bool, default=False,
+                        help='bool: use_result_cache for the computed statistics, keyed by the input file signatures (see -cv) and all settings')
+    parser.add_argument('-rcs', '--result_cache_size', dest='result_cache_size', type=float, default=1024.0,
+                        help='float: maximum size of the result cache in MB, least recently used entries are evicted')
+    # columnar store with all taps of a result case as one memory-mapped array
+    parser.add_argument('-ucs', '--use_case_store', dest='use_case_store', type=str2bool, default=False,
+                        help='bool: use_case_store to load all taps of a result case from one memory-mapped array')
+    # pdf estimation: exact KDE, binned FFT KDE or normal pdf
+    parser.add_argument('-pdf', '--pdf_case', dest='pdf_case', type=str, default='KDE',
+                        help='str: pdf estimation, either KDE, KDE_FFT (binned, much faster) or Normal')
+    parser.add_argument('-cpa', '--check_pdf_accuracy', dest='check_pdf_accuracy', type=str2bool, default=False,
+                        help='bool: check_pdf_accuracy of the binned FFT KDE against the exact KDE on the reference pressure')
+    # velocity spectra: Welch averaging and logarithmic binning
+    parser.add_argument('-ss', '--spectra_segments', dest='spectra_segments', type=int, default=1,
+                        help='int: number of overlapping segments for the Welch averaged velocity spectra, plain periodogram if 1')
+    parser.add_argument('-sb', '--spectra_bins', dest='spectra_bins', type=int, default=0,
+                        help='int: number of logarithmic frequency bins for the velocity spectra, no binning if 0')
+    # faster report rendering
+    parser.add_argument('-tr', '--text_rendering', dest='text_rendering', type=str, default='latex',
+                        help='str: text rendering of the plots, either latex or mathtext (similar look, much faster)')
+    parser.add_argument('-db', '--decimation_buckets', dest='decimation_buckets', type=int, default=2000,
+                        help='int: number of min/max buckets the plotted time histories are decimated to, all samples if 0')
+    parser.add_argument('-upt', '--use_page_template', dest='use_page_template', type=str2bool, default=False,
+                        help='bool: use_page_template for the tap pages, built once and only the data swapped, faster if True')
+    parser.add_argument('-rw', '--render_workers', dest='render_workers', type=int, default=1,
+                        help='int: number of worker processes rendering the pages into single page PDFs merged in order (needs pypdf), serial if 1')
+    parser.add_argument('-if', '--image_formats', dest='image_formats', type=str, default='',
+                        help='str: comma separated image formats (e.g. png,svg) each tap page is also saved as, none if empty')
+    # separate compute and render stages with the results data as .npz in between
+    parser.add_argument('-stg', '--stage', dest='stage', type=str, default='all',
+                        help='str: all (compute and render), compute (results data and summaries only) or render (reports from the results data only)')
+    # constant-memory evaluation reading the tap files in chunks
+    parser.add_argument('-st', '--streaming', dest='streaming', type=str2bool, default=False,
+                        help='bool: streaming evaluation of the tap files in chunks with bounded memory, no time history plots if True')
+    parser.add_argument('-chs', '--chunk_size', dest='chunk_size', type=int, default=65536,
+                        help='int: number of rows per chunk for the streaming evaluation')
+    # taps evaluated in batches, only the statistics of each tap are kept after its page
+    parser.add_argument('-tbs', '--tap_batch_size', dest='tap_batch_size', type=int, default=8,
+                        help='int: number of taps loaded and evaluated together, bounds the peak memory, all taps of a case (or chunk of a worker) at once if 0')
+    # single precision storage of the tap series, the statistics are accumulated in float64
+    parser.add_argument('-dt', '--dtype', dest='dtype', type=str, default='float64',
+                        help='str: dtype of the pressure and cp series of the taps, either float64 or float32 (half the memory), not for streaming')
+    parser.add_argument('-dtc', '--dtype_check', dest='dtype_check', type=str2bool, default=False,
+                        help='bool: dtype_check, evaluates the taps also with float64 series and reports the deviation of the summary statistics if True')
+    # follow mode for a still running simulation, only the appended rows are parsed
+    parser.add_argument('-fo', '--follow', dest='follow', type=str2bool, default=False,
+                        help='bool: follow the input files of a running simulation and rewrite the summaries periodically, no reports if True')
+    parser.add_argument('-fi', '--follow_interval', dest='follow_interval', type=float, default=60.0,
+                        help='float: time in seconds between the updates of the follow mode')
+    parser.add_argument('-fu', '--follow_updates', dest='follow_updates', type=int, default=0,
+                        help='int: number of updates after which the follow mode stops, until interrupted if 0')
+    parser.add_argument('-fr', '--follow_resolution', dest='follow_resolution', type=int, default=100,
+                        help='int: number of samples to which the block boundaries are rounded in follow mode, exact if 1')
+    # summaries: the legacy text summary and columnar formats at full precision
+    parser.add_argument('-sf', '--summary_formats', dest='summary_formats', type=str, default='dat',
+                        help='str: comma separated summary formats: dat (legacy text), csv, npz or parquet (needs pyarrow)')
+    parser.add_argument('-sx', '--summary_extremes', dest='summary_extremes', type=str2bool, default=False,
+                        help='bool: summary_extremes, also the extreme indices and values and the pdfs of each tap for csv, npz and parquet if True')
+    # timing report of the stages of the evaluation
+    parser.add_argument('-pf', '--profile', dest='profile', type=str2bool, default=False,
+                        help='bool: profile the wall time, CPU time, bytes read and peak memory of the stages per case and tap, report in the "profiles" folder')
+    # parallel evaluation of the pressure taps
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=1,
+                        help='int: number of worker processes, for several result cases these are evaluated in parallel, otherwise the pressure taps, serial if 1')
+
+    return parser
+
+
+def get_benchmark_parser_settings():
+
+    # the evaluation arguments (e.g. calculate mode, pdf case) and the ones of the benchmarks
+    parser = get_custom_parser_settings()
+
+    parser.add_argument('-bns', '--benchmark_samples', dest='benchmark_samples', type=str, default='10000,30000,100000',
+                        help='str: comma separated series lengths (number of samples) of the synthetic cases')
+    parser.add_argument('-bnt', '--benchmark_taps', dest='benchmark_taps', type=str, default='1,4,16',
+                        help='str: comma separated numbers of taps of the synthetic cases')
+    parser.add_argument('-bff', '--benchmark_file_format', dest='benchmark_file_format', type=str, default='Kratos',
+                        help='str: file format of the synthetic cases, either Kratos or FeFlo')
+    parser.add_argument('-bts', '--benchmark_time_step', dest='benchmark_time_step', type=float, default=0.02,
+                        help='float: time step in seconds of the synthetic series')
+    parser.add_argument('-blx', '--benchmark_length_scale', dest='benchmark_length_scale', type=float, default=100.0,
+                        help='float: length scale Lux in m of the ESDU target autocorrelation of the synthetic series')
+    parser.add_argument('-bti', '--benchmark_turbulence_intensity', dest='benchmark_turbulence_intensity', type=float, default=0.15,
+                        help='float: turbulence intensity of the synthetic velocity')
+    parser.add_argument('-bsd', '--benchmark_seed', dest='benchmark_seed', type=int, default=0,
+                        help='int: seed of the random numbers of the synthetic series')
+    parser.add_argument('-brp', '--benchmark_repeats', dest='benchmark_repeats', type=int, default=3,
+                        help='int: number of runs of each stage, the fastest is taken')
+    parser.add_argument('-bl', '--benchmark_label', dest='benchmark_label', type=str, default='current',
+                        help='str: label of the benchmark results, e.g. the version, used in the file names')
+    parser.add_argument('-bc', '--benchmark_compare', dest='benchmark_compare', type=str, default='',
+                        help='str: label of earlier benchmark results to compare with, none if empty')
 
     return parser
 
 
+def get_comparison_parser_settings():
+
+    # the evaluation arguments (e.g. cases, cp modes, run test) and the ones of the comparison
+    parser = get_custom_parser_settings()
+
+    parser.add_argument('-cq', '--comparison_quantities', dest='comparison_quantities', type=str, default='',
+                        help='str: comma separated summary quantities compared, e.g. mean,std,cev_mean, all common ones if empty')
+    parser.add_argument('-cr', '--comparison_reference', dest='comparison_reference', type=str, default='',
+                        help='str: variant the others are compared to, e.g. Kratos_New, the first one if empty')
+    parser.add_argument('-cl', '--comparison_label', dest='comparison_label', type=str, default='all',
+                        help='str: label of the comparison, used in the file names')
+
+    return parser
+
+
+def get_pot_threshold_quantiles(pot_threshold_quantile):
+    # the threshold quantiles of the POT, the first one for the evaluation, several for a sweep
+    return [float(item) for item in str(pot_threshold_quantile).split(',')]
+
+
 def get_ramp_up_index(times_series, ramp_up_time):
     return np.where(times_series >= ramp_up_time + ramp_up_time / 5)[0][0]
 
 
-def get_cp_series(tap_pressure_series, reference_data_series, density, cp_mode):
+def get_cp_mode_ending(cp_mode):
+    # file name ending of the reports and summaries
     if cp_mode == 'trad':
-        return get_cp_series_traditional(tap_pressure_series, reference_data_series, density)
+        return '_Trad'
+    else:
+        return '_New'
+
+
+def get_series_in_dtype(series, dtype):
+    '''
+    The series (e.g. pressure, cp) in dtype, either float64 or float32.
+    NOTE: the time axis stays float64, so that the ramp-up index and the
+    blocks do not depend on the dtype
+    '''
+
+    if dtype not in ['float64', 'float32']:
+        raise Exception('dtype ' + dtype + ' not implemented, choose either float64 or float32')
+
+    return {key: value if key == 'time' else np.asarray(value, dtype=dtype)
+            for key, value in series.items()}
+
+
+def get_reference_values(reference_data_series):
+    # arithmetic means of the reference point, these are the same for
+    # all taps of a case so can be computed once and passed to get_cp_series
+    reference_values = {}
+    reference_values['velocity_x'] = tmean(reference_data_series['velocity_x'])
+    reference_values['pressure'] = tmean(reference_data_series['pressure'])
+
+    return reference_values
+
+
+@profiled('cp')
+def get_cp_series(tap_pressure_series, reference_data_series, density, cp_mode, reference_values=None):
+    if cp_mode == 'trad':
+        return get_cp_series_traditional(tap_pressure_series, reference_data_series, density, reference_values)
     elif cp_mode == 'new':
-        return get_cp_series_new(tap_pressure_series, reference_data_series, density)
+        return get_cp_series_new(tap_pressure_series, reference_data_series, density, reference_values)
     else:
         raise ArgumentTypeError('cp_mode not implemented.')
 
 
-def get_cp_series_traditional(tap_pressure_series, reference_data_series, density):
+def get_cp_series_traditional(tap_pressure_series, reference_data_series, density, reference_values=None):
     # this is the cp calculation using the "traditional" way
     # so using the arithmetic mean of pressure and reference streamwise
     # velocity
-    reference_velocity = tmean(reference_data_series['velocity_x'])
-    refernce_pressure = tmean(reference_data_series['pressure'])
+    if reference_values is None:
+        reference_values = get_reference_values(reference_data_series)
+    reference_velocity = reference_values['velocity_x']
+    refernce_pressure = reference_values['pressure']
     mutiplication_factor = 1 / (0.5 * density * reference_velocity**2)
 
     return np.multiply(tap_pressure_series - refernce_pressure, mutiplication_factor)
 
 
-def get_cp_series_new(tap_pressure_series, reference_data_series, density):
+def get_cp_series_new(tap_pressure_series, reference_data_series, density, reference_values=None):
     # this is the cp calculation using the "new/cleaning"
     # so substracting the reference pressure
     # for each time instance
-    reference_velocity = tmean(reference_data_series['velocity_x'])
+    if reference_values is None:
+        reference_velocity = tmean(reference_data_series['velocity_x'])
+    else:
+        reference_velocity = reference_values['velocity_x']
     mutiplication_factor = 1 / (0.5 * density * reference_velocity**2)
 
     return np.multiply(np.subtract(tap_pressure_series, reference_data_series['pressure']),
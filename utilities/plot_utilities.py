@@ -8,9 +8,12 @@ Created on 08.07.2018
 """
 
 
+import warnings
+
 import numpy as np
 from matplotlib import pyplot as plt
 import matplotlib.gridspec as gridspec
+from matplotlib.transforms import Bbox
 
 
 # print to check all available predefined plot styles
@@ -69,6 +72,30 @@ params = {'text.usetex': True,
           }
 plt.rcParams.update(params)
 
+# alternative to LaTeX: matplotlib's own mathtext with the Computer Modern
+# fonts it ships, similar look but no LaTeX run for each text element
+mathtext_params = {'text.usetex': False,
+                   'font.family': 'serif',
+                   'font.serif': ['cmr10'],
+                   'mathtext.fontset': 'cm',
+                   # NOTE: cmr10 has no unicode minus, tick labels are plain text
+                   # as parsing each of them as mathtext is slow
+                   'axes.unicode_minus': False}
+
+
+def set_text_rendering(text_rendering='latex'):
+    # latex: the params above (default), mathtext: no LaTeX needed, much faster
+
+    if text_rendering == 'latex':
+        plt.rcParams.update(params)
+    elif text_rendering == 'mathtext':
+        plt.rcParams.update(mathtext_params)
+        warnings.filterwarnings(
+            'ignore', message='cmr10 font should ideally be used with mathtext')
+    else:
+        raise Exception('Text rendering: ' + text_rendering +
+                        ' not implemented, choose either latex or mathtext')
+
 # define custom plot limits
 plot_limits = {
     # time series = ts
@@ -102,7 +129,56 @@ plot_limits = {
 }
 
 
-def plot_pressure_tap_cp_results(pressure_tap, calculate_mode, report_pdf):
+def get_min_max_decimation_idx(data_series, nr_of_buckets=2000, keep_idx=None):
+    '''
+    Indices of the min/max decimation of a series for plotting: the series
+    is split into nr_of_buckets buckets of equal length (about one per pixel
+    column) and only the min and max of each bucket are kept, in order,
+    together with the first and last sample. The plotted trace then has the
+    same envelope, all peaks are exact, with at most 2 nr_of_buckets + 2 points.
+    The keep_idx (e.g. the marked extremes) are always kept.
+    No decimation if nr_of_buckets is 0 or the series is short enough.
+    '''
+
+    data_series = np.asarray(data_series)
+    nr_of_samples = len(data_series)
+
+    if nr_of_buckets <= 0 or nr_of_samples <= 2 * nr_of_buckets + 2:
+        return np.arange(nr_of_samples)
+
+    # ceil, the last bucket can be shorter
+    bucket_size = -(-nr_of_samples // nr_of_buckets)
+    nr_of_full_buckets = nr_of_samples // bucket_size
+    buckets = data_series[:nr_of_full_buckets *
+                          bucket_size].reshape(nr_of_full_buckets, bucket_size)
+    bucket_offset = np.arange(nr_of_full_buckets) * bucket_size
+
+    decimation_idx = [bucket_offset + np.argmin(buckets, axis=-1),
+                      bucket_offset + np.argmax(buckets, axis=-1),
+                      np.asarray([0, nr_of_samples - 1])]
+
+    if nr_of_full_buckets * bucket_size < nr_of_samples:
+        last_bucket = data_series[nr_of_full_buckets * bucket_size:]
+        decimation_idx.append(nr_of_full_buckets * bucket_size +
+                              np.asarray([np.argmin(last_bucket), np.argmax(last_bucket)]))
+
+    if keep_idx is not None:
+        decimation_idx.append(np.asarray(keep_idx, dtype=int).ravel())
+
+    # sorted and unique, so in the order of the series
+    return np.unique(np.concatenate(decimation_idx))
+
+
+def get_pressure_tap_keep_idx(pressure_tap):
+    # the marked classical and alternative extremes, kept by the decimation
+
+    extreme_value = pressure_tap['statistics']['cp']['extreme_value']
+
+    return np.concatenate([np.asarray(extreme_value[extreme_type]['idx'], dtype=int).ravel()
+                           for extreme_type in ['classical', 'alternative'] if extreme_value[extreme_type]])
+
+
+def plot_pressure_tap_cp_results(pressure_tap, calculate_mode, report_pdf, nr_of_buckets=2000):
 
     # main figure
     fig = plt.figure()
@@ -113,9 +189,11 @@ def plot_pressure_tap_cp_results(pressure_tap, calculate_mode, report_pdf):
     # subplot 1
     ax1 = fig.add_subplot(gs[0, :])
 
-    # main plot
-    ax1.plot(pressure_tap['series']['time'],
-             pressure_tap['series']['cp'])
+    # main plot, decimated keeping the peaks and the marked extremes
+    decimation_idx = get_min_max_decimation_idx(pressure_tap['series']['cp'], nr_of_buckets,
+                                                get_pressure_tap_keep_idx(pressure_tap))
+    ax1.plot(pressure_tap['series']['time'][decimation_idx],
+             pressure_tap['series']['cp'][decimation_idx])
 
     # mean
     ax1.axhline(pressure_tap['statistics']['cp']['general']['mean'],
@@ -264,7 +342,162 @@ def plot_pressure_tap_cp_results(pressure_tap, calculate_mode, report_pdf):
     plt.close()
 
 
-def plot_ref_point_pressure_results(ref_point, report_pdf):
+def get_pressure_tap_cp_template(calculate_mode):
+    '''
+    Builds the figure of plot_pressure_tap_cp_results once with all artists,
+    plot_pressure_tap_cp_results_with_template then only swaps their data
+    and texts for each tap, the layout is computed for the first tap only.
+    To be closed by plt.close(template['fig']) after the last tap.
+    '''
+
+    template = {}
+    template['fig'] = plt.figure()
+    template['title'] = template['fig'].suptitle('')
+    template['gs'] = gridspec.GridSpec(2, 3)
+    template['is_laid_out'] = False
+
+    # subplot 1
+    ax1 = template['fig'].add_subplot(template['gs'][0, :])
+    template['ax1'] = ax1
+    template['series'], = ax1.plot([], [])
+    template['mean'] = ax1.axhline(0.0, color='r',
+                                   linestyle='-', label='Mean')
+    template['mean_text'] = ax1.text(0.95, 0.5, '', transform=ax1.transAxes)
+    template['classical'] = ax1.scatter(
+        [], [], marker='s', c='r', label='Clas. Extr.')
+    template['alternative'] = ax1.scatter(
+        [], [], marker='D', c='g', label='Alter. Extr.')
+    template['block_lines'] = []
+
+    ax1.set_title('Time history')
+    ax1.set_xlabel('Time [s]')
+    ax1.set_ylabel(r'$C_{p}$  [-]')
+    ax1.set_xlim(plot_limits['ts']['x'])
+    ax1.legend()
+    ax1.grid(True)
+
+    # subplots 2 to 4: pdf with mean and mode
+    for ax_name, gs_idx, title in [('ax2', 0, 'PDF of time history'),
+                                   ('ax3', 1, 'PDF of Classical Extrema'),
+                                   ('ax4', 2, 'PDF of Alternative Extrema')]:
+        ax = template['fig'].add_subplot(template['gs'][1, gs_idx])
+        template[ax_name] = ax
+        template[ax_name + '_pdf'], = ax.plot([], [])
+        template[ax_name + '_mean'] = ax.axvline(0.0, color='r', label='Mean')
+        if calculate_mode:
+            template[ax_name + '_mode'] = ax.axvline(0.0,
+                                                     color='g', label='Mode')
+        template[ax_name + '_text'] = ax.text(
+            0.1, 0.9, '', transform=ax.transAxes)
+        ax.set_title(title)
+        ax.set_xlabel(r'$C_{p}$  [-]')
+        ax.grid(True)
+
+    template['ax2'].set_ylabel('Probability density')
+    template['ax4'].legend(bbox_to_anchor=(0.9, 0.9),
+                           bbox_transform=template['ax4'].transAxes)
+
+    return template
+
+
+def update_pdf_axis_of_template(template, ax_name, statistics, calculate_mode):
+    # pdf line, mean, mode and text of one of the subplots 2 to 4
+
+    template[ax_name + '_pdf'].set_data(statistics['pdf']['x'],
+                                        statistics['pdf']['y'])
+    template[ax_name + '_mean'].set_xdata(
+        [statistics['mean'], statistics['mean']])
+    text_msg = 'Mean %.3f' % (statistics['mean'])
+
+    if calculate_mode:
+        template[ax_name + '_mode'].set_xdata(
+            [statistics['mode'], statistics['mode']])
+        text_msg = 'Mean %.3f \n Mode %.3f' % (
+            statistics['mean'], statistics['mode'])
+
+    template[ax_name + '_text'].set_text(text_msg)
+    # NOTE: the limits of a fresh axis, without finite data (e.g. the pdf of a constant series)
+    # autoscale_view would otherwise keep the limits of the previous tap
+    template[ax_name].viewLim.set_points(Bbox.unit().get_points())
+    template[ax_name].relim()
+    template[ax_name].autoscale_view()
+
+
+def plot_pressure_tap_cp_results_with_template(pressure_tap, calculate_mode, report_pdf, template, nr_of_buckets=2000):
+    '''
+    Same page as plot_pressure_tap_cp_results, drawn by swapping the data
+    of the artists of the template from get_pressure_tap_cp_template
+    '''
+
+    extreme_value = pressure_tap['statistics']['cp']['extreme_value']
+    time_series = pressure_tap['series']['time']
+    cp_series = pressure_tap['series']['cp']
+
+    template['title'].set_text('Results for tap "' +
+                               pressure_tap['label'] + '" at: ' + ', '.join(map(str, pressure_tap['position'])))
+
+    # subplot 1, decimated keeping the peaks and the marked extremes
+    decimation_idx = get_min_max_decimation_idx(
+        cp_series, nr_of_buckets, get_pressure_tap_keep_idx(pressure_tap))
+    template['series'].set_data(
+        time_series[decimation_idx], cp_series[decimation_idx])
+    mean = pressure_tap['statistics']['cp']['general']['mean']
+    template['mean'].set_ydata([mean, mean])
+    template['mean_text'].set_text('Mean %.3f' % mean)
+
+    for extreme_type in ['classical', 'alternative']:
+        if extreme_value[extreme_type]:
+            template[extreme_type].set_offsets(np.column_stack([time_series[extreme_value[extreme_type]['idx']],
+                                                                cp_series[extreme_value[extreme_type]['idx']]]))
+        else:
+            template[extreme_type].set_offsets(np.zeros((0, 2)))
+
+    # the number of blocks is the same for all taps, otherwise lines are added or hidden
+    while len(template['block_lines']) < len(extreme_value['block_start_idx']):
+        template['block_lines'].append(template['ax1'].axvline(
+            x=0.0, color='k', linestyle='--'))
+    for line_idx, line in enumerate(template['block_lines']):
+        if line_idx < len(extreme_value['block_start_idx']):
+            block_start_time = time_series[extreme_value['block_start_idx'][line_idx]]
+            line.set_xdata([block_start_time, block_start_time])
+            line.set_visible(True)
+        else:
+            line.set_visible(False)
+
+    template['ax1'].relim()
+    template['ax1'].autoscale_view(scalex=False)
+
+    # subplots 2 to 4
+    update_pdf_axis_of_template(template, 'ax2',
+                                pressure_tap['statistics']['cp']['general'], calculate_mode)
+    update_pdf_axis_of_template(template, 'ax3',
+                                extreme_value['classical']['statistics'], calculate_mode)
+
+    if extreme_value['alternative']:
+        # list not empty
+        update_pdf_axis_of_template(template, 'ax4',
+                                    extreme_value['alternative']['statistics'], calculate_mode)
+    else:
+        print(
+            "## pressure_tap['statistics']['cp']['extreme_value']['alternative'] list empty for tap " + pressure_tap['label'])
+    for artist_name in ['ax4_pdf', 'ax4_mean', 'ax4_mode', 'ax4_text']:
+        if artist_name in template:
+            template[artist_name].set_visible(
+                bool(extreme_value['alternative']))
+
+    # NOTE: layout and bounding box computed once, expensive and nearly the same for all taps,
+    # the fixed bounding box avoids the second draw of each page by savefig.bbox tight
+    if not template['is_laid_out']:
+        template['gs'].tight_layout(template['fig'], rect=cust_rect)
+        template['fig'].canvas.draw()
+        template['bbox'] = template['fig'].get_tightbbox(template['fig'].canvas.get_renderer()).padded(
+            plt.rcParams['savefig.pad_inches'])
+        template['is_laid_out'] = True
+
+    report_pdf.savefig(template['fig'], bbox_inches=template['bbox'])
+
+
+def plot_ref_point_pressure_results(ref_point, report_pdf, nr_of_buckets=2000):
 
     # main figure
     fig = plt.figure()
@@ -275,9 +508,11 @@ def plot_ref_point_pressure_results(ref_point, report_pdf):
     # subplot 1
     ax1 = fig.add_subplot(gs[0, 0])
 
-    # main plot
-    ax1.plot(ref_point['series']['time'],
-             ref_point['series']['pressure'])
+    # main plot, decimated keeping the peaks
+    decimation_idx = get_min_max_decimation_idx(
+        ref_point['series']['pressure'], nr_of_buckets)
+    ax1.plot(ref_point['series']['time'][decimation_idx],
+             ref_point['series']['pressure'][decimation_idx])
 
     # mean
     ax1.axhline(ref_point['statistics']['pressure']['general']['mean'],
@@ -634,3 +869,105 @@ def plot_pressure_taps_extreme_values(pressure_taps, calculate_mode, report_pdf)
     # plot window needs to be closed to avoid error and memory problem
     # due to too many opened
     plt.close()
+
+
+def plot_benchmark_scaling_curves(scaling_curves, report_pdf, previous_scaling_curves=None):
+    '''
+    Times of the stages against the series length and the number of taps,
+    on log-log axes, from get_scaling_curves.
+    The ones of previous_scaling_curves dashed for comparison, if given.
+    '''
+
+    fig = plt.figure()
+    title = 'Benchmark "' + scaling_curves['label'] + '" of the stages'
+    if previous_scaling_curves is not None:
+        title += ', dashed: "' + previous_scaling_curves['label'] + '"'
+    fig.suptitle(title)
+    gs = gridspec.GridSpec(1, 2)
+
+    for gs_idx, (curves_name, xlabel, title) in enumerate([('samples', 'Number of samples [-]',
+                                                             'For ' + str(scaling_curves['max_nr_of_taps']) + ' taps'),
+                                                            ('taps', 'Number of taps [-]',
+                                                             'For ' + str(scaling_curves['max_nr_of_samples']) + ' samples')]):
+        ax = fig.add_subplot(gs[0, gs_idx])
+
+        for stage_idx, (stage, (sizes, times)) in enumerate(scaling_curves[curves_name].items()):
+            color = 'C' + str(stage_idx)
+            ax.loglog(sizes, times, marker='o', color=color,
+                      label=stage.replace('_', ' '))
+            if previous_scaling_curves is not None and stage in previous_scaling_curves[curves_name]:
+                previous_sizes, previous_times = previous_scaling_curves[curves_name][stage]
+                ax.loglog(previous_sizes, previous_times,
+                          linestyle='--', color=color)
+
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.grid(True)
+
+    fig.axes[0].set_ylabel('Time [s]')
+    fig.axes[1].legend(fontsize='small')
+
+    # resizing the internal rectangle so that the sup title is not overlayed
+    gs.tight_layout(fig, rect=cust_rect)
+
+    report_pdf.savefig()
+
+    # plot window needs to be closed to avoid error and memory problem
+    # due to too many opened
+    plt.close()
+
+
+def plot_pressure_taps_comparison(aligned_variants, quantities, report_pdf, reference_name=None):
+    '''
+    The statistics of the taps of several variants (result cases and cp modes)
+    as overlaid bars, one bar per variant side by side for each tap,
+    three quantities per page as for the general statistics
+    '''
+
+    variant_names = list(aligned_variants.keys())
+    custom_tick_labels = aligned_variants[variant_names[0]]['label']
+    nr_of_bars = len(custom_tick_labels)
+    barwidth = 0.8 / len(variant_names)
+
+    nr_of_pages = int(np.ceil(len(quantities) / 3))
+
+    for page_idx in range(nr_of_pages):
+        page_quantities = quantities[3 * page_idx:3 * (page_idx + 1)]
+
+        # main figure
+        fig = plt.figure()
+        fig.suptitle('Comparison of the statistics - part ' + str(page_idx + 1))
+        gs = gridspec.GridSpec(3, 1)
+
+        for gs_idx, quantity in enumerate(page_quantities):
+            ax = fig.add_subplot(gs[gs_idx, 0])
+
+            for variant_idx, variant_name in enumerate(variant_names):
+                label = variant_name.replace('_', ' ')
+                if variant_name == reference_name:
+                    label += ' (reference)'
+                ax.bar(np.arange(nr_of_bars) + (variant_idx - (len(variant_names) - 1) / 2) * barwidth,
+                       aligned_variants[variant_name][quantity], barwidth,
+                       color='C' + str(variant_idx % 10), label=label)
+
+            # e.g. cev_design -> Classical extrema - design
+            title = quantity.replace('cev_', 'classical extrema - ').replace('aev_', 'alternative extrema - ')
+            ax.set_title(title.replace('_', ' ').capitalize())
+            ax.set_ylabel(r'$C_{p}$  [-]' if quantity.split('_')[-1] not in ['kurtosis', 'skewness', 'shape']
+                          else '[-]')
+            ax.set_xticks(np.arange(nr_of_bars))
+            ax.set_xticklabels(custom_tick_labels)
+            ax.grid(True)
+
+        ax.set_xlabel('Tap label')
+        fig.axes[0].legend(fontsize='small', ncol=min(len(variant_names), 4))
+
+        # resizing the internal rectangle so that the sup title is not overlayed
+        # workaround for overlapping elements
+        gs.tight_layout(fig, rect=cust_rect)
+
+        report_pdf.savefig()
+
+        # plot window needs to be closed to avoid error and memory problem
+        # due to too many opened
+        plt.close()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the profiling of the evaluation: the wall time, CPU time,
+bytes read and peak memory of each stage, per result case and tap,
+written to a JSON/CSV report and summarized as a table on the console
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import csv
+import functools
+import glob
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from os import path as os_path
+
+try:
+    # not available on Windows, the peak memory is then not recorded
+    import resource
+except ImportError:
+    resource = None
+
+
+# NOTE: the state of the process, each worker process writes its own
+# records file, these are merged by write_profile_report
+profile_state = {'folder': None,
+                 'labels': {},
+                 'stack': []}
+
+profile_columns = ['stage', 'case', 'tap', 'calls',
+                   'wall_time', 'cpu_time', 'bytes_read', 'peak_rss']
+
+
+def enable_profiling(folder):
+    # the records of this process are appended to a file in folder
+    profile_state['folder'] = folder
+
+
+def is_profiling():
+    return profile_state['folder'] is not None
+
+
+def get_records_file(folder, pid):
+    return os_path.join(folder, 'ProfileRecords_' + str(pid) + '.jsonl')
+
+
+def clear_profile_records(folder):
+    # records of earlier runs, e.g. interrupted ones
+    for records_file in glob.glob(get_records_file(folder, '*')):
+        os.remove(records_file)
+
+
+def get_bytes_read():
+    '''
+    Bytes read by the process so far, by read calls, including the ones
+    served from the page cache, memory mapped files are not counted.
+    Only available on Linux, 0 otherwise
+    '''
+
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def reset_peak_rss():
+    '''
+    Resets the peak resident memory of the process (VmHWM) to the current one,
+    so that the next get_peak_rss is the peak since then.
+    Only available on Linux, returns False otherwise
+    '''
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss():
+    '''
+    Peak resident memory in bytes since the last reset_peak_rss (VmHWM),
+    if not available the peak of the process so far, None on Windows
+    '''
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return 1024 * int(line.split()[1])
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: in kilobytes on Linux, in bytes on macOS
+    return peak_rss if sys.platform == 'darwin' else 1024 * peak_rss
+
+
+def get_max_peak_rss(peak_rss, other_peak_rss):
+    # the larger one, None if not available
+    if peak_rss is None or other_peak_rss is None:
+        return peak_rss if other_peak_rss is None else other_peak_rss
+    return max(peak_rss, other_peak_rss)
+
+
+@contextmanager
+def profile_labels(**labels):
+    # labels (case, tap) of the stages within, restored afterwards
+
+    previous_labels = profile_state['labels']
+    profile_state['labels'] = dict(previous_labels, **labels)
+    try:
+        yield
+    finally:
+        profile_state['labels'] = previous_labels
+
+
+def get_profile_labels():
+    # to be passed on to worker processes with profile_labels(**labels)
+    return dict(profile_state['labels'])
+
+
+@contextmanager
+def profile_stage(stage):
+    '''
+    Records the stage for the current labels if profiling is enabled.
+    Stages can be nested, each records its own time and bytes only,
+    without the ones of the nested stages, so that the stages add up.
+    The peak memory is the one during the stage including the nested ones,
+    where resetting it is not available the peak of the process so far.
+    '''
+
+    if not is_profiling():
+        yield
+        return
+
+    # NOTE: the peak of the enclosing stage so far is kept before the reset
+    if len(profile_state['stack']) > 0:
+        profile_state['stack'][-1]['peak_rss'] = get_max_peak_rss(
+            profile_state['stack'][-1]['peak_rss'], get_peak_rss())
+    reset_peak_rss()
+
+    frame = {'wall_time': -time.perf_counter(),
+             'cpu_time': -time.process_time(),
+             'bytes_read': -get_bytes_read(),
+             'peak_rss': None,
+             'nested': {'wall_time': 0.0, 'cpu_time': 0.0, 'bytes_read': 0}}
+    profile_state['stack'].append(frame)
+
+    try:
+        yield
+    finally:
+        profile_state['stack'].pop()
+        frame['wall_time'] += time.perf_counter()
+        frame['cpu_time'] += time.process_time()
+        frame['bytes_read'] += get_bytes_read()
+
+        record = {'stage': stage,
+                  'case': profile_state['labels'].get('case', ''),
+                  'tap': profile_state['labels'].get('tap', ''),
+                  'pid': os.getpid(),
+                  'peak_rss': get_max_peak_rss(frame['peak_rss'], get_peak_rss())}
+        for key in ['wall_time', 'cpu_time', 'bytes_read']:
+            record[key] = frame[key] - frame['nested'][key]
+            if len(profile_state['stack']) > 0:
+                profile_state['stack'][-1]['nested'][key] += frame[key]
+        if len(profile_state['stack']) > 0:
+            profile_state['stack'][-1]['peak_rss'] = get_max_peak_rss(
+                profile_state['stack'][-1]['peak_rss'], record['peak_rss'])
+
+        with open(get_records_file(profile_state['folder'], os.getpid()), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def profiled(stage):
+    # decorator recording each call of the function as stage
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not is_profiling():
+                return function(*args, **kwargs)
+            with profile_stage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def get_profile_summary(records, keys=['stage']):
+    '''
+    Records with the same values of keys combined: number of calls,
+    sums of the times and bytes, maximum of the peak memory.
+    Sorted by the wall time, the largest first
+    '''
+
+    summary = {}
+    for record in records:
+        summary_record = summary.setdefault(tuple(record[key] for key in keys),
+                                            dict({key: record[key] for key in keys},
+                                                 calls=0, wall_time=0.0, cpu_time=0.0,
+                                                 bytes_read=0, peak_rss=None))
+        summary_record['calls'] += record.get('calls', 1)
+        for key in ['wall_time', 'cpu_time', 'bytes_read']:
+            summary_record[key] += record[key]
+        if record['peak_rss'] is not None:
+            summary_record['peak_rss'] = max(summary_record['peak_rss'] or 0,
+                                             record['peak_rss'])
+
+    return sorted(summary.values(), key=lambda summary_record: -summary_record['wall_time'])
+
+
+def get_profile_table(summary):
+    # console table of the summary, the times summed over all processes
+
+    total_wall_time = sum(stage_summary['wall_time']
+                          for stage_summary in summary)
+
+    lines = ['%-20s %8s %12s %12s %8s %12s %14s' % ('stage', 'calls', 'wall [s]', 'cpu [s]', 'wall [%]',
+                                                    'read [MB]', 'peak RSS [MB]')]
+    for stage_summary in summary:
+        lines.append('%-20s %8d %12.3f %12.3f %8.1f %12.1f %14s' % (
+            stage_summary['stage'],
+            stage_summary['calls'],
+            stage_summary['wall_time'],
+            stage_summary['cpu_time'],
+            100 * stage_summary['wall_time'] / max(total_wall_time, 1e-12),
+            stage_summary['bytes_read'] / 1e6,
+            '-' if stage_summary['peak_rss'] is None else '%.1f' % (stage_summary['peak_rss'] / 1e6)))
+    lines.append('%-20s %8s %12.3f' % ('total', '', total_wall_time))
+
+    return '\n'.join(lines)
+
+
+def write_profile_report(folder, report_file_base):
+    '''
+    Merges the records of all processes into report_file_base + '.json'
+    (summary per stage and per stage, case and tap) and '.csv'
+    (one row per stage, case and tap) and prints the summary table
+    '''
+
+    records = []
+    for records_file in sorted(glob.glob(get_records_file(folder, '*'))):
+        with open(records_file) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+        os.remove(records_file)
+
+    summary = get_profile_summary(records)
+    records = get_profile_summary(records, ['stage', 'case', 'tap'])
+
+    with open(report_file_base + '.json', 'w') as f:
+        json.dump({'stages': summary, 'records': records}, f, indent=2)
+
+    with open(report_file_base + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=profile_columns)
+        writer.writeheader()
+        writer.writerows(records)
+
+    print('## Profile of the evaluation written to ' + report_file_base + '.json and .csv\n' +
+          get_profile_table(summary))
@@ -8,11 +8,18 @@ Created on 08.07.2018
 """
 
 
+from functools import lru_cache
+from math import factorial
+
 import matplotlib.mlab as mlab
 import numpy as np
+from scipy.fft import next_fast_len
+from scipy.special import gamma as gamma_function
 from scipy.stats import gaussian_kde, tmean, tstd, skew, kurtosis  # , mode
 # from scipy.stats.mstats import mode
 
+from utilities.profile_utilities import profiled
+
 
 def get_pdf_kde(data_series):
     '''
@@ -23,8 +30,9 @@ def get_pdf_kde(data_series):
     '''
     results = {}
 
-    data_series_max = np.max(data_series)
-    data_series_min = np.min(data_series)
+    # NOTE: the grid in float64, also for float32 series
+    data_series_max = np.float64(np.max(data_series))
+    data_series_min = np.float64(np.min(data_series))
 
     if len(data_series) > 1:
         kde = gaussian_kde(data_series)
@@ -76,20 +84,143 @@ def get_pdf_normal(data_series):
     return results
 
 
+def get_linear_binning_counts(data_matrix, data_min, grid_step, nr_of_points=1000):
+    '''
+    Linear binning of the samples (rows) to the grid of nr_of_points starting
+    at data_min: each sample distributes its weight to the two neighbouring
+    grid points. The counts of several chunks of the same series can be summed.
+    All rows are binned with one np.bincount.
+    '''
+
+    data_matrix = np.atleast_2d(data_matrix)
+    nr_of_series = data_matrix.shape[0]
+
+    position = (data_matrix - data_min[:, np.newaxis]) / \
+        grid_step[:, np.newaxis]
+    lower_idx = np.clip(np.floor(position).astype(int), 0, nr_of_points - 2)
+    upper_weight = position - lower_idx
+    lower_idx += nr_of_points * np.arange(nr_of_series)[:, np.newaxis]
+
+    counts = np.bincount(lower_idx.ravel(), weights=(1.0 - upper_weight).ravel(),
+                         minlength=nr_of_series * nr_of_points)
+    counts += np.bincount(lower_idx.ravel() + 1, weights=upper_weight.ravel(),
+                          minlength=nr_of_series * nr_of_points)
+
+    return counts.reshape(nr_of_series, nr_of_points)
+
+
+def get_pdf_kde_from_counts(counts, grid_step, bandwidth, nr_of_samples):
+    # convolution of the binned counts (rows) with the sampled Gaussian kernel by one batched FFT
+
+    nr_of_points = counts.shape[-1]
+
+    # Gaussian kernel sampled at all grid offsets -(G-1)...(G-1)
+    offsets = np.arange(-(nr_of_points - 1), nr_of_points)
+    kernel = np.exp(-0.5 * (offsets * (grid_step / bandwidth)[:, np.newaxis])**2) / \
+        (np.sqrt(2.0 * np.pi) * bandwidth[:, np.newaxis])
+
+    nfft = next_fast_len(3 * nr_of_points - 2, real=True)
+    density = np.fft.irfft(np.fft.rfft(counts, n=nfft, axis=-1) * np.fft.rfft(kernel, n=nfft, axis=-1),
+                           n=nfft, axis=-1)[:, nr_of_points - 1:2 * nr_of_points - 1] / nr_of_samples
+
+    return np.maximum(density, 0.0)
+
+
+def get_pdf_kde_binned_batch(data_matrix, nr_of_points=1000):
+    '''
+    Evaluates the KDE pdf of several samples (rows) on the same grid as get_pdf_kde
+    (nr_of_points between min and max) with the same Gaussian kernel and
+    Scott bandwidth, but with linear binning of the samples to the grid and
+    a convolution with the sampled kernel by FFT, O(N + G log G) instead of O(N G).
+    All rows are binned with one np.bincount and convolved with one batched FFT.
+    '''
+
+    # NOTE: float32 series are not copied, the grid, the bandwidth and
+    # the binning are evaluated in float64 nevertheless
+    data_matrix = np.atleast_2d(np.asarray(data_matrix))
+    if data_matrix.dtype != np.float32:
+        data_matrix = data_matrix.astype(np.float64, copy=False)
+    nr_of_series, nr_of_samples = data_matrix.shape
+
+    if nr_of_samples < 2:
+        return [get_pdf_kde(data_series) for data_series in data_matrix]
+
+    data_min = np.min(data_matrix, axis=-1).astype(np.float64)
+    data_max = np.max(data_matrix, axis=-1).astype(np.float64)
+    grid_step = (data_max - data_min) / (nr_of_points - 1)
+    # Scott's rule as in gaussian_kde: n**(-1/5) times the standard deviation
+    bandwidth = np.std(data_matrix, axis=-1, ddof=1, dtype=np.float64) * \
+        nr_of_samples**(-1. / 5.)
+
+    is_degenerate = (grid_step <= 0.0) | (bandwidth <= 0.0)
+    grid_step[is_degenerate] = 1.0
+    bandwidth[is_degenerate] = 1.0
+
+    density = get_pdf_kde_from_counts(get_linear_binning_counts(data_matrix, data_min, grid_step, nr_of_points),
+                                      grid_step, bandwidth, nr_of_samples)
+
+    results = []
+    for idx in range(nr_of_series):
+        if is_degenerate[idx]:
+            # falling back to the exact evaluation (and its error handling)
+            results.append(get_pdf_kde(data_matrix[idx]))
+        else:
+            results.append({'x': np.linspace(data_min[idx], data_max[idx], nr_of_points),
+                            'y': density[idx]})
+
+    return results
+
+
+def get_pdf_kde_binned(data_series, nr_of_points=1000):
+    return get_pdf_kde_binned_batch(data_series, nr_of_points)[0]
+
+
+def check_pdf_kde_binned_accuracy(data_series, nr_of_points=1000):
+    '''
+    Compares the binned FFT KDE with the exact KDE, returns the
+    maximum absolute deviation relative to the maximum of the exact pdf
+    '''
+
+    exact_pdf = get_pdf_kde(data_series)
+    binned_pdf = get_pdf_kde_binned(data_series, nr_of_points)
+
+    relative_error = np.max(
+        np.abs(binned_pdf['y'] - exact_pdf['y'])) / np.max(exact_pdf['y'])
+    print('## Binned FFT KDE vs. exact KDE, max. relative deviation: %.2e' % relative_error)
+
+    return relative_error
+
+
+@profiled('kde')
 def get_pdf(data_series, case='KDE'):
 
     if case == 'KDE':
         return get_pdf_kde(data_series)
 
+    elif case == 'KDE_FFT':
+        return get_pdf_kde_binned(data_series)
+
     elif case == 'Normal':
         return get_pdf_normal(data_series)
 
     else:
         raise Exception(
-            "PDF type not implemented, choose either KDE or Normal")
+            "PDF type not implemented, choose either KDE, KDE_FFT or Normal")
+
 
+@profiled('kde')
+def get_pdf_batch(data_matrix, case='KDE'):
+    # pdf for each row, the binned FFT KDE is evaluated for all rows at once
 
-def get_general_statistics(data_series, calculate_mode):
+    if case == 'KDE_FFT':
+        return get_pdf_kde_binned_batch(data_matrix)
+
+    else:
+        return [get_pdf(data_series, case) for data_series in data_matrix]
+
+
+@profiled('general_statistics')
+def get_general_statistics(data_series, calculate_mode, pdf_case='KDE'):
 
     results = {}
 
@@ -106,10 +237,11 @@ def get_general_statistics(data_series, calculate_mode):
     # one can choose between Fisher's and Pearson's definition
     results['kurtosis'] = kurtosis(data_series, fisher=True)
     # new additions
-    results['min'] = min(data_series)
-    results['max'] = max(data_series)
+    # NOTE: np.min/np.max instead of the builtins which iterate in Python
+    results['min'] = np.min(data_series)
+    results['max'] = np.max(data_series)
 
-    results['pdf'] = get_pdf(data_series)
+    results['pdf'] = get_pdf(data_series, pdf_case)
 
     # NOTE: mode is time-consuming
     if calculate_mode:
@@ -143,154 +275,1275 @@ def get_general_statistics(data_series, calculate_mode):
     return results
 
 
-def get_extreme_values_statistics(data_series, ramp_up_idx, block_size, calculate_mode, case='BM'):
+@profiled('general_statistics')
+def get_general_statistics_batch(data_matrix, calculate_mode, axis=-1, max_chunk_size=2**24, pdf_case='KDE'):
+    '''
+    Vectorized counterpart of get_general_statistics for several series
+    at once, e.g. a (taps x time) matrix with axis=-1. Mean, std, skewness,
+    kurtosis, min and max are computed by a few reductions along axis,
+    the results are arrays with one entry per series.
+    The centered moments are evaluated in chunks of rows so that the temporary
+    arrays are bounded by max_chunk_size entries.
+    The reductions are accumulated in float64, also for float32 series.
+    '''
+
+    data_matrix = np.moveaxis(np.asarray(data_matrix), axis, -1)
+    batch_shape = data_matrix.shape[:-1]
+    data_matrix = data_matrix.reshape(-1, data_matrix.shape[-1])
+    nr_of_series, nr_of_samples = data_matrix.shape
+
+    results = {}
+    results['mean'] = np.mean(data_matrix, axis=-1, dtype=np.float64)
+    results['min'] = np.min(data_matrix, axis=-1).astype(np.float64)
+    results['max'] = np.max(data_matrix, axis=-1).astype(np.float64)
+
+    m2 = np.empty(nr_of_series)
+    m3 = np.empty(nr_of_series)
+    m4 = np.empty(nr_of_series)
+
+    chunk_size = max(1, max_chunk_size // max(nr_of_samples, 1))
+    for start in range(0, nr_of_series, chunk_size):
+        end = min(start + chunk_size, nr_of_series)
+        deviation = data_matrix[start:end] - \
+            results['mean'][start:end, np.newaxis]
+        deviation_sq = deviation * deviation
+        m2[start:end] = np.mean(deviation_sq, axis=-1)
+        m3[start:end] = np.mean(deviation_sq * deviation, axis=-1)
+        m4[start:end] = np.mean(deviation_sq * deviation_sq, axis=-1)
+
+    # same definitions as tstd (ddof=1), skew and kurtosis (biased, Fisher)
+    if nr_of_samples > 1:
+        results['std'] = np.sqrt(m2 * nr_of_samples / (nr_of_samples - 1))
+    else:
+        print("Probably not enough data in data series to calculate std, length of array: ", str(
+            nr_of_samples))
+        print("Fallback solution: returning std = 0.")
+        results['std'] = np.zeros(nr_of_series)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['skewness'] = np.where(m2 > 0.0, m3 / m2**1.5, np.nan)
+        results['kurtosis'] = np.where(m2 > 0.0, m4 / m2**2 - 3.0, np.nan)
+
+    for key in ['mean', 'std', 'skewness', 'kurtosis', 'min', 'max']:
+        results[key] = results[key].reshape(batch_shape)
+
+    results['pdf'] = get_pdf_batch(data_matrix, pdf_case)
+
+    # NOTE: mode is time-consuming, taken from the PDF as in get_general_statistics
+    if calculate_mode:
+        results['mode'] = np.zeros(nr_of_series)
+        for idx, pdf in enumerate(results['pdf']):
+            if (len(pdf['y']) > 1):
+                results['mode'][idx] = pdf['x'][np.argmax(pdf['y'])]
+            else:
+                print("y component of pdf has no values")
+                print("Fallback solution taking mode = 0.")
+        results['mode'] = results['mode'].reshape(batch_shape)
+
+    return results
+
+
+def get_general_statistics_from_batch(batch_results, idx):
+    # the dictionary of a single series as returned by get_general_statistics
+
+    results = {}
+    for key in ['mean', 'std', 'skewness', 'kurtosis', 'min', 'max', 'mode']:
+        if key in batch_results:
+            results[key] = batch_results[key].reshape(-1)[idx]
+    results['pdf'] = batch_results['pdf'][idx]
+
+    return results
+
+
+def initialize_streaming_moments():
+    # accumulator of a series without samples so far
+
+    accumulator = {}
+    accumulator['n'] = 0
+    accumulator['mean'] = 0.0
+    # sums of the centered powers 2, 3 and 4
+    accumulator['m2'] = 0.0
+    accumulator['m3'] = 0.0
+    accumulator['m4'] = 0.0
+    accumulator['min'] = np.inf
+    accumulator['max'] = -np.inf
+
+    return accumulator
+
+
+@profiled('general_statistics')
+def update_streaming_moments(accumulator, data_chunk):
+    '''
+    Updates the accumulator with a chunk of samples: the centered moments
+    of the chunk are computed by numpy and merged with the ones so far by the
+    pairwise update formulas (Chan et al. for the mean and variance, Pebay, 2008
+    for the higher moments), the chunked generalization of Welford's algorithm,
+    numerically stable also for long series with a large mean.
+    '''
+
+    data_chunk = np.asarray(data_chunk)
+    n_b = len(data_chunk)
+    if n_b == 0:
+        return accumulator
+
+    mean_b = np.mean(data_chunk)
+    deviation = data_chunk - mean_b
+    deviation_sq = deviation * deviation
+    m2_b = np.sum(deviation_sq)
+    m3_b = np.sum(deviation_sq * deviation)
+    m4_b = np.sum(deviation_sq * deviation_sq)
+
+    n_a = accumulator['n']
+    m2_a = accumulator['m2']
+    m3_a = accumulator['m3']
+    n = n_a + n_b
+    delta = mean_b - accumulator['mean']
+
+    accumulator['mean'] += delta * n_b / n
+    accumulator['m4'] += m4_b + delta**4 * n_a * n_b * (n_a**2 - n_a * n_b + n_b**2) / n**3 + \
+        6.0 * delta**2 * (n_a**2 * m2_b + n_b**2 * m2_a) / n**2 + \
+        4.0 * delta * (n_a * m3_b - n_b * m3_a) / n
+    accumulator['m3'] += m3_b + delta**3 * n_a * n_b * (n_a - n_b) / n**2 + \
+        3.0 * delta * (n_a * m2_b - n_b * m2_a) / n
+    accumulator['m2'] += m2_b + delta**2 * n_a * n_b / n
+    accumulator['n'] = n
+    accumulator['min'] = min(accumulator['min'], np.min(data_chunk))
+    accumulator['max'] = max(accumulator['max'], np.max(data_chunk))
+
+    return accumulator
+
+
+def get_streaming_pdf_settings(accumulator, nr_of_points=1000):
+    '''
+    Grid and bandwidth of the binned KDE from the accumulated moments
+    (Scott's rule as in get_pdf_kde_binned_batch), with the counts
+    initialized to zero, to be filled by update_streaming_pdf
+    '''
+
+    pdf_settings = {}
+    pdf_settings['min'] = np.asarray([accumulator['min']])
+    pdf_settings['max'] = np.asarray([accumulator['max']])
+    pdf_settings['grid_step'] = (
+        pdf_settings['max'] - pdf_settings['min']) / (nr_of_points - 1)
+    pdf_settings['bandwidth'] = np.asarray([np.sqrt(accumulator['m2'] / max(accumulator['n'] - 1, 1))]) * \
+        max(accumulator['n'], 1)**(-1. / 5.)
+    pdf_settings['is_degenerate'] = bool(pdf_settings['grid_step'][0] <= 0.0 or
+                                         pdf_settings['bandwidth'][0] <= 0.0)
+    pdf_settings['counts'] = np.zeros((1, nr_of_points))
+
+    return pdf_settings
+
+
+@profiled('kde')
+def update_streaming_pdf(pdf_settings, data_chunk):
+
+    if not pdf_settings['is_degenerate'] and len(data_chunk) > 0:
+        pdf_settings['counts'] += get_linear_binning_counts(np.asarray(data_chunk)[np.newaxis, :],
+                                                            pdf_settings['min'],
+                                                            pdf_settings['grid_step'],
+                                                            pdf_settings['counts'].shape[-1])
+
+    return pdf_settings
+
+
+@profiled('general_statistics')
+def get_streaming_general_statistics(accumulator, pdf_settings, calculate_mode):
+    '''
+    The dictionary of get_general_statistics from the accumulated moments
+    and the binned KDE counts, same definitions as get_general_statistics_batch.
+    Without pdf_settings there is no pdf and no mode.
+    '''
+
+    nr_of_samples = accumulator['n']
+    m2 = accumulator['m2'] / max(nr_of_samples, 1)
+    m3 = accumulator['m3'] / max(nr_of_samples, 1)
+    m4 = accumulator['m4'] / max(nr_of_samples, 1)
+
+    results = {}
+    results['mean'] = accumulator['mean']
+    if nr_of_samples > 1:
+        results['std'] = np.sqrt(m2 * nr_of_samples / (nr_of_samples - 1))
+    else:
+        print("Probably not enough data in data series to calculate std, length of array: ", str(
+            nr_of_samples))
+        print("Fallback solution: returning std = 0.")
+        results['std'] = 0.0
+    results['skewness'] = m3 / m2**1.5 if m2 > 0.0 else np.nan
+    results['kurtosis'] = m4 / m2**2 - 3.0 if m2 > 0.0 else np.nan
+    results['min'] = accumulator['min']
+    results['max'] = accumulator['max']
+
+    if pdf_settings is None:
+        return results
+
+    if pdf_settings['is_degenerate']:
+        print("## Degenerate series, no pdf evaluated")
+        results['pdf'] = {'x': np.asarray([accumulator['min']]),
+                          'y': np.asarray([0.0])}
+    else:
+        results['pdf'] = {'x': np.linspace(accumulator['min'], accumulator['max'], pdf_settings['counts'].shape[-1]),
+                          'y': get_pdf_kde_from_counts(pdf_settings['counts'],
+                                                       pdf_settings['grid_step'],
+                                                       pdf_settings['bandwidth'],
+                                                       nr_of_samples)[0]}
+
+    # NOTE: mode taken from the PDF as in get_general_statistics
+    if calculate_mode:
+        if (len(results['pdf']['y']) > 1):
+            results['mode'] = results['pdf']['x'][np.argmax(
+                results['pdf']['y'])]
+        else:
+            print("y component of pdf has no values")
+            print("Fallback solution taking mode = 0.")
+            results['mode'] = 0.
+
+    return results
+
+
+def get_streaming_moments_transformed(accumulator, offset, scale):
+    # accumulator of (x - offset) * scale from the one of x, scale > 0
+
+    transformed = dict(accumulator)
+    transformed['mean'] = (accumulator['mean'] - offset) * scale
+    transformed['m2'] = accumulator['m2'] * scale**2
+    transformed['m3'] = accumulator['m3'] * scale**3
+    transformed['m4'] = accumulator['m4'] * scale**4
+    transformed['min'] = (accumulator['min'] - offset) * scale
+    transformed['max'] = (accumulator['max'] - offset) * scale
+
+    return transformed
+
+
+def initialize_streaming_block_maxima(nr_of_samples, nr_of_blocks):
+    # per block: sum, max and min (value and index), the blocks as in get_block_maxima_batch
+
+    accumulator = {}
+    accumulator['section_sizes'] = get_block_sizes(
+        nr_of_samples, nr_of_blocks)
+    accumulator['section_end_idx'] = np.cumsum(accumulator['section_sizes'])
+    nr_of_sections = len(accumulator['section_sizes'])
+    accumulator['n'] = 0
+    accumulator['sum'] = np.zeros(nr_of_sections)
+    accumulator['max_val'] = np.full(nr_of_sections, -np.inf)
+    accumulator['max_idx'] = np.zeros(nr_of_sections, dtype=int)
+    accumulator['min_val'] = np.full(nr_of_sections, np.inf)
+    accumulator['min_idx'] = np.zeros(nr_of_sections, dtype=int)
+
+    return accumulator
+
+
+@profiled('block_maxima')
+def update_streaming_block_maxima(accumulator, data_chunk):
+    '''
+    Updates the block sums and extremes with the next chunk of samples,
+    a chunk can span several blocks. Only a strictly larger (smaller) value
+    replaces the max (min) so that the first occurrence is kept as by argmax.
+    '''
+
+    data_chunk = np.asarray(data_chunk)
+    chunk_start = accumulator['n']
+    chunk_end = chunk_start + len(data_chunk)
+
+    first_section = np.searchsorted(
+        accumulator['section_end_idx'], chunk_start, side='right')
+    last_section = np.searchsorted(
+        accumulator['section_end_idx'], chunk_end - 1, side='right')
+
+    for section in range(first_section, min(last_section + 1, len(accumulator['section_sizes']))):
+        section_start = accumulator['section_end_idx'][section] - \
+            accumulator['section_sizes'][section]
+        start = max(section_start, chunk_start) - chunk_start
+        end = min(accumulator['section_end_idx'][section], chunk_end) - chunk_start
+        part = data_chunk[start:end]
+        if len(part) == 0:
+            continue
+
+        accumulator['sum'][section] += np.sum(part)
+        max_idx = np.argmax(part)
+        if part[max_idx] > accumulator['max_val'][section]:
+            accumulator['max_val'][section] = part[max_idx]
+            accumulator['max_idx'][section] = chunk_start + start + max_idx
+        min_idx = np.argmin(part)
+        if part[min_idx] < accumulator['min_val'][section]:
+            accumulator['min_val'][section] = part[min_idx]
+            accumulator['min_idx'][section] = chunk_start + start + min_idx
+
+    accumulator['n'] = chunk_end
+
+    return accumulator
+
+
+@profiled('block_maxima')
+def get_streaming_block_maxima(accumulator, ramp_up_idx, calculate_mode, pdf_case='KDE', fit_settings=None):
+    # the dictionary of get_block_maxima from the accumulated blocks
+
+    return get_block_maxima_from_sections((accumulator['sum'] / accumulator['section_sizes'])[np.newaxis, :],
+                                          accumulator['max_idx'][np.newaxis, :],
+                                          accumulator['max_val'][np.newaxis, :],
+                                          accumulator['min_idx'][np.newaxis, :],
+                                          accumulator['min_val'][np.newaxis, :],
+                                          accumulator['section_sizes'], ramp_up_idx,
+                                          calculate_mode, pdf_case, fit_settings)[0]
+
+
+# the values accumulated per sub-block
+sub_block_keys = ['sum', 'max_val', 'max_idx', 'min_val', 'min_idx']
+
+
+def initialize_streaming_sub_blocks(resolution=100, capacity=1024):
+    '''
+    Accumulator of the sum, max and min (value and index) of consecutive
+    sub-blocks of resolution samples, for a series of unknown final length.
+    The values are kept in buffers of capacity sub-blocks, doubled when full,
+    only the first nr_of_sub_blocks are valid.
+    The samples of the last, incomplete sub-block are kept as they are.
+    '''
+
+    accumulator = {}
+    accumulator['resolution'] = resolution
+    accumulator['nr_of_sub_blocks'] = 0
+    accumulator['sum'] = np.zeros(capacity)
+    accumulator['max_val'] = np.zeros(capacity)
+    accumulator['max_idx'] = np.zeros(capacity, dtype=int)
+    accumulator['min_val'] = np.zeros(capacity)
+    accumulator['min_idx'] = np.zeros(capacity, dtype=int)
+    accumulator['remainder'] = np.zeros(0)
+
+    return accumulator
+
+
+def get_sub_block_values(sub_blocks, start_idx):
+    # sum, max and min of the rows of a (sub-blocks x resolution) matrix
+
+    max_idx = np.argmax(sub_blocks, axis=-1)
+    min_idx = np.argmin(sub_blocks, axis=-1)
+    row_idx = np.arange(sub_blocks.shape[0])
+    start_idx = start_idx + row_idx * sub_blocks.shape[1]
+
+    return (np.sum(sub_blocks, axis=-1),
+            sub_blocks[row_idx, max_idx], start_idx + max_idx,
+            sub_blocks[row_idx, min_idx], start_idx + min_idx)
+
+
+def update_streaming_sub_blocks(accumulator, data_chunk):
+    # appends the completed sub-blocks, the amortized cost is proportional to the chunk length
+
+    resolution = accumulator['resolution']
+    # NOTE: the remainder is shorter than one sub-block
+    data = np.concatenate([accumulator['remainder'], np.asarray(data_chunk)])
+    nr_of_full = len(data) // resolution
+
+    if nr_of_full > 0:
+        nr_of_sub_blocks = accumulator['nr_of_sub_blocks']
+
+        if nr_of_sub_blocks + nr_of_full > len(accumulator['sum']):
+            capacity = max(2 * len(accumulator['sum']),
+                           nr_of_sub_blocks + nr_of_full)
+            for key in sub_block_keys:
+                buffer = np.zeros(capacity, dtype=accumulator[key].dtype)
+                buffer[:nr_of_sub_blocks] = accumulator[key][:nr_of_sub_blocks]
+                accumulator[key] = buffer
+
+        values = get_sub_block_values(
+            data[:nr_of_full * resolution].reshape(nr_of_full, resolution), nr_of_sub_blocks * resolution)
+        for key, value in zip(sub_block_keys, values):
+            accumulator[key][nr_of_sub_blocks:nr_of_sub_blocks + nr_of_full] = value
+        accumulator['nr_of_sub_blocks'] = nr_of_sub_blocks + nr_of_full
+
+    accumulator['remainder'] = data[nr_of_full * resolution:]
+
+    return accumulator
+
+
+def get_sections_from_sub_blocks(accumulator, nr_of_blocks, offset=0.0, scale=1.0):
+    '''
+    Mean, max and min (value and index) of the blocks of get_block_maxima_batch
+    merged from the sub-blocks, for (x - offset) * scale with scale > 0.
+    A sub-block belongs to the block of its midpoint, so the block
+    boundaries are rounded to the resolution of the sub-blocks.
+    The cost depends on the number of sub-blocks only.
+    '''
+
+    nr_of_sub_blocks = accumulator['nr_of_sub_blocks']
+    values = [accumulator[key][:nr_of_sub_blocks] for key in sub_block_keys]
+    sub_block_sizes = np.full(nr_of_sub_blocks, accumulator['resolution'])
+
+    if len(accumulator['remainder']) > 0:
+        last_values = get_sub_block_values(accumulator['remainder'][np.newaxis, :],
+                                           nr_of_sub_blocks * accumulator['resolution'])
+        values = [np.concatenate([value, last_value])
+                  for value, last_value in zip(values, last_values)]
+        sub_block_sizes = np.append(
+            sub_block_sizes, len(accumulator['remainder']))
+
+    sub_block_sum, sub_block_max_val, sub_block_max_idx, sub_block_min_val, sub_block_min_idx = values
+    sub_block_start_idx = np.cumsum(sub_block_sizes) - sub_block_sizes
+
+    nr_of_samples = np.sum(sub_block_sizes)
+    section_end_idx = np.cumsum(get_block_sizes(nr_of_samples, nr_of_blocks))
+    section_of_sub_block = np.searchsorted(
+        section_end_idx, sub_block_start_idx + (sub_block_sizes - 1) // 2, side='right')
+    # blocks without a sub-block (for a coarse resolution) are dropped
+    section_ids = np.unique(section_of_sub_block)
+
+    section_sizes = np.zeros(len(section_ids), dtype=int)
+    section_mean = np.zeros(len(section_ids))
+    section_max_val = np.zeros(len(section_ids))
+    section_max_idx = np.zeros(len(section_ids), dtype=int)
+    section_min_val = np.zeros(len(section_ids))
+    section_min_idx = np.zeros(len(section_ids), dtype=int)
+
+    for counter, section in enumerate(section_ids):
+        is_in_section = section_of_sub_block == section
+        section_sizes[counter] = np.sum(sub_block_sizes[is_in_section])
+        section_mean[counter] = np.sum(
+            sub_block_sum[is_in_section]) / section_sizes[counter]
+        # the first occurrence as by argmax
+        max_idx = np.argmax(sub_block_max_val[is_in_section])
+        section_max_val[counter] = sub_block_max_val[is_in_section][max_idx]
+        section_max_idx[counter] = sub_block_max_idx[is_in_section][max_idx]
+        min_idx = np.argmin(sub_block_min_val[is_in_section])
+        section_min_val[counter] = sub_block_min_val[is_in_section][min_idx]
+        section_min_idx[counter] = sub_block_min_idx[is_in_section][min_idx]
+
+    sections = {}
+    sections['mean'] = (section_mean - offset) * scale
+    sections['max_val'] = (section_max_val - offset) * scale
+    sections['max_idx'] = section_max_idx
+    sections['min_val'] = (section_min_val - offset) * scale
+    sections['min_idx'] = section_min_idx
+    sections['sizes'] = section_sizes
+
+    return sections
+
+
+def get_extreme_values_statistics(data_series, ramp_up_idx, block_size, calculate_mode, case='BM', pdf_case='KDE',
+                                  threshold_quantile=0.95, min_separation=1, fit_settings=None):
+
+    return get_extreme_values_statistics_batch(np.asarray(data_series)[np.newaxis, :], ramp_up_idx, block_size,
+                                               calculate_mode, case, pdf_case,
+                                               threshold_quantile, min_separation, fit_settings)[0]
+
+
+def get_extreme_values_statistics_batch(data_matrix, ramp_up_idx, block_size, calculate_mode, case='BM', pdf_case='KDE',
+                                        threshold_quantile=0.95, min_separation=1, fit_settings=None, threshold_sweep=None):
+    # for several series of the same length as rows of data_matrix
+    # returns the list of result dictionaries
+    # threshold_quantile, min_separation (in samples) and threshold_sweep (quantiles) only used for POT
+    # fit_settings: distribution, method and non_exceedance of the design value
+    # e.g. {'distribution': 'gumbel', 'method': 'blue', 'non_exceedance': 0.78}, no fit if None
 
     if case == 'BM':
         print('## Evaluating BM - Block-Maxima')
-        return get_block_maxima(data_series, ramp_up_idx, block_size, calculate_mode)
+        return get_block_maxima_batch(data_matrix, ramp_up_idx, block_size, calculate_mode, pdf_case, fit_settings)
 
     elif case == 'POT':
         print('## Evaluating POT - Peak-Over-Threshol')
-        raise Exception("POT not implemented, choose BM")
+        # NOTE: for POT the design value is always from the fitted GPD
+        return get_peaks_over_threshold_batch(data_matrix, ramp_up_idx, calculate_mode, pdf_case,
+                                              threshold_quantile, min_separation,
+                                              block_size, fit_settings['non_exceedance'] if fit_settings else None,
+                                              threshold_sweep)
 
     else:
         raise Exception(
             "Extreme value evaluation not implemented, choose either BM or POT")
 
 
-def get_block_maxima(data_series, ramp_up_idx,  nr_of_blocks, calculate_mode):
+def get_alternative_extremes_dummy_statistics(calculate_mode):
+
+    alternative_extremes_stat = {}
+    alternative_extremes_stat['mean'] = 0.0
+    alternative_extremes_stat['std'] = 0.0
+    alternative_extremes_stat['kurtosis'] = 0.0
+    alternative_extremes_stat['skewness'] = 0.0
+    alternative_extremes_stat['min'] = 0.0
+    alternative_extremes_stat['max'] = 0.0
+
+    if calculate_mode:
+        alternative_extremes_stat['mode'] = 0.0
+
+    alternative_extremes_stat['pdf'] = {}
+    alternative_extremes_stat['pdf']['x'] = np.asarray([])
+    alternative_extremes_stat['pdf']['y'] = np.asarray([])
 
-    block_size = np.round(len(data_series) / nr_of_blocks)
-    nr_of_sections = int(np.round(len(data_series) / block_size))
-    series_sections = np.array_split(data_series, nr_of_sections)
-    global_idx_adjustment = ramp_up_idx
+    return alternative_extremes_stat
 
-    classical_extremes_val = []
-    classical_extreme_idx = []
-    alternative_extremes_val = []
-    alternative_extremes_idx = []
-    block_start_idx = []
 
-    for section in series_sections:
-        block_start_idx.append(global_idx_adjustment)
+@lru_cache(maxsize=None)
+def get_gumbel_blue_weights(nr_of_samples, nr_of_points=1000):
+    '''
+    Weights of the best linear unbiased estimator (BLUE, Lieblein) of the
+    Gumbel (maxima) location and scale for nr_of_samples ordered samples.
+    The means and covariances of the reduced order statistics are integrated
+    numerically on a grid, the weights are computed once per sample size.
+    Returns a (2 x nr_of_samples) array: location and scale weights
+    for the samples sorted in ascending order
+    '''
+
+    n = nr_of_samples
+    x = np.linspace(-5.0, 25.0, nr_of_points)
+    dx = x[1] - x[0]
+    cdf = np.exp(-np.exp(-x))
+    pdf = np.exp(-x) * cdf
+
+    # trapezoidal weights
+    weights = np.full(nr_of_points, dx)
+    weights[[0, -1]] *= 0.5
+
+    mean = np.zeros(n)
+    second_moment = np.zeros((n, n))
+    for i in range(1, n + 1):
+        order_pdf = factorial(n) / (factorial(i - 1) * factorial(n - i)) * \
+            cdf**(i - 1) * (1.0 - cdf)**(n - i) * pdf
+        mean[i - 1] = np.sum(weights * x * order_pdf)
+        second_moment[i - 1, i - 1] = np.sum(weights * x**2 * order_pdf)
+
+    # joint density of the order statistics i < j on the triangle x < y
+    # with half weight on the diagonal
+    weights_2d = np.triu(np.outer(weights, weights), 1) + \
+        np.diag(0.5 * weights**2)
+    cdf_difference = np.clip(cdf[np.newaxis, :] - cdf[:, np.newaxis], 0.0, None)
+    for i in range(1, n + 1):
+        for j in range(i + 1, n + 1):
+            joint_pdf = factorial(n) / (factorial(i - 1) * factorial(j - i - 1) * factorial(n - j)) * \
+                (cdf**(i - 1) * pdf * x)[:, np.newaxis] * cdf_difference**(j - i - 1) * \
+                (pdf * (1.0 - cdf)**(n - j) * x)[np.newaxis, :]
+            second_moment[i - 1, j - 1] = np.sum(weights_2d * joint_pdf)
+            second_moment[j - 1, i - 1] = second_moment[i - 1, j - 1]
+
+    covariance = second_moment - np.outer(mean, mean)
+    design_matrix = np.column_stack((np.ones(n), mean))
+    inverse_covariance = np.linalg.inv(covariance)
+
+    return np.linalg.solve(design_matrix.T @ inverse_covariance @ design_matrix,
+                           design_matrix.T @ inverse_covariance)
+
+
+# fit methods of the extreme value distributions, the first one is the default
+extreme_value_fit_methods = {'gumbel': ['blue', 'moments', 'mle'],
+                             'gev': ['pwm', 'mle']}
+
+
+def get_gev_negative_log_likelihood(samples, location, scale, shape):
+    # per row, infinite outside of the support, shape as in scipy.stats.genextreme
+
+    is_gumbel = np.abs(shape) < 1e-6
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        z = (samples - location[:, np.newaxis]) / scale[:, np.newaxis]
+        y = 1.0 - shape[:, np.newaxis] * z
+        # log of y**(1/shape), -z in the Gumbel limit
+        t = np.where(is_gumbel[:, np.newaxis], -z,
+                     np.log(y) / shape[:, np.newaxis])
+        log_pdf = (1.0 - shape[:, np.newaxis]) * t - np.exp(t)
+        log_pdf = np.where((y > 0.0) | is_gumbel[:, np.newaxis], log_pdf, -np.inf)
+        negative_log_likelihood = samples.shape[-1] * \
+            np.log(scale) - np.sum(log_pdf, axis=-1)
+
+    # NOTE: the likelihood is unbounded for a shape of 1 and above
+    return np.where(np.isnan(negative_log_likelihood) | (shape >= 1.0), np.inf, negative_log_likelihood)
+
+
+def get_gev_mle_batch(sorted_extremes, location, scale, shape, max_iterations=50, step=1e-4):
+    '''
+    Maximum likelihood GEV parameters of all rows at once by damped Newton
+    iterations from the given (e.g. PWM) estimate. The samples are standardized,
+    the parameters are the location, the log of the scale and the shape,
+    the derivatives are central differences. Rows with less than 3 distinct
+    extremes have no maximum of the likelihood and get nan, for few extremes
+    the shape tends to the bound of 1.
+    '''
+
+    offset = np.mean(sorted_extremes, axis=-1)
+    unit = np.std(sorted_extremes, axis=-1, ddof=1)
+    is_degenerate = ~(unit > 0.0) | (sorted_extremes.shape[-1] < 3)
+    unit = np.where(is_degenerate, 1.0, unit)
+    samples = (sorted_extremes - offset[:, np.newaxis]) / unit[:, np.newaxis]
+
+    def get_values(parameters):
+        with np.errstate(over='ignore'):
+            return get_gev_negative_log_likelihood(samples, parameters[:, 0], np.exp(parameters[:, 1]),
+                                                   parameters[:, 2])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        parameters = np.column_stack(((location - offset) / unit,
+                                      np.log(scale / unit), shape))
+    # NOTE: rows where the start is not finite or outside of the support
+    # start from the Gumbel moments instead
+    values = get_values(parameters)
+    is_invalid = ~np.isfinite(values)
+    gumbel_scale = np.sqrt(6.0) / np.pi
+    parameters[is_invalid] = [-np.euler_gamma * gumbel_scale, np.log(gumbel_scale), 0.0]
+    values = get_values(parameters)
+    values[is_degenerate] = np.inf
+
+    nr_of_parameters = 3
+    shifts = step * np.eye(nr_of_parameters)
+    for iteration in range(max_iterations):
+        gradient = np.zeros_like(parameters)
+        hessian = np.zeros(parameters.shape + (nr_of_parameters,))
+        # NOTE: differences of infinite values at the boundary of the support are nan
+        with np.errstate(invalid='ignore'):
+            for i in range(nr_of_parameters):
+                values_plus = get_values(parameters + shifts[i])
+                values_minus = get_values(parameters - shifts[i])
+                gradient[:, i] = (values_plus - values_minus) / (2.0 * step)
+                hessian[:, i, i] = (values_plus - 2.0 * values + values_minus) / step**2
+                for j in range(i):
+                    hessian[:, i, j] = (get_values(parameters + shifts[i] + shifts[j]) -
+                                        get_values(parameters + shifts[i] - shifts[j]) -
+                                        get_values(parameters - shifts[i] + shifts[j]) +
+                                        get_values(parameters - shifts[i] - shifts[j])) / (4.0 * step**2)
+                    hessian[:, j, i] = hessian[:, i, j]
+
+        # rows at the boundary of the support keep their parameters
+        is_active = np.all(np.isfinite(gradient), axis=-1) & \
+            np.all(np.isfinite(hessian), axis=(-2, -1))
+        if not np.any(is_active):
+            break
+        gradient[~is_active] = 0.0
+        hessian[~is_active] = np.eye(nr_of_parameters)
+
+        # shifted to positive definite where needed (Levenberg)
+        eigenvalues = np.linalg.eigvalsh(hessian)
+        hessian += np.maximum(1e-2 * np.abs(eigenvalues[:, -1]) - eigenvalues[:, 0], 0.0)[:, np.newaxis, np.newaxis] * \
+            np.eye(nr_of_parameters)
+        newton_step = -np.linalg.solve(hessian, gradient[..., np.newaxis])[..., 0]
+
+        # step halving until the negative log-likelihood decreases
+        is_improved = np.zeros(parameters.shape[0], dtype=bool)
+        factor = 1.0
+        for halving in range(20):
+            trial_parameters = parameters + factor * newton_step
+            trial_values = get_values(trial_parameters)
+            is_accepted = is_active & ~is_improved & (trial_values < values)
+            parameters[is_accepted] = trial_parameters[is_accepted]
+            values[is_accepted] = trial_values[is_accepted]
+            is_improved |= is_accepted
+            if np.all(is_improved | ~is_active):
+                break
+            factor *= 0.5
+
+        if np.all(np.abs(newton_step[is_improved]) < 1e-8) or not np.any(is_improved):
+            break
+
+    parameters[is_degenerate] = np.nan
+    location = offset + unit * parameters[:, 0]
+    scale = unit * np.exp(parameters[:, 1])
+    shape = parameters[:, 2]
+
+    return location, scale, shape
+
+
+def get_extreme_value_fit_batch(extremes_matrix, distribution='gumbel', method='blue', non_exceedance=0.78,
+                                max_iterations=50):
+    '''
+    Fits the extreme value distribution to the extremes of several series
+    (rows of a taps x blocks matrix) at once and returns the design value
+    with the given probability of non-exceedance (e.g. 78%) for each row.
+    Extremes with a negative mean are treated as minima.
+    distribution 'gumbel': method 'moments', 'blue' (Lieblein) or 'mle' (Newton iterations)
+    distribution 'gev': method 'pwm' (Hosking et al., 1985) or 'mle' (Newton iterations from the pwm estimate),
+    shape as in scipy.stats.genextreme
+    '''
 
-        # sign of mean_val and max_val has to coincide by definition
-        mean_val = np.mean(section)
+    extremes_matrix = np.atleast_2d(np.asarray(extremes_matrix, dtype=np.float64))
+    nr_of_samples = extremes_matrix.shape[-1]
 
-        if mean_val >= 0.0:
-            min_val = np.min(section)
-            max_val = np.max(section)
+    # maxima: largest values, minima: smallest values
+    direction = np.where(np.mean(extremes_matrix, axis=-1) >= 0.0, 1.0, -1.0)
+    sorted_extremes = np.sort(
+        extremes_matrix * direction[:, np.newaxis], axis=-1)
 
+    results = {}
+    results['distribution'] = distribution
+    results['method'] = method
+
+    if nr_of_samples < 2:
+        print("## Not enough extremes for fitting, length of array: " + str(nr_of_samples))
+        nan_array = np.full(extremes_matrix.shape[0], np.nan)
+        results['location'] = nan_array
+        results['scale'] = nan_array
+        results['shape'] = nan_array
+        results['design_value'] = nan_array
+        return results
+
+    if distribution == 'gumbel':
+        # initial values and method of moments
+        scale = np.sqrt(6.0) * np.std(sorted_extremes,
+                                      axis=-1, ddof=1) / np.pi
+        location = np.mean(sorted_extremes, axis=-1) - np.euler_gamma * scale
+
+        if method == 'blue' and nr_of_samples > 16:
+            # as for the tabulated coefficients of Lieblein, the numerical
+            # integration of the covariances gets expensive for more samples
+            print("## BLUE only for up to 16 extremes, using MLE for " +
+                  str(nr_of_samples) + " extremes")
+            method = 'mle'
+
+        if method == 'blue':
+            location, scale = get_gumbel_blue_weights(
+                nr_of_samples) @ sorted_extremes.T
+
+        elif method == 'mle':
+            # Newton iterations for the scale of all rows at once
+            # root of g(scale) = scale - mean(x) + sum(x exp(-x/scale)) / sum(exp(-x/scale))
+            # the shift by the max avoids overflow
+            shifted = sorted_extremes - sorted_extremes[:, -1:]
+            for iteration in range(max_iterations):
+                exp_terms = np.exp(-shifted / scale[:, np.newaxis])
+                s0 = np.sum(exp_terms, axis=-1)
+                s1 = np.sum(shifted * exp_terms, axis=-1)
+                s2 = np.sum(shifted**2 * exp_terms, axis=-1)
+                g = scale - np.mean(shifted, axis=-1) + s1 / s0
+                dg = 1.0 + (s2 / s0 - (s1 / s0)**2) / scale**2
+                step = g / dg
+                scale = np.maximum(scale - step, 0.5 * scale)
+                if np.all(np.abs(step) < 1e-12 * scale):
+                    break
+            location = sorted_extremes[:, -1] - scale * \
+                np.log(np.mean(np.exp(-shifted / scale[:, np.newaxis]), axis=-1))
+
+        elif method != 'moments':
+            raise Exception(
+                "Fit method " + method + " not implemented for gumbel, choose either moments, blue or mle")
+
+        shape = np.zeros_like(scale)
+        design_value = location - scale * np.log(-np.log(non_exceedance))
+
+    elif distribution == 'gev':
+        if method not in extreme_value_fit_methods['gev']:
+            raise Exception(
+                "Fit method " + method + " not implemented for gev, choose either pwm or mle")
+
+        # probability weighted moments of the ascending samples
+        rank = np.arange(nr_of_samples)
+        b0 = np.mean(sorted_extremes, axis=-1)
+        b1 = np.mean(sorted_extremes * rank / (nr_of_samples - 1), axis=-1)
+        if nr_of_samples > 2:
+            b2 = np.mean(sorted_extremes * rank * (rank - 1) /
+                         ((nr_of_samples - 1) * (nr_of_samples - 2)), axis=-1)
         else:
-            max_val = np.min(section)
-            min_val = np.max(section)
+            b2 = np.full_like(b0, np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = (2.0 * b1 - b0) / (3.0 * b2 - b0) - np.log(2.0) / np.log(3.0)
+            shape = 7.8590 * c + 2.9554 * c**2
+            scale = (2.0 * b1 - b0) * shape / \
+                (gamma_function(1.0 + shape) * (1.0 - 2.0**(-shape)))
+            location = b0 + scale * (gamma_function(1.0 + shape) - 1.0) / shape
+
+        if method == 'mle':
+            location, scale, shape = get_gev_mle_batch(
+                sorted_extremes, location, scale, shape, max_iterations)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # NOTE: the Gumbel design value in the limit of a vanishing shape
+            design_value = np.where(np.abs(shape) < 1e-6,
+                                    location - scale *
+                                    np.log(-np.log(non_exceedance)),
+                                    location + scale / shape * (1.0 - (-np.log(non_exceedance))**shape))
+
+    else:
+        raise Exception(
+            "Extreme value distribution " + distribution + " not implemented, choose either gumbel or gev")
 
-        classical_extremes_val.append(max_val)
-        classical_extreme_idx.append(np.where(section == max_val)[
-                                     0][0] + global_idx_adjustment)
+    # back to the sign of the extremes
+    # NOTE: for minima the location and design value are negative, the scale positive
+    results['location'] = location * direction
+    results['scale'] = scale
+    results['shape'] = shape
+    results['design_value'] = design_value * direction
 
-        if np.sign(max_val) != np.sign(min_val):
-            alternative_extremes_val.append(min_val)
-            alternative_extremes_idx.append(np.where(section == min_val)[
-                                            0][0] + global_idx_adjustment)
+    return results
 
-        global_idx_adjustment += len(section)
 
-    block_start_idx.append(global_idx_adjustment - 1)
+def get_extreme_value_fit_from_batch(batch_results, idx):
+    # the dictionary of a single series
 
-    classical_extremes_stat = get_general_statistics(
-        classical_extremes_val, calculate_mode)
+    results = {}
+    for key in ['distribution', 'method']:
+        results[key] = batch_results[key]
+    for key in ['location', 'scale', 'shape', 'design_value']:
+        results[key] = batch_results[key][idx]
 
-    if alternative_extremes_val:
-        alternative_extremes_stat = get_general_statistics(
-            alternative_extremes_val, calculate_mode)
+    return results
 
-    else:
-        print("## No alternative extremes found, using 0.0 as dummy statistic values not to break plotting")
-        alternative_extremes_val.append(0.0)
-        alternative_extremes_idx.append(0)
 
-        alternative_extremes_stat = {}
-        alternative_extremes_stat['mean'] = 0.0
-        alternative_extremes_stat['std'] = 0.0
-        alternative_extremes_stat['kurtosis'] = 0.0
-        alternative_extremes_stat['skewness'] = 0.0
-        alternative_extremes_stat['min'] = 0.0
-        alternative_extremes_stat['max'] = 0.0
+def get_extreme_value_fit_dummy(fit_settings):
+
+    results = {}
+    results['distribution'] = fit_settings['distribution']
+    results['method'] = fit_settings['method']
+    for key in ['location', 'scale', 'shape', 'design_value']:
+        results[key] = 0.0
+
+    return results
+
+
+def get_block_maxima(data_series, ramp_up_idx,  nr_of_blocks, calculate_mode, pdf_case='KDE', fit_settings=None):
+
+    return get_block_maxima_batch(np.asarray(data_series)[np.newaxis, :], ramp_up_idx,
+                                  nr_of_blocks, calculate_mode, pdf_case, fit_settings)[0]
+
+
+def get_block_sizes(nr_of_samples, nr_of_blocks):
+    # same section sizes as np.array_split, the first ones can be one sample longer
+
+    block_size = np.round(nr_of_samples / nr_of_blocks)
+    nr_of_sections = int(np.round(nr_of_samples / block_size))
+    section_size, nr_of_longer_sections = divmod(nr_of_samples, nr_of_sections)
+
+    section_sizes = np.full(nr_of_sections, section_size)
+    section_sizes[:nr_of_longer_sections] += 1
+
+    return section_sizes
+
+
+@profiled('block_maxima')
+def get_block_maxima_batch(data_matrix, ramp_up_idx, nr_of_blocks, calculate_mode, pdf_case='KDE', fit_settings=None):
+    '''
+    Block maxima of several series (rows of a taps x time matrix) in one pass.
+    The blocks are the same as by np.array_split, the first blocks can be one
+    sample longer, so the matrix is reshaped in (at most) two parts
+    of equal block length and the extremes found by argmax/argmin.
+    '''
+
+    data_matrix = np.atleast_2d(data_matrix)
+    nr_of_series, nr_of_samples = data_matrix.shape
+
+    section_sizes = get_block_sizes(nr_of_samples, nr_of_blocks)
+    section_size = section_sizes[-1]
+    split_idx = np.sum(section_sizes[section_sizes > section_size])
+
+    section_mean = []
+    section_max_idx = []
+    section_min_idx = []
+    for sections, size in [(data_matrix[:, :split_idx], section_size + 1),
+                           (data_matrix[:, split_idx:], section_size)]:
+        if sections.shape[1] == 0:
+            continue
+        sections = sections.reshape(nr_of_series, -1, size)
+        section_offset = np.arange(sections.shape[1]) * size + \
+            (0 if size == section_size + 1 else split_idx)
+        section_mean.append(np.mean(sections, axis=-1, dtype=np.float64))
+        section_max_idx.append(np.argmax(sections, axis=-1) + section_offset)
+        section_min_idx.append(np.argmin(sections, axis=-1) + section_offset)
+
+    section_mean = np.hstack(section_mean)
+    section_max_idx = np.hstack(section_max_idx)
+    section_min_idx = np.hstack(section_min_idx)
+
+    # NOTE: the extremes in float64, also for float32 series
+    return get_block_maxima_from_sections(section_mean,
+                                          section_max_idx, np.take_along_axis(
+                                              data_matrix, section_max_idx, axis=-1).astype(np.float64),
+                                          section_min_idx, np.take_along_axis(
+                                              data_matrix, section_min_idx, axis=-1).astype(np.float64),
+                                          section_sizes, ramp_up_idx, calculate_mode, pdf_case, fit_settings)
+
+
+def get_block_maxima_from_sections(section_mean, section_max_idx, section_max_val, section_min_idx, section_min_val,
+                                   section_sizes, ramp_up_idx, calculate_mode, pdf_case='KDE', fit_settings=None):
+    '''
+    Classical and alternative extremes from the mean, max and min (value and index)
+    of each block, one row per series, regardless of how these were found
+    (whole matrix or streamed in chunks).
+    The sign of the mean of a block decides whether the max or the min
+    is the classical extreme, the other one is the alternative extreme if
+    its sign differs.
+    The extreme value distribution given by fit_settings is fitted to the
+    classical extremes of all series at once and to the alternative
+    extremes of each series, giving the design values.
+    '''
+
+    nr_of_series = section_mean.shape[0]
+
+    # sign of mean_val and max_val has to coincide by definition
+    is_positive = section_mean >= 0.0
+    classical_idx = np.where(is_positive, section_max_idx, section_min_idx)
+    alternative_idx = np.where(is_positive, section_min_idx, section_max_idx)
+    classical_val = np.where(is_positive, section_max_val, section_min_val)
+    alternative_val = np.where(is_positive, section_min_val, section_max_val)
+    has_alternative = np.sign(classical_val) != np.sign(alternative_val)
+
+    block_start_idx = np.append(ramp_up_idx + np.cumsum(section_sizes) - section_sizes,
+                                ramp_up_idx + np.sum(section_sizes) - 1)
+
+    classical_extremes_stat = get_general_statistics_batch(
+        classical_val, calculate_mode, pdf_case=pdf_case)
+
+    if fit_settings is not None:
+        classical_extremes_fit = get_extreme_value_fit_batch(classical_val,
+                                                             fit_settings['distribution'],
+                                                             fit_settings['method'],
+                                                             fit_settings['non_exceedance'])
+
+    results = []
+    for idx in range(nr_of_series):
+        result = {}
+        result['block_start_idx'] = block_start_idx
+        result['classical'] = {}
+        result['classical']['val'] = classical_val[idx]
+        result['classical']['idx'] = classical_idx[idx] + ramp_up_idx
+        result['classical']['statistics'] = get_general_statistics_from_batch(
+            classical_extremes_stat, idx)
+        if fit_settings is not None:
+            result['classical']['fit'] = get_extreme_value_fit_from_batch(
+                classical_extremes_fit, idx)
+        result['alternative'] = {}
+
+        if np.any(has_alternative[idx]):
+            result['alternative']['val'] = alternative_val[idx][has_alternative[idx]]
+            result['alternative']['idx'] = alternative_idx[idx][has_alternative[idx]] + ramp_up_idx
+            result['alternative']['statistics'] = get_general_statistics(
+                result['alternative']['val'], calculate_mode, pdf_case)
+            if fit_settings is not None:
+                result['alternative']['fit'] = get_extreme_value_fit_from_batch(get_extreme_value_fit_batch(result['alternative']['val'],
+                                                                                                            fit_settings['distribution'],
+                                                                                                            fit_settings['method'],
+                                                                                                            fit_settings['non_exceedance']), 0)
+
+        else:
+            print("## No alternative extremes found, using 0.0 as dummy statistic values not to break plotting")
+            result['alternative']['val'] = np.asarray([0.0])
+            result['alternative']['idx'] = np.asarray([0])
+            result['alternative']['statistics'] = get_alternative_extremes_dummy_statistics(
+                calculate_mode)
+            if fit_settings is not None:
+                result['alternative']['fit'] = get_extreme_value_fit_dummy(
+                    fit_settings)
+
+        results.append(result)
+
+    return results
+
+
+def get_declustered_peaks(data_matrix, thresholds, min_separation):
+    '''
+    Peaks of the exceedances of the rows of data_matrix over the thresholds
+    (one per row), declustered: exceedances separated by at most min_separation
+    samples belong to the same cluster of which only the peak is kept.
+    All rows are processed at once on the flat list of exceedances.
+    Returns the row, the index and the value of the peaks, sorted by row and index
+    '''
+
+    rows, cols = np.nonzero(data_matrix > thresholds[:, np.newaxis])
+    values = data_matrix[rows, cols]
+
+    if len(rows) == 0:
+        return rows, cols, values
+
+    # a new cluster starts with a new row or after a gap
+    is_cluster_start = np.ones(len(rows), dtype=bool)
+    is_cluster_start[1:] = (np.diff(rows) != 0) | (
+        np.diff(cols) > min_separation)
+    cluster_id = np.cumsum(is_cluster_start) - 1
+
+    # the first entry of each cluster after sorting by cluster and descending value
+    # NOTE: stable sort, the first occurrence of the maximum is kept
+    order = np.lexsort((-values, cluster_id))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = np.diff(cluster_id[order]) != 0
+    peaks = np.sort(order[is_first])
 
-        if calculate_mode:
-            alternative_extremes_stat['mode'] = 0.0
+    return rows[peaks], cols[peaks], values[peaks]
 
-        alternative_extremes_stat['pdf'] = {}
-        alternative_extremes_stat['pdf']['x'] = np.asarray([])
-        alternative_extremes_stat['pdf']['y'] = np.asarray([])
+
+def get_gpd_fit_pwm(excess_matrix):
+    '''
+    Fits the generalized Pareto distribution to the excesses (rows, padded with NaN)
+    by probability weighted moments (Hosking and Wallis, 1987), vectorized over rows.
+    The shape follows the scipy.stats.genpareto convention (c = -k).
+    '''
+
+    excess_matrix = np.sort(excess_matrix, axis=-1)
+    nr_of_excesses = np.sum(~np.isnan(excess_matrix), axis=-1)
+    # rank j = 1...n in ascending order, weights (n - j) / (n - 1)
+    rank = np.arange(1, excess_matrix.shape[-1] + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = (nr_of_excesses[:, np.newaxis] - rank) / \
+            (nr_of_excesses[:, np.newaxis] - 1)
+        a0 = np.nansum(excess_matrix, axis=-1) / nr_of_excesses
+        a1 = np.nansum(excess_matrix * weights, axis=-1) / nr_of_excesses
+
+        k = a0 / (a0 - 2.0 * a1) - 2.0
+        scale = 2.0 * a0 * a1 / (a0 - 2.0 * a1)
 
     results = {}
-    results['block_start_idx'] = np.asarray(block_start_idx)
-    results['classical'] = {}
-    results['classical']['val'] = np.asarray(classical_extremes_val)
-    results['classical']['idx'] = np.asarray(classical_extreme_idx)
-    results['classical']['statistics'] = classical_extremes_stat
-    results['alternative'] = {}
-    results['alternative']['val'] = np.asarray(alternative_extremes_val)
-    results['alternative']['idx'] = np.asarray(alternative_extremes_idx)
-    results['alternative']['statistics'] = alternative_extremes_stat
+    results['shape'] = np.where(nr_of_excesses > 1, -k, np.nan)
+    results['scale'] = np.where(nr_of_excesses > 1, scale, np.nan)
+    results['nr_of_excesses'] = nr_of_excesses
+
+    return results
+
+
+def get_pot_threshold_sweep(data_matrix, threshold_quantiles, min_separation=1, direction=None):
+    '''
+    GPD fits for several thresholds (given as quantiles) for all rows, e.g.
+    for checking the stability of the shape and modified scale over the threshold.
+    direction: +1 for maxima, -1 for minima for each row, by the sign of the mean if None
+    Returns arrays of shape (rows x thresholds)
+    '''
+
+    data_matrix = np.atleast_2d(data_matrix)
+    if direction is None:
+        direction = np.where(np.mean(data_matrix, axis=-1) >= 0.0, 1.0, -1.0)
+    directed_matrix = data_matrix * direction[:, np.newaxis]
+
+    thresholds = np.quantile(directed_matrix, threshold_quantiles, axis=-1).T
+
+    results = {'threshold': thresholds * direction[:, np.newaxis]}
+    fits = []
+    for threshold_idx in range(len(threshold_quantiles)):
+        rows, cols, values = get_declustered_peaks(
+            directed_matrix, thresholds[:, threshold_idx], min_separation)
+        fits.append(get_gpd_fit_pwm(get_excess_matrix(
+            rows, values, thresholds[:, threshold_idx], data_matrix.shape[0])[0]))
+
+    for key in ['shape', 'scale', 'nr_of_excesses']:
+        results[key] = np.stack([fit[key] for fit in fits], axis=-1)
+
+    return results
+
+
+def get_excess_matrix(rows, values, thresholds, nr_of_series):
+    # excesses of the peaks over the thresholds, one row per series padded with NaN
+
+    nr_of_peaks = np.bincount(rows, minlength=nr_of_series)
+
+    excess_matrix = np.full(
+        (nr_of_series, max(np.max(nr_of_peaks), 1)), np.nan)
+    position = np.arange(len(rows)) - \
+        np.repeat(np.cumsum(nr_of_peaks) - nr_of_peaks, nr_of_peaks)
+    excess_matrix[rows, position] = values - thresholds[rows]
+
+    return excess_matrix, nr_of_peaks
+
+
+def get_gpd_design_value(threshold, scale, shape, peaks_per_block, non_exceedance):
+    # quantile of the largest peak within a block, by the Poisson
+    # arrival of the peaks and the GPD of the excesses over the threshold
+
+    if not peaks_per_block > 0.0 or np.isnan(scale):
+        return np.nan
+
+    exceedance = -np.log(non_exceedance) / peaks_per_block
+    if abs(shape) > 1e-12:
+        excess = scale / shape * (exceedance**(-shape) - 1.0)
+    else:
+        excess = -scale * np.log(exceedance)
+
+    return threshold + excess
+
+
+@profiled('peaks_over_threshold')
+def get_peaks_over_threshold_batch(data_matrix, ramp_up_idx, calculate_mode, pdf_case='KDE', threshold_quantile=0.95, min_separation=1,
+                                   nr_of_blocks=6, non_exceedance=None, threshold_sweep=None):
+    '''
+    Peak-Over-Threshold of several series (rows of a taps x time matrix):
+    the sign of the mean decides whether the maxima or the minima are the
+    classical extremes, the threshold is the threshold_quantile of the series
+    in this direction. The exceedances are declustered with min_separation
+    (in samples) and a generalized Pareto distribution is fitted to the excesses.
+    The alternative extremes are found the same way in the opposite direction,
+    keeping only the peaks with a sign different from the classical ones.
+    Same result layout as the Block-Maxima, the 'block_start_idx' only mark
+    the start and the end of the evaluated series.
+    If non_exceedance is given, the design value is the non_exceedance quantile
+    of the largest peak within a block of the length of the series divided by
+    nr_of_blocks (Poisson arrival of the peaks), so comparable to the one from Block-Maxima.
+    If threshold_sweep (quantiles) is given, the GPD fits of the classical extremes
+    for each of these thresholds are added as 'sweep' to the 'gpd' of the classical extremes.
+    '''
+
+    data_matrix = np.atleast_2d(data_matrix)
+    nr_of_series, nr_of_samples = data_matrix.shape
+
+    direction = np.where(np.mean(data_matrix, axis=-1, dtype=np.float64) >= 0.0, 1.0, -1.0)
+
+    if threshold_sweep is not None:
+        sweep = get_pot_threshold_sweep(
+            data_matrix, threshold_sweep, min_separation, direction)
+
+    results = [{'block_start_idx': np.asarray([ramp_up_idx, ramp_up_idx + nr_of_samples - 1])}
+               for idx in range(nr_of_series)]
+
+    for extreme_type, extreme_direction in [('classical', direction), ('alternative', -direction)]:
+        directed_matrix = data_matrix * extreme_direction[:, np.newaxis]
+        thresholds = np.quantile(
+            directed_matrix, threshold_quantile, axis=-1)
+
+        rows, cols, values = get_declustered_peaks(
+            directed_matrix, thresholds, min_separation)
+
+        if extreme_type == 'alternative':
+            # sign of the alternative extremes has to differ from the classical ones
+            is_kept = values > 0.0
+            rows, cols, values = rows[is_kept], cols[is_kept], values[is_kept]
+
+        excess_matrix, nr_of_peaks = get_excess_matrix(
+            rows, values, thresholds, nr_of_series)
+        gpd_fit = get_gpd_fit_pwm(excess_matrix)
+        peak_split = np.cumsum(nr_of_peaks)[:-1]
+
+        for idx, (peak_idx, peak_val) in enumerate(zip(np.split(cols, peak_split),
+                                                       np.split(values * extreme_direction[rows], peak_split))):
+            result = {}
+
+            if len(peak_val) > 0:
+                result['val'] = peak_val
+                result['idx'] = peak_idx + ramp_up_idx
+                result['statistics'] = get_general_statistics(
+                    peak_val, calculate_mode, pdf_case)
+
+            else:
+                print("## No " + extreme_type +
+                      " extremes found, using 0.0 as dummy statistic values not to break plotting")
+                result['val'] = np.asarray([0.0])
+                result['idx'] = np.asarray([0])
+                result['statistics'] = get_alternative_extremes_dummy_statistics(
+                    calculate_mode)
+
+            result['gpd'] = {}
+            result['gpd']['threshold'] = thresholds[idx] * \
+                extreme_direction[idx]
+            result['gpd']['scale'] = gpd_fit['scale'][idx]
+            result['gpd']['shape'] = gpd_fit['shape'][idx]
+            # mean number of peaks per sample
+            result['gpd']['rate'] = nr_of_peaks[idx] / nr_of_samples
+
+            if threshold_sweep is not None and extreme_type == 'classical':
+                result['gpd']['sweep'] = {'threshold_quantile': np.asarray(threshold_sweep, dtype=np.float64)}
+                for key in ['threshold', 'shape', 'scale', 'nr_of_excesses']:
+                    result['gpd']['sweep'][key] = sweep[key][idx]
+
+            if non_exceedance is not None:
+                result['fit'] = {}
+                result['fit']['distribution'] = 'gpd'
+                result['fit']['method'] = 'pwm'
+                result['fit']['location'] = result['gpd']['threshold']
+                result['fit']['scale'] = result['gpd']['scale']
+                result['fit']['shape'] = result['gpd']['shape']
+                # in the direction of the extremes, then back to their sign
+                result['fit']['design_value'] = get_gpd_design_value(thresholds[idx],
+                                                                     gpd_fit['scale'][idx],
+                                                                     gpd_fit['shape'][idx],
+                                                                     nr_of_peaks[idx] / nr_of_blocks,
+                                                                     non_exceedance) * extreme_direction[idx]
+
+            results[idx][extreme_type] = result
 
     return results
 
 
-def get_velocity_and_pressure_autocorrelation(time_series, velocity_series, pressure_series, target_lux=[80.0, 100.0, 120.0]):
+def get_autocorrelation(data_series, max_lag=None, circular=True):
+    '''
+    Normalized autocorrelation of one or several signals (along the last axis)
+    evaluated by FFT in O(N log N) instead of a direct convolution.
+    circular=True: periodic continuation of the signal, as by the former
+    convolution with the doubled signal
+    circular=False: zero-padded, linear autocorrelation
+    max_lag: largest lag in samples to be returned, all if None
+    '''
+
+    data_series = np.asarray(data_series, dtype=np.float64)
+    nx = data_series.shape[-1]
+
+    # fluctuations around the mean
+    data_series = data_series - np.mean(data_series, axis=-1, keepdims=True)
+
+    if circular:
+        nfft = nx
+    else:
+        # zero padding to avoid the wrap-around, to a fast FFT length
+        nfft = next_fast_len(2 * nx - 1, real=True)
+
+    spectrum = np.fft.rfft(data_series, n=nfft, axis=-1)
+    r = np.fft.irfft(spectrum.real**2 + spectrum.imag**2,
+                     n=nfft, axis=-1)[..., :nx] / nx
+
+    if max_lag is not None:
+        r = r[..., :int(max_lag) + 1]
+
+    # r/r[0] represents the normalized autocorrelation
+    return r / r[..., :1]
+
+
+def get_esdu_target_autocorrelation(time_lags, umean, lux):
+    # ESDU target autocorrelation of the streamwise velocity for the length scale lux
+
+    f1 = np.exp(-0.822 * (umean * np.asarray(time_lags) / lux)**0.77)
+    return 0.5 * (f1 + f1**2)
+
+
+@profiled('autocorrelation')
+def get_velocity_and_pressure_autocorrelation(time_series, velocity_series, pressure_series, target_lux=[80.0, 100.0, 120.0], max_lag=None):
     '''
     Spectral length for target autocorrelation
     specified by default
+    max_lag in seconds, only the lags up to it are returned, all if None
     '''
 
     t = time_series
     # time shift to start from 0 the autocorrelation results
     t = t - t[0]
 
-    u = velocity_series
-    p = pressure_series
-
-    umean = np.mean(u)
-    u = u - umean
-    nx = len(u)
-    ur = np.array([u[i] for i in range(nx - 1, -1, -1)])
-    u = np.hstack((u, u[:-1]))
-    # it is the correlation of velocity with itself - so autocorrelation
-    r_uu = np.convolve(ur, u, mode='valid') / nx
-    # r/r[0] represents the normalized autocorrelation of velocity
-    r_uu = r_uu / r_uu[0]
-
-    pmean = np.mean(p)
-    p = p - pmean
-    nx = len(p)
-    pr = np.array([p[i] for i in range(nx - 1, -1, -1)])
-    # it is the correlation of pressure with itself - so autocorrelation
-    p = np.hstack((p, p[:-1]))
-    r_pp = np.convolve(pr, p, mode='valid') / nx
-    # r/r[0] represents the normalized autocorrelation of pressure
-    r_pp = r_pp / r_pp[0]
+    if max_lag is not None:
+        # NOTE: assuming a constant time step
+        max_lag = min(int(np.ceil(max_lag / (t[1] - t[0]))), len(t) - 1)
+        t = t[:max_lag + 1]
+
+    umean = np.mean(velocity_series)
+
+    # velocity and pressure together, it is the correlation
+    # of each with itself - so autocorrelation
+    r = get_autocorrelation(
+        np.vstack((velocity_series, pressure_series)), max_lag)
 
     results = {}
     results['time'] = t
-    results['velocity'] = r_uu
-    results['pressure'] = r_pp
+    results['velocity'] = r[0]
+    results['pressure'] = r[1]
     results['target'] = {}
 
     for tl in target_lux:
-        f1 = np.exp(-0.822 * (umean * t / tl)**0.77)
-        target_autocorr = 0.5 * (f1 + f1**2)
-
-        results['target']["ESDU Lux={:5.1f}".format(tl)] = target_autocorr
+        results['target']["ESDU Lux={:5.1f}".format(tl)] = get_esdu_target_autocorrelation(
+            t, umean, tl)
 
     return results
 
 
-def get_velocity_spectra(time_series, velocity_series, z=25.0, z0=0.06):
+def get_log_binned_series(x_series, y_series, nr_of_bins):
+    '''
+    Averages the series (along the last axis) within logarithmically spaced bins
+    of the index 1...N-1, the index 0 (mean) is skipped. As the bins are index
+    ranges these are the same for several rows and the averaging is done
+    by one np.add.reduceat per series
+    '''
+
+    nr_of_points = x_series.shape[-1]
+    bin_edges = np.unique(np.round(np.geomspace(
+        1, nr_of_points, nr_of_bins + 1)).astype(int))
+    bin_sizes = np.diff(bin_edges)
+
+    x_binned = np.add.reduceat(x_series, bin_edges[:-1], axis=-1) / bin_sizes
+    y_binned = np.add.reduceat(y_series, bin_edges[:-1], axis=-1) / bin_sizes
+
+    return x_binned, y_binned
+
+
+@profiled('spectra')
+def get_velocity_spectra(time_series, velocity_series, z=25.0, z0=0.06, nr_of_segments=1, overlap=0.5, nr_of_bins=None):
     '''
     Default values for z and z0 hardcoded - here for the gable_roof_wind_2.h5
     All results should be based upon this generated wind
+    velocity_series can be one series or several (e.g. velocity components
+    or reference points) as rows of a 2d array
+    nr_of_segments > 1: Welch averaging of Hann windowed segments with overlap
+    nr_of_bins: averaging in logarithmically spaced frequency bins
+    to at most this number of output points, none if None
     '''
     def Fu_exact(k1z): return 52.5 * k1z / (1. + 33. * k1z)**(5. / 3.)
 
@@ -303,22 +1556,45 @@ def get_velocity_spectra(time_series, velocity_series, z=25.0, z0=0.06):
                        0.484089036307, 0.420301445225, 0.347791585792, 0.278950554163, 0.220213310142,
                        0.172281158258, 0.133847652859, 0.103416441602, 0.0795951241049, 0.0611154974287])
 
-    u = velocity_series
-    umean = np.mean(velocity_series)
-    # calculate the respective length measure
-    # based upon length of time series and the mean velocity
-    lx = (time_series[-1] - time_series[0]) * umean
+    u = np.atleast_2d(np.asarray(velocity_series, dtype=np.float64))
+    umean = np.mean(u, axis=-1, keepdims=True)
 
     utau = 0.41 * umean / np.log(z / z0)
 
-    nx = len(u)
-    Fu = np.zeros(int(nx / 2) + 1)
+    if nr_of_segments > 1:
+        # Welch: overlapping segments, Hann window,
+        # periodograms averaged over the segments
+        nx = int(u.shape[-1] / (1 + (nr_of_segments - 1) * (1.0 - overlap)))
+        step = max(int(nx * (1.0 - overlap)), 1)
+        window = np.hanning(nx)
+        segments = np.lib.stride_tricks.sliding_window_view(
+            u, nx, axis=-1)[:, ::step]
+        segments = (segments - np.mean(segments, axis=-1,
+                                       keepdims=True)) * window
+        # window correction to keep the power of the signal
+        power = np.mean(np.abs(np.fft.rfft(segments, axis=-1))**2,
+                        axis=1) / np.mean(window**2)
+    else:
+        nx = u.shape[-1]
+        power = np.abs(np.fft.rfft(u, axis=-1))**2
+
+    # calculate the respective length measure
+    # based upon length of (segment of the) time series and the mean velocity
+    # NOTE: assuming a constant time step
+    lx = (time_series[-1] - time_series[0]) * \
+        (nx - 1) / (len(time_series) - 1) * umean
 
-    kx = np.array([2.0 * np.pi * i / lx for i in range(int(nx / 2) + 1)])
+    kx = 2.0 * np.pi * np.arange(int(nx / 2) + 1) / lx
     kxz = kx * z / (2.0 * np.pi)
 
-    Fu = Fu + kx * abs(np.fft.fft(u)[:int(nx / 2) + 1]
-                       )**2 * lx / nx**2 / (2.0 * np.pi) / utau**2
+    Fu = kx * power * lx / nx**2 / (2.0 * np.pi) / utau**2
+
+    if nr_of_bins is not None:
+        kxz, Fu = get_log_binned_series(kxz, Fu, nr_of_bins)
+
+    if np.ndim(velocity_series) == 1:
+        kxz = kxz[0]
+        Fu = Fu[0]
 
     results = {}
     results['kxz'] = kxz
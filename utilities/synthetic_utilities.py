@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the generation of synthetic wind pressure data in the
+Kratos and FeFlo file formats, e.g. for benchmarking the evaluation
+without the (not committed) simulation results
+
+Created on 17.10.2026
+
+@author: mate.pentek@tum.de, anoop.kodakkal@tum.de
+"""
+
+
+import os
+from os import path as os_path
+
+import numpy as np
+
+from utilities.statistic_utilities import get_esdu_target_autocorrelation
+
+
+def get_synthetic_series(nr_of_samples, time_step, target_autocorrelation, rng, nr_of_series=1):
+    '''
+    Gaussian series with zero mean and unit standard deviation, as rows,
+    with the target autocorrelation (a function of the time lags),
+    by spectral synthesis: the amplitudes from the spectrum of the
+    periodically continued target, the phases random.
+    '''
+
+    # lags of the periodically continued series
+    lag_idx = np.arange(nr_of_samples)
+    time_lags = np.minimum(lag_idx, nr_of_samples - lag_idx) * time_step
+    # NOTE: small negative values of the spectrum due to the truncation are removed
+    spectrum = np.maximum(
+        np.fft.rfft(target_autocorrelation(time_lags)).real, 0.0)
+
+    coefficients = np.sqrt(spectrum) * (rng.standard_normal((nr_of_series, len(spectrum))) +
+                                        1j * rng.standard_normal((nr_of_series, len(spectrum))))
+    series = np.fft.irfft(coefficients, n=nr_of_samples, axis=-1)
+    series -= np.mean(series, axis=-1, keepdims=True)
+
+    return series / np.std(series, axis=-1, keepdims=True)
+
+
+def write_point_file(file, result_case, position, columns):
+    # header with the position as parsed by get_position_from_header_line, one row per time step
+
+    if 'Kratos' in result_case:
+        header = 'Results for node at ' + ' '.join('%.3f' % coordinate
+                                                   for coordinate in position)
+    elif 'FeFlo' in result_case:
+        header = 'Results for point  ' + '  '.join('%.3f' % coordinate
+                                                   for coordinate in position)
+    else:
+        raise Exception('Result case: ' + result_case + ' not supported.')
+
+    os.makedirs(os_path.dirname(file), exist_ok=True)
+    np.savetxt(file, np.column_stack(columns), fmt='%.10e', header=header)
+
+
+def get_synthetic_file_names(result_case, nr_of_taps):
+    # tap and reference point file names (relative to the input data folder) as in ResultsOverview.json
+
+    if 'Kratos' in result_case:
+        tap_files = [result_case + '/pressure_taps/pressure_at_' + str(tap_idx) + '.dat'
+                     for tap_idx in range(nr_of_taps)]
+        reference_file = result_case + '/reference_points/pressure_and_velocity_x_at_0.dat'
+    elif 'FeFlo' in result_case:
+        # numbered output points, the reference point last
+        tap_files = [result_case + '/s%010d' % (tap_idx + 1)
+                     for tap_idx in range(nr_of_taps)]
+        reference_file = result_case + '/s%010d' % (nr_of_taps + 1)
+    else:
+        raise Exception('Result case: ' + result_case + ' not supported.')
+
+    return tap_files, reference_file
+
+
+def generate_synthetic_case(input_data_folder, result_case, nr_of_taps, nr_of_samples, time_step=0.02,
+                            mean_velocity=30.0, turbulence_intensity=0.15, length_scale=100.0,
+                            density=1.2, seed=0):
+    '''
+    Writes the tap and reference point files of a synthetic result case
+    below input_data_folder, in the Kratos or FeFlo format depending on the
+    name of result_case. Returns the result dictionary as in ResultsOverview.json.
+    The velocity fluctuations follow the ESDU target autocorrelation for the
+    length_scale (Lux), the cp of each tap has a quasi-steady part from the
+    velocity and an own part with the same spectral content, the mean cp
+    ranges from pressure to suction over the taps.
+    The first 5 percent of the series are the ramp-up.
+    '''
+
+    rng = np.random.default_rng(seed)
+    time_series = np.arange(nr_of_samples) * time_step
+
+    def target_autocorrelation(time_lags):
+        return get_esdu_target_autocorrelation(time_lags, mean_velocity, length_scale)
+
+    # velocity, reference pressure and own part of each tap
+    series = get_synthetic_series(nr_of_samples, time_step, target_autocorrelation, rng,
+                                  nr_of_series=2 + nr_of_taps)
+    velocity_series = mean_velocity * (1.0 + turbulence_intensity * series[0])
+    dynamic_pressure = 0.5 * density * mean_velocity**2
+    reference_pressure_series = 101325.0 + 0.05 * dynamic_pressure * series[1]
+
+    tap_files, reference_file = get_synthetic_file_names(
+        result_case, nr_of_taps)
+
+    write_point_file(os_path.join(input_data_folder, os_path.normpath(reference_file)), result_case,
+                     [-120.0, 0.0, 10.0],
+                     [time_series, reference_pressure_series, velocity_series])
+
+    for tap_idx, cp_mean in enumerate(np.linspace(0.8, -1.2, nr_of_taps)):
+        cp_series = cp_mean + 2.0 * cp_mean * turbulence_intensity * series[0] + \
+            (0.05 + 0.1 * abs(cp_mean)) * series[2 + tap_idx]
+        write_point_file(os_path.join(input_data_folder, os_path.normpath(tap_files[tap_idx])), result_case,
+                         [-13.751 + tap_idx, 0.0, 1.1],
+                         [time_series, reference_pressure_series + cp_series * dynamic_pressure])
+
+    result = {}
+    result['case'] = result_case
+    result['density'] = density
+    result['ramp_up_time'] = 0.05 * time_series[-1] / 1.2
+    result['pressure_taps'] = [{'file_name': tap_file}
+                               for tap_file in tap_files]
+    result['reference_points'] = [{'label': '-120',
+                                   'file_name': reference_file}]
+
+    return result